@@ -0,0 +1,36 @@
+from game_state import GameState
+from rules import *
+
+from highest_scoring_word import HighestScoringWordStrategy
+import endgame
+import move_generation
+
+
+# A strategy that solves the endgame (see endgame.py) once the bag is empty in a two-player game,
+# and plays like another strategy until then.
+class EndgameSolvingStrategy(MoveGetter):
+    def __init__(self, strategy: MoveGetter | None = None, time_per_move: float = 5.0) -> None:
+        # The strategy to play before the endgame. It's the highest-scoring word strategy if none is given.
+        if strategy is None:
+            strategy = HighestScoringWordStrategy()
+        self.strategy = strategy
+        # How long to spend solving each move of the endgame, in seconds.
+        self.time_per_move = time_per_move
+        self.moves_finder: move_generation.GaddagMoveFinder | None = None
+
+    def get_name(self) -> str:
+        return f"{type(self).__name__}(strategy={self.strategy.get_name()})"
+
+    def get_move(self, state: GameState) -> Move:
+        if len(state.bag) > 0 or len(state.player_to_state) != 2:
+            return self.strategy.get_move(state=state)
+
+        if self.moves_finder is None:
+            self.moves_finder = move_generation.GaddagMoveFinder(words=state.config.playable_words)
+        result = endgame.solve_endgame(
+            state=state, time_limit=self.time_per_move, moves_finder=self.moves_finder
+        )
+        return result.move
+
+    def notify_new_state(self, state: GameState) -> None:
+        self.strategy.notify_new_state(state=state)
@@ -3,52 +3,40 @@ from random import choice
 from game_state import GameState
 from rules import *
 
+import move_cache
 import move_generation
 
 
 # A strategy that plays the highest scoring word, or passes if it doesn't find any.
 class HighestScoringWordStrategy(MoveGetter):
-    def __init__(self) -> None:
-        self.moves_finder: move_generation.PlaceTilesMoveFinder | None = None
+    def __init__(self, use_move_cache: bool = False) -> None:
+        self.moves_finder: move_generation.GaddagMoveFinder | None = None
+        # Whether to share the moves found with the other strategies in this process (see move_cache.py).
+        self.use_move_cache = use_move_cache
 
 
     # Initialize the moves-finder, if it isn't already initialized.
     def _init_moves_finder(self, state: GameState) -> None:
         if self.moves_finder is None:
-            self.moves_finder = move_generation.PlaceTilesMoveFinder(
-                words=state.config.playable_words
+            self.moves_finder = move_generation.GaddagMoveFinder(
+                words=state.config.playable_words,
+                move_cache=move_cache.get_shared_move_cache() if self.use_move_cache else None,
             )
 
     def get_move(self, state: GameState) -> Move:
         self._init_moves_finder(state=state)
 
-        placement_moves = self.moves_finder.get_all_place_tiles_moves(state=state)  # type: ignore
-
-        num_invalid_moves = 0
-        for move in placement_moves:
-            if not move.is_valid(state=state):
-                num_invalid_moves += 1
-        if num_invalid_moves > 0:
-            s = f"!!!{num_invalid_moves} INVALID MOVES!!!"
-            print("!" * len(s))
-            print(s)
-            print("!" * len(s))
-
-        if placement_moves:
-            before_score = state.player_to_state[state.current_player].score
-            highest_scoring_move = None
-            highest_score = -1
-            for move in placement_moves:
-                after_state = state.copy()
-                move.perform(after_state)
-                after_score = (
-                    after_state.player_to_state[state.current_player].score
-                    - before_score
-                )
-                if after_score > highest_score:
-                    highest_score = after_score
-                    highest_scoring_move = move
-            if highest_scoring_move is not None:
-                return highest_scoring_move
-
-        return PassMove()
+        # Moves that go out also get the points of the tiles left in the other players' racks.
+        num_tiles = len(state.player_to_state[state.current_player].tiles)
+        going_out_points = get_going_out_points(state=state, num_tiles_placed=num_tiles)
+
+        def get_after_score(points: int, num_tiles_placed: int) -> int:
+            if num_tiles_placed >= num_tiles:
+                return points + going_out_points
+            return points
+
+        best_moves = self.moves_finder.best_moves(state=state, k=1, key=get_after_score)  # type: ignore
+
+        if not best_moves:
+            return PassMove()
+        return best_moves[0][0]
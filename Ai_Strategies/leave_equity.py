@@ -0,0 +1,61 @@
+from game_state import GameState
+from rules import *
+
+import leaves
+import move_cache
+import move_generation
+
+
+# A strategy that plays the move with the most points plus the equity of the leave it keeps,
+# or passes if it doesn't find any.
+class LeaveEquityStrategy(MoveGetter):
+    def __init__(
+        self, leave_table: leaves.LeaveTable | None = None, use_move_cache: bool = False
+    ) -> None:
+        self.moves_finder: move_generation.GaddagMoveFinder | None = None
+        # Whether to share the moves found with the other strategies in this process (see move_cache.py).
+        self.use_move_cache = use_move_cache
+        # The leave table at leaves.LEAVE_TABLE_PATH is used if none is given.
+        self.leave_table = leave_table
+
+    # Initialize the moves-finder and the leave table, if they aren't already initialized.
+    def _init_moves_finder(self, state: GameState) -> None:
+        if self.moves_finder is None:
+            self.moves_finder = move_generation.GaddagMoveFinder(
+                words=state.config.playable_words,
+                move_cache=move_cache.get_shared_move_cache() if self.use_move_cache else None,
+            )
+        if self.leave_table is None:
+            self.leave_table = leaves.get_leave_table()
+            if self.leave_table is None:
+                raise FileNotFoundError(
+                    f"No leave table at {leaves.LEAVE_TABLE_PATH}; make one with main.make_leave_table"
+                )
+
+    def get_move(self, state: GameState) -> Move:
+        self._init_moves_finder(state=state)
+        leave_table: leaves.LeaveTable = self.leave_table  # type: ignore
+
+        # Moves that go out also get the points of the tiles left in the other players' racks.
+        rack = state.player_to_state[state.current_player].tiles
+        going_out_points = get_going_out_points(state=state, num_tiles_placed=len(rack))
+        # The leave doesn't matter when there's nothing left to draw.
+        use_leaves = len(state.bag) > 0
+
+        # Only the best move is made into a PlaceTilesMove.
+        best_move: CompactMove | None = None
+        best_value = float("-inf")
+        for move, points in self.moves_finder.iter_compact_moves_with_points(state=state):  # type: ignore
+            value = float(points)
+            if move.num_tiles >= len(rack):
+                value += going_out_points
+            if use_leaves:
+                leave = leaves.get_leave(rack=rack, tiles_used=move.tiles)
+                value += leave_table.get_value(leave)
+            if value > best_value:
+                best_value = value
+                best_move = move
+
+        if best_move is None:
+            return PassMove()
+        return best_move.to_place_tiles_move(board=state.board)
@@ -1,22 +1,29 @@
-from random import choice
+from random import Random
 import time
 
 from game_state import GameState
 from rules import *
 
+import move_cache
 import move_generation
 
 
 # A strategy that plays a random word if possible, and passes otherwise.
 class RandomWordStrategy(MoveGetter):
-    def __init__(self) -> None:
-        self.moves_finder: move_generation.PlaceTilesMoveFinder | None = None
+    def __init__(self, use_move_cache: bool = False, rng: Random | None = None) -> None:
+        self.moves_finder: move_generation.GaddagMoveFinder | None = None
+        # Whether to share the moves found with the other strategies in this process (see move_cache.py).
+        self.use_move_cache = use_move_cache
+        # Where the choices come from. It's the strategy's own, so that its choices don't change the tiles drawn.
+        # If it's None, one is derived from the game's on the first move (see GameState.get_derived_rng).
+        self.rng = rng
 
     # Initialize the moves-finder, if it isn't already initialized.
     def _init_moves_finder(self, state: GameState) -> None:
         if self.moves_finder is None:
-            self.moves_finder = move_generation.PlaceTilesMoveFinder(
-                words=state.config.playable_words
+            self.moves_finder = move_generation.GaddagMoveFinder(
+                words=state.config.playable_words,
+                move_cache=move_cache.get_shared_move_cache() if self.use_move_cache else None,
             )
 
     def get_move(self, state: GameState) -> Move:
@@ -25,9 +32,14 @@ class RandomWordStrategy(MoveGetter):
         # placement_moves = move_generation.get_all_place_tiles_moves_naive(state=state)
         # after = time.time()
         # print(f"Took {after-before:.2f} seconds.")
-        placement_moves = list(self.moves_finder.get_all_place_tiles_moves(state=state))  # type: ignore
+        # Choose one of the moves uniformly at random as they're found, without keeping them all.
+        if self.rng is None:
+            self.rng = state.get_derived_rng()
+        get_random_index = self.rng.randrange
+        chosen_move: Move = PassMove()
+        for i, move in enumerate(self.moves_finder.iter_place_tiles_moves(state=state)):  # type: ignore
+            if get_random_index(i + 1) == 0:
+                chosen_move = move
 
-        # print(f"Found {len(placement_moves)} placement moves.")
-        if placement_moves:
-            return choice(placement_moves)
-        return PassMove()
+        # print(f"Found {i + 1} placement moves.")
+        return chosen_move
@@ -0,0 +1,284 @@
+from concurrent.futures import Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from random import Random
+import multiprocessing
+import os
+import time
+import weakref
+
+from game_state import GameState
+from rules import *
+
+import leaves
+import move_generation
+
+
+# A pool of worker processes for simulation strategies to run their rollouts on.
+# It's owned by whoever makes it, and can be shared by any number of strategies (say, every strategy in a series of games).
+# Use it as a context manager, or call close() when done with it. It's also shut down if it's garbage-collected.
+# The workers are forked if they can be, so they share the lexicon that's already loaded here.
+# Otherwise the config is sent to them, and they open its compiled lexicon again (see GameConfig.__getstate__).
+class SimulationPool:
+    def __init__(
+        self,
+        config: GameConfig,
+        leave_table: leaves.LeaveTable | None = None,
+        num_workers: int | None = None,
+    ) -> None:
+        # By default there's one worker for each CPU.
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        self.num_workers = num_workers
+        # The leave table the workers value the rollouts with. Strategies using this pool must use the same one.
+        self.leave_table = leave_table
+        # A pool only works in the process that made it, so a strategy in a forked worker doesn't use it.
+        self.pid = os.getpid()
+
+        if "fork" in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context("fork")
+            config.gaddag
+        else:
+            mp_context = multiprocessing.get_context()
+        self.executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=mp_context,
+            initializer=_init_simulation_worker,
+            initargs=(config, leave_table),
+        )
+        self._finalizer = weakref.finalize(
+            self, self.executor.shutdown, wait=False, cancel_futures=True
+        )
+
+    # Return whether rollouts can be run on this pool from this process.
+    def is_usable(self) -> bool:
+        return self._finalizer.alive and os.getpid() == self.pid
+
+    # Shut down the worker processes.
+    def close(self) -> None:
+        if self._finalizer.detach() is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> "SimulationPool":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+# A strategy that looks ahead by simulation (Monte Carlo).
+# It takes the highest-scoring moves as candidates, and plays each one out many times:
+# the other players' racks are dealt at random from the tiles this player can't see (the bag and their racks),
+# and then every player plays greedily (the highest-scoring move) for a few turns.
+# It plays the candidate that leaves it furthest ahead on average, counting the value of its leave if it has a leave table.
+#
+# Rollouts are run in batches until the time for the move is up, on the given pool's workers if there is one,
+# and in this process otherwise (or if the pool belongs to another process, as in a tournament worker).
+class SimulationStrategy(MoveGetter):
+    def __init__(
+        self,
+        num_candidates: int = 10,
+        num_plies: int = 2,
+        time_per_move: float = 1.0,
+        rollouts_per_batch: int = 1,
+        pool: SimulationPool | None = None,
+        leave_table: leaves.LeaveTable | None = None,
+        rng: Random | None = None,
+    ) -> None:
+        self.num_candidates = num_candidates
+        # The number of turns in each rollout, counting the candidate move.
+        self.num_plies = num_plies
+        # How long to spend simulating each move, in seconds. At least one batch is always run.
+        self.time_per_move = time_per_move
+        # The number of times each candidate is played out by each task given to a worker.
+        self.rollouts_per_batch = rollouts_per_batch
+        self.pool = pool
+        # The leave table is the pool's if there's a pool, since that's the one its workers have.
+        if pool is not None:
+            if leave_table is not None and leave_table is not pool.leave_table:
+                raise ValueError("A simulation strategy must use its pool's leave table")
+            leave_table = pool.leave_table
+        self.leave_table = leave_table
+        # Where the seeds of the batches come from.
+        # If it's None, one is derived from the game's on the first move (see GameState.get_derived_rng).
+        self.rng = rng
+        self.moves_finder: move_generation.GaddagMoveFinder | None = None
+
+    def _get_seed(self, state: GameState) -> int:
+        if self.rng is None:
+            self.rng = state.get_derived_rng()
+        return self.rng.getrandbits(64)
+
+    def _get_moves_finder(self, state: GameState) -> move_generation.GaddagMoveFinder:
+        if self.moves_finder is None:
+            self.moves_finder = move_generation.GaddagMoveFinder(words=state.config.playable_words)
+        return self.moves_finder
+
+    def get_move(self, state: GameState) -> Move:
+        # The candidates are the highest-scoring moves, counting the points for going out.
+        num_tiles = len(state.player_to_state[state.current_player].tiles)
+        going_out_points = get_going_out_points(state=state, num_tiles_placed=num_tiles)
+
+        def get_after_score(points: int, num_tiles_placed: int) -> int:
+            if num_tiles_placed >= num_tiles:
+                return points + going_out_points
+            return points
+
+        candidates = self._get_moves_finder(state=state).best_moves(
+            state=state, k=self.num_candidates, key=get_after_score
+        )
+        if not candidates:
+            return PassMove()
+        if len(candidates) == 1:
+            return candidates[0][0]
+        moves = [move for move, _ in candidates]
+
+        totals = self._simulate(state=state, moves=moves)
+        best_index = max(range(len(moves)), key=lambda i: totals[i])
+        return moves[best_index]
+
+    # Play out the given moves until the time is up, and return the total equity of each one.
+    # Every move is played out the same number of times, so the totals can be compared directly.
+    def _simulate(self, state: GameState, moves: list[PlaceTilesMove]) -> list[float]:
+        deadline = time.perf_counter() + self.time_per_move
+        totals = [0.0] * len(moves)
+
+        if self.pool is None or not self.pool.is_usable():
+            while True:
+                batch_totals = _do_rollouts(
+                    state=state,
+                    moves=moves,
+                    num_rollouts=self.rollouts_per_batch,
+                    num_plies=self.num_plies,
+                    seed=self._get_seed(state=state),
+                    moves_finder=self._get_moves_finder(state=state),
+                    leave_table=self.leave_table,
+                )
+                totals = [total + batch_total for total, batch_total in zip(totals, batch_totals)]
+                if time.perf_counter() >= deadline:
+                    return totals
+
+        # The workers have their own copy of the config, so it isn't sent with every batch.
+        sent_state = state.copy()
+        sent_state.config = None  # type: ignore
+
+        # Keep every worker busy until the time is up, then wait for the batches that have started.
+        running = set[Future]()
+        num_batches = 0
+        while True:
+            while len(running) < self.pool.num_workers and (
+                num_batches == 0 or time.perf_counter() < deadline
+            ):
+                num_batches += 1
+                running.add(
+                    self.pool.executor.submit(
+                        _do_worker_rollouts,
+                        sent_state,
+                        moves,
+                        self.rollouts_per_batch,
+                        self.num_plies,
+                        self._get_seed(state=state),
+                    )
+                )
+            if not running:
+                break
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                totals = [total + batch_total for total, batch_total in zip(totals, future.result())]
+        return totals
+
+
+# Return the value of the given state for the given player:
+# how far ahead of the best of the other players they are, plus the value of their leave if there's a leave table.
+def get_equity(state: GameState, player: Player, leave_table: leaves.LeaveTable | None) -> float:
+    player_state = state.player_to_state[player]
+    best_other_score = max(
+        [other_state.score for other, other_state in state.player_to_state.items() if other != player],
+        default=0,
+    )
+    result = float(player_state.score - best_other_score)
+    if leave_table is not None and not state.game_finished and len(state.bag) > 0:
+        result += leave_table.get_value(leaves.get_leave(rack=player_state.tiles))
+    return result
+
+
+# Play out each of the given moves the given number of times, and return the total equity of each one.
+# The same deals of the other players' racks are used for every move, so the moves are compared fairly.
+def _do_rollouts(
+    state: GameState,
+    moves: list[PlaceTilesMove],
+    num_rollouts: int,
+    num_plies: int,
+    seed: int,
+    moves_finder: move_generation.GaddagMoveFinder,
+    leave_table: leaves.LeaveTable | None,
+) -> list[float]:
+    rng = Random(seed)
+    player = state.current_player
+    start_equity = get_equity(state=state, player=player, leave_table=None)
+
+    # The tiles this player can't see.
+    unseen_tiles = list(state.bag)
+    for other, other_state in state.player_to_state.items():
+        if other != player:
+            unseen_tiles.extend(other_state.tiles)
+
+    totals = [0.0] * len(moves)
+    for _ in range(num_rollouts):
+        deal = list(unseen_tiles)
+        rng.shuffle(deal)
+        deal_seed = rng.getrandbits(64)
+        for i, move in enumerate(moves):
+            rollout_state = state.copy()
+
+            # Deal the other players' racks, and put the rest of the tiles in the bag.
+            j = 0
+            for other, other_state in rollout_state.player_to_state.items():
+                if other != player:
+                    num_tiles = len(other_state.tiles)
+                    other_state.tiles = deal[j : j + num_tiles]
+                    j += num_tiles
+            rollout_state.bag = Bag(tiles=deal[j:], rng=Random(deal_seed))
+            rollout_state.tiles_hash = None
+
+            move.perform(state=rollout_state)
+            for _ in range(num_plies - 1):
+                if rollout_state.game_finished:
+                    break
+                best_moves = moves_finder.best_moves(state=rollout_state, k=1)
+                reply: Move = best_moves[0][0] if best_moves else PassMove()
+                reply.perform(state=rollout_state)
+
+            totals[i] += (
+                get_equity(state=rollout_state, player=player, leave_table=leave_table)
+                - start_equity
+            )
+    return totals
+
+
+# The config, moves-finder and leave table used by a simulation worker process.
+_worker_config: GameConfig | None = None
+_worker_moves_finder: move_generation.GaddagMoveFinder | None = None
+_worker_leave_table: leaves.LeaveTable | None = None
+
+
+# Set up a simulation worker process.
+def _init_simulation_worker(config: GameConfig, leave_table: leaves.LeaveTable | None) -> None:
+    global _worker_config, _worker_moves_finder, _worker_leave_table
+    _worker_config = config
+    _worker_moves_finder = move_generation.GaddagMoveFinder(words=config.playable_words)
+    _worker_leave_table = leave_table
+
+
+# Do a batch of rollouts in a worker process, with the worker's config.
+def _do_worker_rollouts(
+    state: GameState, moves: list[PlaceTilesMove], num_rollouts: int, num_plies: int, seed: int
+) -> list[float]:
+    state.config = _worker_config  # type: ignore
+    return _do_rollouts(
+        state=state,
+        moves=moves,
+        num_rollouts=num_rollouts,
+        num_plies=num_plies,
+        seed=seed,
+        moves_finder=_worker_moves_finder,  # type: ignore
+        leave_table=_worker_leave_table,
+    )
@@ -2,4 +2,7 @@ from always_pass import AlwaysPassStrategy
 from random_word import RandomWordStrategy
 from highest_scoring_word import HighestScoringWordStrategy
 from most_tiles_played import MostTilesPlayedStrategy
-from score_and_tiles import ScoreAndTilesStrategy
\ No newline at end of file
+from score_and_tiles import ScoreAndTilesStrategy
+from leave_equity import LeaveEquityStrategy
+from simulation import SimulationPool, SimulationStrategy
+from endgame_solving import EndgameSolvingStrategy
@@ -0,0 +1,49 @@
+from itertools import combinations_with_replacement, product
+from typing import Iterable
+
+from constants import ALPHABET, WORD
+
+
+# Return the letters of the given word in alphabetical order, which is the same for all of its anagrams.
+def get_anagram_key(word: str) -> str:
+    return "".join(sorted(word))
+
+
+# The playable words grouped by their letters, for finding the words a rack can make without a board:
+# every multiset of letters the rack could spell is looked up directly.
+class AnagramIndex:
+    def __init__(self, words: Iterable[WORD]) -> None:
+        key_to_words = dict[str, list[WORD]]()
+        for word in words:
+            key_to_words.setdefault(get_anagram_key(word), list[WORD]()).append(word)
+        self.key_to_words = {key: tuple(sorted(words)) for key, words in key_to_words.items()}
+
+    # Return the words that are anagrams of the given letters.
+    def get_anagrams(self, letters: str) -> tuple[WORD, ...]:
+        return self.key_to_words.get(get_anagram_key(letters), ())
+
+    # Return the words that can be made from some of the given letters and blank tiles,
+    # with at least the given number of letters.
+    def get_words(self, letters: str, num_blanks: int = 0, min_length: int = 1) -> set[WORD]:
+        letter_to_count = dict[str, int]()
+        for c in letters:
+            letter_to_count[c] = letter_to_count.get(c, 0) + 1
+        sorted_letters = sorted(letter_to_count)
+
+        # Look up every multiset of the letters, along with every multiset of letters the blanks could be.
+        blank_letter_sets = [
+            "".join(blank_letters)
+            for num in range(num_blanks + 1)
+            for blank_letters in combinations_with_replacement(ALPHABET, num)
+        ]
+        keys = set[str]()
+        for counts in product(*[range(letter_to_count[c] + 1) for c in sorted_letters]):
+            subset = "".join([c * count for c, count in zip(sorted_letters, counts)])
+            for blank_letters in blank_letter_sets:
+                if len(subset) + len(blank_letters) >= min_length:
+                    keys.add(get_anagram_key(subset + blank_letters))
+
+        result = set[WORD]()
+        for key in keys:
+            result.update(self.key_to_words.get(key, ()))
+        return result
@@ -0,0 +1,445 @@
+from dataclasses import dataclass
+from random import Random
+from typing import Any, Callable, Mapping, Sequence
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+
+from utils import *
+from rules import *
+from move_generation import GaddagMoveFinder, PlaceTilesMoveFinder, PlayableLetterInfo
+import ai_strategies
+import game_runner
+import infix_data
+
+# Benchmarks for the parts of the engine that take the time, run on a fixed corpus of positions,
+# so that every optimization can be measured against a baseline.
+#
+# Each benchmark takes a number of samples, and reports the percentiles of their times as JSON:
+#   python benchmarks.py --output results.json
+#   python benchmarks.py --baseline results.json
+# Quick operations are called several times per sample, and a sample is the average time of one call.
+#
+# The positions are in BENCHMARK_POSITIONS_PATH. Each one is a header line, the scores, the racks
+# (in player order, "*" for a blank) and the board (a line per row, "." for an empty square,
+# lower case for a blank), followed by a blank line. The player to move is given in the header.
+# The bag has the rest of the Scrabble tiles. The corpus was made with make_positions.
+
+BENCHMARK_POSITIONS_PATH = os.path.join("Benchmarks", "positions.txt")
+
+DEFAULT_NUM_SAMPLES = 20
+DEFAULT_NUM_GAMES = 3
+
+# The percentiles reported for every benchmark.
+PERCENTILES = (50, 90, 99)
+
+EMPTY_SQUARE_CHAR = "."
+
+
+# Return the given position in the corpus format.
+def format_position(name: str, state: GameState) -> str:
+    lines = [f"position {name} to move {state.player_order.index(state.current_player)}"]
+    lines.append(
+        "scores " + " ".join([str(state.player_to_state[p].score) for p in state.player_order])
+    )
+    lines.append(
+        "racks "
+        + " ".join(
+            [
+                "".join([get_tile_char(tile) for tile in state.player_to_state[p].tiles])
+                for p in state.player_order
+            ]
+        )
+    )
+    board = state.board
+    for y in range(board.height):
+        row = ""
+        for x in range(board.width):
+            tile = board.get_tile_at((x, y))
+            row += EMPTY_SQUARE_CHAR if tile is None else get_tile_char(tile)
+        lines.append(row)
+    return "\n".join(lines) + "\n"
+
+
+# Return the character for the given tile, as get_tile_from_char reads it.
+def get_tile_char(tile: Tile) -> str:
+    if isinstance(tile, BlankTile):
+        return BLANK_TILE_NO_LETTER if tile.letter is None else tile.letter.lower()
+    return tile.letter  # type: ignore
+
+
+# Return the position in the given text (in the corpus format), with its name.
+# Its bag has the Scrabble tiles that aren't on the board or in a rack, and draws from a seeded generator.
+def parse_position(text: str, config: GameConfig) -> tuple[str, GameState]:
+    lines = text.strip("\n").split("\n")
+    _, name, _, _, player_index = lines[0].split()
+    scores = [int(score) for score in lines[1].split()[1:]]
+    racks = lines[2].split()[1:]
+
+    players = [Player(i) for i in range(len(scores))]
+    board = get_scrabble_board()
+    for position, tile in get_position_to_tile_from_string(
+        tile_string="\n".join(lines[3:]), letter_to_points=SCRABBLE_LETTER_TO_POINTS
+    ).items():
+        board.set_tile_at(position, tile)
+
+    # The bag has the rest of the tiles.
+    bag_chars = list(SCRABBLE_INITIAL_TILES_STR)
+    used_chars = "".join(racks) + "".join(lines[3:]).replace(EMPTY_SQUARE_CHAR, "")
+    for c in used_chars:
+        bag_chars.remove(c if c.isupper() else BLANK_TILE_NO_LETTER)
+
+    state = GameState(
+        config=config,
+        current_player=players[int(player_index)],
+        player_order=players,
+        player_to_state={
+            p: PlayerState(
+                player=p,
+                score=score,
+                tiles=get_tiles_from_string(rack, letter_to_points=SCRABBLE_LETTER_TO_POINTS),
+            )
+            for p, score, rack in zip(players, scores, racks)
+        },
+        bag=Bag(
+            tiles=get_tiles_from_string(
+                "".join(bag_chars), letter_to_points=SCRABBLE_LETTER_TO_POINTS
+            )
+        ),
+        board=board,
+        rng=Random(0),
+    )
+    return name, state
+
+
+# Load the positions at the given path, by name.
+def load_positions(config: GameConfig, path: str = BENCHMARK_POSITIONS_PATH) -> dict[str, GameState]:
+    with open(path) as file:
+        text = file.read()
+    result = dict[str, GameState]()
+    for block in text.split("\n\n"):
+        if block.strip():
+            name, state = parse_position(text=block, config=config)
+            result[name] = state
+    return result
+
+
+# Save the given positions to the given path.
+def save_positions(positions: Mapping[str, GameState], path: str = BENCHMARK_POSITIONS_PATH) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        file.write("\n".join([format_position(name, state) for name, state in positions.items()]))
+
+
+# Make the corpus of positions from seeded games between players playing the highest-scoring word:
+# openings, middle games with lots of anchors, racks with both blanks, crowded late boards and endgames.
+def make_positions(config: GameConfig, seed: int = 0) -> dict[str, GameState]:
+    result = dict[str, GameState]()
+
+    for game_index in range(2):
+        rng = Random(f"{seed}:{game_index}")
+        players = [Player(0), Player(1)]
+        state = GameState(
+            config=config,
+            current_player=players[0],
+            player_order=players,
+            player_to_state={p: PlayerState(player=p, score=0, tiles=list()) for p in players},
+            bag=Bag(tiles=get_scrabble_tiles(rng=rng)),
+            board=get_scrabble_board(),
+            rng=rng,
+        )
+        for player_state in state.player_to_state.values():
+            draw_tiles_for_player(
+                player=player_state, bag=state.bag, num_tiles=config.max_tiles_in_hand
+            )
+        moves_finder = GaddagMoveFinder(words=config.playable_words)
+
+        num_turns = 0
+        while not state.game_finished:
+            name = None
+            if num_turns == 0:
+                name = f"opening_{game_index + 1}"
+            elif num_turns == 8:
+                name = f"midgame_{game_index + 1}"
+            elif len(state.bag) <= 12 and f"late_{game_index + 1}" not in result:
+                name = f"late_{game_index + 1}"
+            elif len(state.bag) == 0 and f"endgame_{game_index + 1}" not in result:
+                name = f"endgame_{game_index + 1}"
+            if name is not None:
+                result[name] = state.copy()
+
+            # The same positions, but with both blanks in the rack, swapped for two of its tiles
+            # from wherever they are (as long as they aren't on the board).
+            if num_turns in (0, 8):
+                blank_state = state.copy()
+                rack = blank_state.player_to_state[blank_state.current_player].tiles
+                tile_lists = [blank_state.bag.tiles] + [
+                    player_state.tiles
+                    for player_state in blank_state.player_to_state.values()
+                    if player_state.tiles is not rack
+                ]
+                blank_places = [
+                    (tiles, i)
+                    for tiles in tile_lists
+                    for i, tile in enumerate(tiles)
+                    if isinstance(tile, BlankTile)
+                ]
+                rack_indices = [i for i, tile in enumerate(rack) if not isinstance(tile, BlankTile)]
+                num_rack_blanks = len(rack) - len(rack_indices)
+                if blank_places and num_rack_blanks + len(blank_places) == 2:
+                    for rack_index, (tiles, i) in zip(rack_indices, blank_places):
+                        rack[rack_index], tiles[i] = tiles[i], rack[rack_index]
+                    stage = "opening" if num_turns == 0 else "midgame"
+                    result[f"{stage}_blanks_{game_index + 1}"] = blank_state
+
+            best_moves = moves_finder.best_moves(state=state, k=1)
+            move: Move = best_moves[0][0] if best_moves else PassMove()
+            move.perform(state=state)
+            num_turns += 1
+    return result
+
+
+# Return the given percentile of the given sorted values, by the nearest rank.
+def get_percentile(sorted_values: Sequence[float], percentile: float) -> float:
+    index = max(0, min(len(sorted_values) - 1, round(percentile / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+# The times of the samples of a benchmark, in seconds.
+@dataclass
+class BenchmarkResult:
+    name: str
+    samples: list[float]
+    # The number of calls each sample is the average of.
+    num_calls: int = 1
+    # Anything else worth reporting, like how many moves were found.
+    info: dict[str, Any] | None = None
+
+    # Return the result as JSON-compatible data.
+    def to_json(self) -> dict[str, Any]:
+        sorted_samples = sorted(self.samples)
+        result: dict[str, Any] = {
+            "unit": "seconds",
+            "num_samples": len(self.samples),
+            "num_calls_per_sample": self.num_calls,
+            "min": sorted_samples[0],
+            "max": sorted_samples[-1],
+            "mean": sum(sorted_samples) / len(sorted_samples),
+        }
+        for percentile in PERCENTILES:
+            result[f"p{percentile}"] = get_percentile(sorted_samples, percentile)
+        if self.info:
+            result["info"] = self.info
+        return result
+
+
+# Time the given function, returning the given number of samples, each the average of the given number of calls.
+# The setup function is called (untimed) before each sample, and its result is passed to the function.
+def time_samples(
+    function: Callable[[Any], Any],
+    num_samples: int,
+    num_calls: int = 1,
+    setup: Callable[[], Any] = lambda: None,
+) -> list[float]:
+    samples = list[float]()
+    for _ in range(num_samples):
+        argument = setup()
+        before = time.perf_counter()
+        for _ in range(num_calls):
+            function(argument)
+        samples.append((time.perf_counter() - before) / num_calls)
+    return samples
+
+
+# Return the benchmarks of move generation, validation and copying on the given position
+# whose names the given function accepts.
+def benchmark_position(
+    name: str,
+    state: GameState,
+    num_samples: int,
+    is_wanted: Callable[[str], bool] = lambda _: True,
+) -> list[BenchmarkResult]:
+    result = list[BenchmarkResult]()
+
+    # Add a benchmark of the given function, if it's wanted. Each sample is the average of the given number of calls.
+    def add(
+        benchmark: str,
+        function: Callable[[Any], Any],
+        num_calls: int = 1,
+        setup: Callable[[], Any] = lambda: None,
+        info: dict[str, Any] | None = None,
+    ) -> None:
+        benchmark_name = f"{benchmark}/{name}"
+        if not is_wanted(benchmark_name):
+            return
+        samples = time_samples(function, num_samples, num_calls=num_calls, setup=setup)
+        result.append(
+            BenchmarkResult(name=benchmark_name, samples=samples, num_calls=num_calls, info=info)
+        )
+
+    words = state.config.playable_words
+
+    # The GADDAG finder keeps its cross-checks between calls, as it does in a game.
+    gaddag_finder = GaddagMoveFinder(words=words)
+    moves = gaddag_finder.get_all_place_tiles_moves(state=state)
+    add(
+        "gaddag_move_finder",
+        lambda _: gaddag_finder.get_all_place_tiles_moves(state=state),
+        info={"num_moves": len(moves)},
+    )
+    add("gaddag_move_finder_best_move", lambda _: gaddag_finder.best_moves(state=state, k=1))
+    finder = PlaceTilesMoveFinder(words=words)
+    add("place_tiles_move_finder", lambda _: finder.get_all_place_tiles_moves(state=state))
+    add("playable_letter_info", lambda _: PlayableLetterInfo(state=state))
+
+    # Validating and making the moves found, as moves that aren't trusted, in turn.
+    untrusted_moves = [PlaceTilesMove(position_to_placing=move.position_to_placing) for move in moves]
+    if untrusted_moves:
+        move_iter = itertools.cycle(untrusted_moves)
+        num_calls = min(len(untrusted_moves), 1000)
+        add("place_tiles_move_is_valid", lambda _: next(move_iter).is_valid(state=state), num_calls)
+
+        def apply_and_unapply(_) -> None:
+            move = next(move_iter)
+            move.unapply(state=state, undo=move.apply(state=state))
+
+        add("place_tiles_move_apply_unapply", apply_and_unapply, num_calls)
+
+        # Performing a move on a copy of the state, as the strategies that look ahead used to.
+        add(
+            "place_tiles_move_perform",
+            lambda copy: untrusted_moves[0].perform(state=copy),
+            setup=state.copy,
+        )
+
+    add("game_state_copy", lambda _: state.copy(), num_calls=100)
+    return result
+
+
+# Return the benchmark of building the InfixData of the given words.
+def benchmark_infix_data(words: Collection[str], num_samples: int) -> BenchmarkResult:
+    return BenchmarkResult(
+        name="infix_data",
+        samples=time_samples(lambda _: infix_data.InfixData(words=words), num_samples),
+        info={"num_words": len(words)},
+    )
+
+
+# Return the benchmark of playing whole seeded games between players playing the highest-scoring word.
+def benchmark_games(config: GameConfig, num_games: int, seed: int = 0) -> BenchmarkResult:
+    samples = list[float]()
+    num_turns = 0
+    for game_index in range(num_games):
+        rng = Random(f"{seed}:{game_index}")
+        players = [Player(0), Player(1)]
+        state = GameState(
+            config=config,
+            current_player=players[0],
+            player_order=players,
+            player_to_state={p: PlayerState(player=p, score=0, tiles=list()) for p in players},
+            bag=Bag(tiles=get_scrabble_tiles(rng=rng)),
+            board=get_scrabble_board(),
+            rng=rng,
+        )
+        player_to_strategy = {p: ai_strategies.HighestScoringWordStrategy() for p in players}
+        before = time.perf_counter()
+        for _ in game_runner.run_game(state=state, player_to_strategy=player_to_strategy):
+            num_turns += 1
+        samples.append(time.perf_counter() - before)
+    return BenchmarkResult(
+        name="game",
+        samples=samples,
+        info={"turns_per_second": num_turns / sum(samples), "num_turns": num_turns},
+    )
+
+
+# Run the benchmarks whose names start with one of the given prefixes (or all of them),
+# and return the results as JSON-compatible data.
+def run_benchmarks(
+    config: GameConfig,
+    positions: Mapping[str, GameState],
+    num_samples: int = DEFAULT_NUM_SAMPLES,
+    num_games: int = DEFAULT_NUM_GAMES,
+    prefixes: Sequence[str] = (),
+) -> dict[str, Any]:
+    def is_wanted(name: str) -> bool:
+        return not prefixes or any([name.startswith(prefix) for prefix in prefixes])
+
+    results = list[BenchmarkResult]()
+    for name, state in positions.items():
+        results.extend(
+            benchmark_position(
+                name=name, state=state, num_samples=num_samples, is_wanted=is_wanted
+            )
+        )
+    if is_wanted("infix_data"):
+        # Building it takes seconds, so it's only done a few times.
+        results.append(
+            benchmark_infix_data(words=config.playable_words, num_samples=min(num_samples, 3))
+        )
+    if is_wanted("game") and num_games > 0:
+        results.append(benchmark_games(config=config, num_games=num_games))
+
+    return {
+        "time": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version,
+        "platform": platform.platform(),
+        "benchmarks": {result.name: result.to_json() for result in results},
+    }
+
+
+# Return, for each benchmark in both results, how many times longer its median time is than in the baseline.
+def compare_to_baseline(results: Mapping[str, Any], baseline: Mapping[str, Any]) -> dict[str, float]:
+    result = dict[str, float]()
+    for name, benchmark in results["benchmarks"].items():
+        baseline_benchmark = baseline["benchmarks"].get(name)
+        if baseline_benchmark is not None and baseline_benchmark["p50"] > 0:
+            result[name] = benchmark["p50"] / baseline_benchmark["p50"]
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Time move generation, validation and games.")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", help="Compare the median times with the results in this JSON file.")
+    parser.add_argument("--samples", type=int, default=DEFAULT_NUM_SAMPLES)
+    parser.add_argument("--games", type=int, default=DEFAULT_NUM_GAMES)
+    parser.add_argument(
+        "--only", nargs="*", default=(), help="Only run the benchmarks starting with these names."
+    )
+    parser.add_argument(
+        "--make-positions", action="store_true", help="Remake the corpus of positions first."
+    )
+    args = parser.parse_args()
+
+    config = get_scrabble_config()
+    if args.make_positions:
+        save_positions(make_positions(config=config))
+    positions = load_positions(config=config)
+
+    results = run_benchmarks(
+        config=config,
+        positions=positions,
+        num_samples=args.samples,
+        num_games=args.games,
+        prefixes=args.only,
+    )
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            results["ratios_to_baseline"] = compare_to_baseline(results=results, baseline=json.load(file))
+
+    text = json.dumps(results, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
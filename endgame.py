@@ -0,0 +1,340 @@
+import time
+from dataclasses import dataclass, field
+from typing import Hashable
+
+from game_state import GameState, Player, Tile
+from move_cache import MoveCache
+from rules import CompactMove, Move, MoveUndo, PassMove, get_going_out_points
+
+import move_generation
+
+# Solves the endgame: the end of a two-player game, once the bag is empty and both racks are known.
+# It's a negamax search with alpha-beta pruning over every place-tiles move and passing,
+# going forwards and backwards through one state with Move.apply and Move.unapply.
+# The moves are tried best-scoring first (and the best move found before first), and the search is run
+# one ply deeper at a time until it reaches the end of the game down every line or runs out of time.
+#
+# Values are the spread (the player to move's score minus the other player's) that's still to be gained
+# from a position, so they don't depend on the scores so far and positions can be shared between lines.
+# They're kept in a transposition table keyed on the board's Zobrist hash, which of their starting tiles
+# each player still has, the player to move and the number of scoreless turns.
+# Finding the moves takes most of the time, so the moves in each position are cached too,
+# for the deeper searches to reuse.
+# The end of the game is scored by the moves themselves: going out gets the other player's tiles
+# (deduct_final_tile_points), and passing or scoring nothing enough times in a row ends the game with
+# both players losing their tiles' points (scoreless_turns_to_end_game).
+
+# Bigger than any spread.
+INFINITE_SPREAD = 10**9
+
+# Whether a value in the transposition table is exact, or only a lower or upper bound.
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# The depth a value in the transposition table is good for when it was found at the end of the game
+# down every line, so it's good for any depth.
+SOLVED_DEPTH = 10**6
+
+# What identifies a move among the moves in a position: the start, step, tiles and letters of
+# a compact move, or PASS_KEY for passing.
+MoveKey = Hashable
+PASS_KEY = "pass"
+
+
+# The best line of play found by the endgame solver.
+@dataclass
+class EndgameResult:
+    # The move to play.
+    move: Move
+    # The final spread for the player to move, if both players play the best line.
+    # If the endgame wasn't solved, it's the spread at the end of the deepest search that finished.
+    spread: int
+    # The best line of play, starting with the move to play.
+    moves: list[Move] = field(default_factory=list)
+    # The number of plies searched.
+    depth: int = 0
+    # Whether the search reached the end of the game down every line, so the spread is exact.
+    solved: bool = False
+    num_nodes: int = 0
+
+
+# The search was stopped because its time was up.
+class _EndgameTimeout(Exception):
+    pass
+
+
+# An entry in the transposition table: (depth, value, bound, key of the best move).
+_TableEntry = tuple[int, int, int, MoveKey]
+
+
+# Return the key of the given compact move (or None, for passing).
+def _get_move_key(move: CompactMove | None) -> MoveKey:
+    if move is None:
+        return PASS_KEY
+    return (move.start, move.step, move.tiles, move.letters)
+
+
+# Return the given player's score minus the score of the other player.
+def get_spread(state: GameState, player: Player) -> int:
+    result = 0
+    for other, other_state in state.player_to_state.items():
+        if other == player:
+            result += other_state.score
+        else:
+            result -= other_state.score
+    return result
+
+
+# Searches one endgame.
+class EndgameSolver:
+    def __init__(
+        self,
+        state: GameState,
+        time_limit: float,
+        moves_finder: move_generation.GaddagMoveFinder | None = None,
+    ) -> None:
+        if len(state.player_to_state) != 2:
+            raise ValueError("The endgame solver only works for two players")
+        if len(state.bag) > 0:
+            raise ValueError("The endgame solver only works once the bag is empty")
+        if state.game_finished:
+            raise ValueError("The game is already finished")
+
+        # The search goes forwards and backwards through its own copy of the state.
+        self.state = state.copy()
+        self.deadline = time.perf_counter() + time_limit
+        if moves_finder is None:
+            moves_finder = move_generation.GaddagMoveFinder(words=state.config.playable_words)
+        self.moves_finder = moves_finder
+
+        # For each player, the bit for each of the tiles they start with. Equal tiles have consecutive bits,
+        # and the tiles left are always given the lowest of them, so the same tiles always get the same mask.
+        self.player_to_tile_bits = dict[Player, dict[Tile, list[int]]]()
+        num_bits = 0
+        for player, player_state in self.state.player_to_state.items():
+            tile_to_bits = dict[Tile, list[int]]()
+            for tile in player_state.tiles:
+                tile_to_bits.setdefault(tile, list[int]()).append(1 << num_bits)
+                num_bits += 1
+            self.player_to_tile_bits[player] = tile_to_bits
+
+        self.table = dict[Hashable, _TableEntry]()
+        self.move_cache = MoveCache()
+        self.num_nodes = 0
+        # The number of times the search stopped at its depth before the end of the game.
+        self.num_depth_cutoffs = 0
+
+    # Return the mask of the starting tiles the given player still has.
+    def _get_rack_mask(self, player: Player) -> int:
+        tile_to_bits = self.player_to_tile_bits[player]
+        tile_to_count = dict[Tile, int]()
+        mask = 0
+        for tile in self.state.player_to_state[player].tiles:
+            count = tile_to_count.get(tile, 0)
+            tile_to_count[tile] = count + 1
+            mask |= tile_to_bits[tile][count]
+        return mask
+
+    # Return the key of the current position in the transposition table.
+    def _get_table_key(self) -> Hashable:
+        state = self.state
+        return (
+            state.board.zobrist_hash,
+            tuple([self._get_rack_mask(player) for player in state.player_order]),
+            state.current_player.position,
+            state.num_scoreless_turns,
+        )
+
+    # Return the moves in the current position in the order to try them, with the spread they gain
+    # (or None for passing, which is worked out by making it): the move with the given key first
+    # (if there is one), then the rest by the spread they gain, and passing last.
+    # Going out gains the points of the other player's tiles twice, once for each player's score.
+    def _get_ordered_moves(
+        self, first_key: MoveKey | None
+    ) -> list[tuple[CompactMove | None, int | None]]:
+        state = self.state
+        num_tiles = len(state.player_to_state[state.current_player].tiles)
+        going_out_points = get_going_out_points(state=state, num_tiles_placed=num_tiles)
+
+        cache_key = (
+            state.board.zobrist_hash,
+            state.current_player.position,
+            self._get_rack_mask(state.current_player),
+        )
+        found_moves = self.move_cache.get(cache_key)
+        if found_moves is None:
+            found_moves = list(self.moves_finder.iter_compact_moves_with_points(state=state))
+            self.move_cache.put(cache_key, found_moves)
+
+        moves = list[tuple[CompactMove | None, int | None]]()
+        for move, points in found_moves:
+            if move.num_tiles >= num_tiles:
+                points += 2 * going_out_points
+            moves.append((move, points))
+        moves.sort(key=lambda move_and_gain: -move_and_gain[1])  # type: ignore
+        moves.append((None, None))
+
+        if first_key is not None:
+            for i, (move, _) in enumerate(moves):
+                if _get_move_key(move) == first_key:
+                    moves.insert(0, moves.pop(i))
+                    break
+        return moves
+
+    # Turn the given compact move (or None for passing) into a move in the current position.
+    def _to_move(self, move: CompactMove | None) -> Move:
+        if move is None:
+            return PassMove()
+        return move.to_place_tiles_move(board=self.state.board)
+
+    # Make the given compact move (or None for passing), and return the spread the player to move gains by it
+    # and after it, searching the given number of plies in all.
+    def _get_value_after(self, move: CompactMove | None, depth: int, alpha: int, beta: int) -> int:
+        state = self.state
+        player = state.current_player
+        start_spread = get_spread(state=state, player=player)
+        full_move = self._to_move(move)
+        undo = full_move.apply(state=state)
+        try:
+            gain = get_spread(state=state, player=player) - start_spread
+            if state.game_finished:
+                return gain
+            return gain - self._search(depth=depth - 1, alpha=gain - beta, beta=gain - alpha)
+        finally:
+            full_move.unapply(state=state, undo=undo)
+
+    # Return the spread the player to move will gain from here, searching the given number of plies.
+    # Values at or below alpha are only upper bounds, and values at or above beta are only lower bounds.
+    def _search(self, depth: int, alpha: int, beta: int) -> int:
+        state = self.state
+        if state.game_finished:
+            return 0
+        self.num_nodes += 1
+        if time.perf_counter() > self.deadline:
+            raise _EndgameTimeout()
+
+        key = self._get_table_key()
+        entry = self.table.get(key)
+        best_key: MoveKey | None = None
+        if entry is not None:
+            entry_depth, value, bound, best_key = entry
+            if entry_depth >= depth and (
+                bound == EXACT
+                or (bound == LOWER_BOUND and value >= beta)
+                or (bound == UPPER_BOUND and value <= alpha)
+            ):
+                # A value that was cut off at some depth is still cut off here.
+                if entry_depth < SOLVED_DEPTH:
+                    self.num_depth_cutoffs += 1
+                return value
+
+        if depth <= 0:
+            self.num_depth_cutoffs += 1
+            return 0
+
+        start_alpha = alpha
+        num_depth_cutoffs = self.num_depth_cutoffs
+        num_tiles = len(state.player_to_state[state.current_player].tiles)
+
+        best_value = -INFINITE_SPREAD
+        for move, gain in self._get_ordered_moves(first_key=best_key):
+            if depth == 1 and gain is not None and gain > 0:
+                # The value of a move at the last ply is just what it gains, so it doesn't have to be made.
+                # (A move that scores nothing might end the game for scoreless turns, so it's made.)
+                value = gain
+                if move.num_tiles < num_tiles:  # type: ignore
+                    self.num_depth_cutoffs += 1
+            else:
+                value = self._get_value_after(move=move, depth=depth, alpha=alpha, beta=beta)
+
+            if value > best_value:
+                best_value = value
+                best_key = _get_move_key(move)
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                break
+
+        if best_value <= start_alpha:
+            bound = UPPER_BOUND
+        elif best_value >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        # If the search reached the end of the game down every line, the value is good for any depth.
+        table_depth = depth if self.num_depth_cutoffs > num_depth_cutoffs else SOLVED_DEPTH
+        self.table[key] = (table_depth, best_value, bound, best_key)
+        return best_value
+
+    # Return the best line of play from the current position, following the best moves in the table.
+    def _get_best_line(self, max_length: int) -> list[Move]:
+        state = self.state
+        line = list[Move]()
+        applied = list[tuple[Move, MoveUndo]]()
+        try:
+            while len(line) < max_length and not state.game_finished:
+                entry = self.table.get(self._get_table_key())
+                if entry is None:
+                    break
+                move, _ = self._get_ordered_moves(first_key=entry[3])[0]
+                full_move = self._to_move(move)
+                line.append(full_move)
+                applied.append((full_move, full_move.apply(state=state)))
+        finally:
+            for full_move, undo in reversed(applied):
+                full_move.unapply(state=state, undo=undo)
+        return line
+
+    # Search one ply deeper at a time until the endgame is solved or the time is up,
+    # and return the best line from the deepest search that finished.
+    # At least one ply is always searched.
+    def solve(self, max_depth: int | None = None) -> EndgameResult:
+        state = self.state
+        player = state.current_player
+        start_spread = get_spread(state=state, player=player)
+
+        # Every turn that doesn't end the game places a tile, or is one of a run of scoreless turns.
+        if max_depth is None:
+            num_tiles = sum([len(player_state.tiles) for player_state in state.player_to_state.values()])
+            max_depth = (num_tiles + 1) * state.config.scoreless_turns_to_end_game
+
+        result: EndgameResult | None = None
+        for depth in range(1, max_depth + 1):
+            self.num_depth_cutoffs = 0
+            try:
+                value = self._search(depth=depth, alpha=-INFINITE_SPREAD, beta=INFINITE_SPREAD)
+            except _EndgameTimeout:
+                if result is not None:
+                    break
+                # Not even one ply was searched in time, so search one ply anyway.
+                deadline = self.deadline
+                self.deadline = float("inf")
+                self.num_depth_cutoffs = 0
+                value = self._search(depth=1, alpha=-INFINITE_SPREAD, beta=INFINITE_SPREAD)
+                self.deadline = deadline
+            solved = self.num_depth_cutoffs == 0
+            line = self._get_best_line(max_length=depth)
+            result = EndgameResult(
+                move=line[0],
+                spread=start_spread + value,
+                moves=line,
+                depth=depth,
+                solved=solved,
+                num_nodes=self.num_nodes,
+            )
+            if solved or time.perf_counter() > self.deadline:
+                break
+
+        result.num_nodes = self.num_nodes  # type: ignore
+        return result  # type: ignore
+
+
+# Solve the endgame in the given state within the given time, in seconds.
+# The state must have two players and an empty bag. It isn't changed.
+def solve_endgame(
+    state: GameState,
+    time_limit: float,
+    moves_finder: move_generation.GaddagMoveFinder | None = None,
+) -> EndgameResult:
+    return EndgameSolver(state=state, time_limit=time_limit, moves_finder=moves_finder).solve()
@@ -0,0 +1,265 @@
+from array import array
+from typing import Iterable, Sequence
+
+from constants import ALPHABET
+
+# Separates the reversed prefix of a word from the rest of the word in a GADDAG string.
+# It sorts after all of the letters, so sorted strings add edges in the same order as the mask bits.
+SEPARATOR = "|"
+
+# The index of each character's bit in a node mask.
+CHAR_TO_INDEX = {c: i for i, c in enumerate(ALPHABET + SEPARATOR)}
+SEPARATOR_INDEX = CHAR_TO_INDEX[SEPARATOR]
+
+# The bits in a node mask for the letters and for the separator.
+LETTER_BITS = (1 << SEPARATOR_INDEX) - 1
+SEPARATOR_BIT = 1 << SEPARATOR_INDEX
+
+# The bit in a node mask that's set when a whole GADDAG string ends at the node.
+TERMINAL_BIT = 1 << (SEPARATOR_INDEX + 1)
+
+# The node that every GADDAG string starts from.
+ROOT = 0
+
+
+# Return all of the GADDAG strings for the given word.
+# For each split of the word, the letters before the split are reversed and then the separator
+# and the letters after the split are added. The split after the last letter leaves out the separator.
+def get_gaddag_strings(word: str) -> list[str]:
+    result = [word[::-1]]
+    for i in range(1, len(word)):
+        result.append(word[i - 1 :: -1] + SEPARATOR + word[i:])
+    return result
+
+
+# A node of the GADDAG while it is being built.
+class _BuildNode:
+    __slots__ = ("edges", "terminal", "index")
+
+    def __init__(self) -> None:
+        self.edges = dict[int, _BuildNode]()
+        self.terminal = False
+        self.index = -1
+
+
+# Build the minimal automaton accepting exactly the given strings, which must be sorted and unique.
+# This is Daciuk's incremental algorithm, so only the path of the last string is ever unminimized.
+def _build_minimal_automaton(strings: Iterable[str]) -> _BuildNode:
+    root = _BuildNode()
+    register = dict[tuple, _BuildNode]()
+    # The (parent, index, child) edges along the path of the last string that aren't minimized yet.
+    unchecked = list[tuple[_BuildNode, int, _BuildNode]]()
+
+    # Replace the unchecked nodes below the given depth with equivalent registered nodes.
+    def minimize(down_to: int) -> None:
+        while len(unchecked) > down_to:
+            parent, index, child = unchecked.pop()
+            key = (
+                child.terminal,
+                tuple([(i, id(c)) for i, c in child.edges.items()]),
+            )
+            registered = register.get(key)
+            if registered is None:
+                register[key] = child
+            else:
+                parent.edges[index] = registered
+
+    prev = ""
+    for s in strings:
+        # Find the length of the prefix shared with the previous string.
+        max_common = min(len(s), len(prev))
+        common = 0
+        while common < max_common and s[common] == prev[common]:
+            common += 1
+        minimize(common)
+
+        # Add the rest of the string.
+        node = unchecked[-1][2] if unchecked else root
+        for c in s[common:]:
+            child = _BuildNode()
+            index = CHAR_TO_INDEX[c]
+            node.edges[index] = child
+            unchecked.append((node, index, child))
+            node = child
+        node.terminal = True
+        prev = s
+    minimize(0)
+
+    return root
+
+
+# Return, for each node, the mask of the letters that can come right after the separator
+# on some path from the node that only has letters before the separator.
+# From the node reached by following a reversed string,
+# these are the letters that can come right after that string in a word.
+def _get_after_separator_masks(
+    masks: Sequence[int], first_child: Sequence[int], children: Sequence[int]
+) -> array:
+    num_nodes = len(masks)
+    result = array("I", bytes(4 * num_nodes))
+    done = bytearray(num_nodes)
+
+    # Go through the nodes depth-first, so each node's letter children are done before it is.
+    for start in range(num_nodes):
+        stack = [start]
+        while stack:
+            node = stack[-1]
+            if done[node]:
+                stack.pop()
+                continue
+            mask = masks[node]
+            first = first_child[node]
+            num_letters = (mask & LETTER_BITS).bit_count()
+            letter_children = children[first : first + num_letters]
+            not_done = [child for child in letter_children if not done[child]]
+            if not_done:
+                stack.extend(not_done)
+                continue
+
+            after_separator_mask = 0
+            for child in letter_children:
+                after_separator_mask |= result[child]
+            # The separator's child comes after all of the letters' children.
+            if mask & SEPARATOR_BIT:
+                separator_child = children[first + num_letters]
+                after_separator_mask |= masks[separator_child] & LETTER_BITS
+            result[node] = after_separator_mask
+            done[node] = 1
+            stack.pop()
+
+    return result
+
+
+# Return, for each node, the most letters on any path from the node to the end of a GADDAG string.
+# A move continuing from the node can't place more tiles than this.
+def _get_max_letters_left(
+    masks: Sequence[int], first_child: Sequence[int], children: Sequence[int]
+) -> array:
+    num_nodes = len(masks)
+    result = array("I", bytes(4 * num_nodes))
+    done = bytearray(num_nodes)
+
+    # Go through the nodes depth-first, so each node's children are done before it is.
+    for start in range(num_nodes):
+        stack = [start]
+        while stack:
+            node = stack[-1]
+            if done[node]:
+                stack.pop()
+                continue
+            mask = masks[node]
+            first = first_child[node]
+            num_letters = (mask & LETTER_BITS).bit_count()
+            num_children = (mask & (LETTER_BITS | SEPARATOR_BIT)).bit_count()
+            node_children = children[first : first + num_children]
+            not_done = [child for child in node_children if not done[child]]
+            if not_done:
+                stack.extend(not_done)
+                continue
+
+            max_letters_left = 0
+            for i, child in enumerate(node_children):
+                # The separator isn't a letter.
+                letters_left = result[child] + (1 if i < num_letters else 0)
+                if letters_left > max_letters_left:
+                    max_letters_left = letters_left
+            result[node] = max_letters_left
+            done[node] = 1
+            stack.pop()
+
+    return result
+
+
+# A GADDAG of the playable words (Gordon, "A Faster Scrabble Move Generation Algorithm").
+# Every word can be read starting from any of its letters: first backwards to the start of the word,
+# then the separator, then forwards to the end of the word.
+# The automaton is minimized and packed into flat arrays:
+# each node has a mask of its outgoing characters (and the terminal bit),
+# and its children are stored together, in the order of the bits of the mask.
+# The arrays can also be loaded from a compiled lexicon file (see lexicon.py) with from_arrays().
+class Gaddag:
+    def __init__(self, words: Iterable[str]) -> None:
+        strings = set[str]()
+        for word in set(words):
+            strings.update(get_gaddag_strings(word))
+        root = _build_minimal_automaton(sorted(strings))
+        del strings
+
+        # Number the nodes in breadth-first order, so the root is node 0.
+        root.index = ROOT
+        nodes = [root]
+        i = 0
+        while i < len(nodes):
+            for child in nodes[i].edges.values():
+                if child.index < 0:
+                    child.index = len(nodes)
+                    nodes.append(child)
+            i += 1
+
+        # Pack the nodes.
+        self.masks = array("I")
+        self.first_child = array("I")
+        self.children = array("I")
+        for node in nodes:
+            mask = TERMINAL_BIT if node.terminal else 0
+            self.first_child.append(len(self.children))
+            for index, child in node.edges.items():
+                mask |= 1 << index
+                self.children.append(child.index)
+            self.masks.append(mask)
+
+        self.after_separator_masks = _get_after_separator_masks(
+            masks=self.masks, first_child=self.first_child, children=self.children
+        )
+        self.max_letters_left = _get_max_letters_left(
+            masks=self.masks, first_child=self.first_child, children=self.children
+        )
+
+    # Return a GADDAG using the given packed arrays, without building anything.
+    @classmethod
+    def from_arrays(
+        cls,
+        masks: Sequence[int],
+        first_child: Sequence[int],
+        children: Sequence[int],
+        after_separator_masks: Sequence[int],
+        max_letters_left: Sequence[int],
+    ) -> "Gaddag":
+        result = cls.__new__(cls)
+        result.masks = masks
+        result.first_child = first_child
+        result.children = children
+        result.after_separator_masks = after_separator_masks
+        result.max_letters_left = max_letters_left
+        return result
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.masks)
+
+    # Return the child of the node along the given character index, or -1 if there is none.
+    def get_child(self, node: int, index: int) -> int:
+        mask = self.masks[node]
+        bit = 1 << index
+        if not mask & bit:
+            return -1
+        return self.children[self.first_child[node] + (mask & (bit - 1)).bit_count()]
+
+    # Return whether a whole GADDAG string ends at the given node.
+    def is_terminal(self, node: int) -> bool:
+        return bool(self.masks[node] & TERMINAL_BIT)
+
+    # Return the node reached by following the given characters from the given node, or -1 if there is none.
+    def follow(self, s: str, node: int = ROOT) -> int:
+        for c in s:
+            node = self.get_child(node, CHAR_TO_INDEX[c])
+            if node < 0:
+                return -1
+        return node
+
+    # Return whether the given word is in the GADDAG.
+    def contains_word(self, word: str) -> bool:
+        if word == "":
+            return False
+        node = self.follow(word[::-1])
+        return node >= 0 and self.is_terminal(node)
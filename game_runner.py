@@ -1,15 +1,22 @@
+from contextlib import AbstractContextManager, nullcontext
 from typing import Generator
 import random
 
 from game_state import *
 from rules import *
 import ai_strategies
+import leaves
+import profiling
 
 
-# Randomly initialize the state of the game.
+# Randomly initialize the state of the game, with the state's random number generator.
 def do_random_init(state: GameState) -> None:
     # Randomly determine the starting player.
-    starting_player = random.choice(state.player_order)
+    rng = state.rng
+    if rng is None:
+        starting_player = random.choice(state.player_order)
+    else:
+        starting_player = rng.choice(state.player_order)
     state.current_player = starting_player
 
     # Randomly draw tiles for each player.
@@ -20,18 +27,39 @@ def do_random_init(state: GameState) -> None:
 
 
 # Run a game of Scrabble.
+# If a profile is given, the time spent in each phase of each turn and the work done in it are added to it
+# (see profiling.py), for the strategy with the player's name in player_to_name, or its own name by default.
 # TODO only give each player the state visible to it.
 def run_game(
-    state: GameState, player_to_strategy: Mapping[Player, MoveGetter], random_init=True
+    state: GameState,
+    player_to_strategy: Mapping[Player, MoveGetter],
+    random_init=True,
+    profile: profiling.GameProfile | None = None,
+    player_to_name: Mapping[Player, str] | None = None,
 ) -> Generator[tuple[Move | None, GameState], None, None]:
     # Randomly draw tiles and determine the starting player, if requested.
     if random_init:
         do_random_init(state=state)
 
+    # The names the strategies are profiled under.
+    if player_to_name is None:
+        player_to_name = {p: strategy.get_name() for p, strategy in player_to_strategy.items()}
+    if profile is not None:
+        profile.start_game()
+
+    # Return a context to time the given phase in, for the given player's strategy.
+    def phase(name: str, player: Player) -> AbstractContextManager:
+        if profile is None:
+            return nullcontext()
+        return profile.phase(phase=name, strategy=player_to_name[player])
+
     # Notify the move-getters of the new state.
     def notify_state():
-        for strategy in player_to_strategy.values():
-            strategy.notify_new_state(state=state.copy())
+        for player, strategy in player_to_strategy.items():
+            with phase(profiling.COPY, player):
+                state_copy = state.copy()
+            with phase(profiling.NOTIFY, player):
+                strategy.notify_new_state(state=state_copy)
 
     # Yield the initial state.
     yield None, state.copy()
@@ -39,20 +67,64 @@ def run_game(
 
     while not state.game_finished:
         # Get the current player's move.
-        strategy = player_to_strategy[state.current_player]
-        move = strategy.get_move(state=state.copy())
+        player = state.current_player
+        strategy = player_to_strategy[player]
+        if profile is not None:
+            profile.start_turn(strategy=player_to_name[player])
+        with phase(profiling.COPY, player):
+            state_copy = state.copy()
+        with phase(profiling.STRATEGY, player):
+            move = strategy.get_move(state=state_copy)
 
-        # If it isn't valid, replace it with a pass move.
-        if not move.is_valid(state=state):
-            move = PassMove()
+        with phase(profiling.IS_VALID, player):
+            # If it isn't valid, replace it with a pass move.
+            if not move.is_valid(state=state):
+                move = PassMove()
 
-        # Double-check that the move is now valid.
-        if not move.is_valid(state=state):
+            # Double-check that the move is now valid.
+            is_valid = move.is_valid(state=state)
+        if not is_valid:
             break  # TODO log this(?).
 
         # Perform the move.
-        move.perform(state=state)
+        with phase(profiling.PERFORM, player):
+            move.perform(state=state)
 
         # Yield the move and the new state.
-        yield move, state.copy()
-        notify_state()
\ No newline at end of file
+        with phase(profiling.COPY, player):
+            state_copy = state.copy()
+        yield move, state_copy
+        notify_state()
+
+# Run a game of Scrabble, and return a sample for each leave a player kept while there were tiles to draw,
+# with the points the player scored on their next turn. These are what a leave table is made from.
+def get_leave_samples(
+    state: GameState, player_to_strategy: Mapping[Player, MoveGetter], random_init=True
+) -> list[leaves.LeaveSample]:
+    result = list[leaves.LeaveSample]()
+    # The leave each player kept on their last turn, waiting to see how they do next turn.
+    player_to_leave = dict[Player, str]()
+
+    prev_state: GameState | None = None
+    for move, new_state in run_game(
+        state=state, player_to_strategy=player_to_strategy, random_init=random_init
+    ):
+        if prev_state is not None:
+            player = prev_state.current_player
+            points = (
+                new_state.player_to_state[player].score
+                - prev_state.player_to_state[player].score
+            )
+            leave = player_to_leave.pop(player, None)
+            if leave is not None:
+                result.append(leaves.LeaveSample(leave=leave, next_points=points))
+
+            # Only leaves that get topped up from the bag are of interest.
+            if isinstance(move, PlaceTilesMove) and len(new_state.bag) > 0:
+                player_to_leave[player] = leaves.get_leave(
+                    rack=prev_state.player_to_state[player].tiles,
+                    tiles_used=[placing.tile for placing in move.position_to_placing.values()],
+                )
+        prev_state = new_state
+
+    return result
@@ -7,12 +7,19 @@ from typing import (
     Collection,
     Sequence,
     Iterable,
+    Iterator,
 )
 from dataclasses import dataclass
+from random import Random, getrandbits, randrange
 from frozendict import frozendict
 
 from constants import *
+import anagrams
 import infix_data
+import gaddag
+import lexicon
+import profiling
+import zobrist
 
 # from utils import ALPHABET
 # ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
@@ -135,7 +142,9 @@ class GameConfig:
         bonus_points: int,
         scoreless_turns_to_end_game: int,
         config_name: str = "",
-        infix_data: infix_data.InfixData | None = None,
+        infix_data: infix_data.InfixData | infix_data.GaddagInfixData | None = None,
+        gaddag: gaddag.Gaddag | None = None,
+        lexicon_path: str | None = None,
     ):
         self.playable_words = frozenset(playable_words)
         self.min_tiles_for_turn_in = min_tiles_for_turn_in
@@ -146,13 +155,64 @@ class GameConfig:
         self.config_name = config_name
         # self._infix_data = infix_data.InfixData(words=self.playable_words)
         self._infix_data = infix_data
-
+        self._gaddag = gaddag
+        self._anagram_index: anagrams.AnagramIndex | None = None
+        # The words the infix data, GADDAG and anagram index are for. If playable_words is replaced, they're made again.
+        self._lexicon_words = self.playable_words
+        # The compiled lexicon file the words and GADDAG were loaded from, if they were (see lexicon.py).
+        self.lexicon_path = lexicon_path
+
+    # Forget the infix data, GADDAG and anagram index if they aren't for the current words.
+    def _check_lexicon_words(self) -> None:
+        if self._lexicon_words is not self.playable_words:
+            self._infix_data = None
+            self._gaddag = None
+            self._anagram_index = None
+            self._lexicon_words = self.playable_words
+            self.lexicon_path = None
+
+    # If there's already a GADDAG, the infix data is answered from it instead of being built.
     @property
-    def infix_data(self) -> infix_data.InfixData:
+    def infix_data(self) -> infix_data.InfixData | infix_data.GaddagInfixData:
+        self._check_lexicon_words()
         if self._infix_data is None:
-            self._infix_data = infix_data.InfixData(words=self.playable_words)
+            if self._gaddag is not None:
+                self._infix_data = infix_data.GaddagInfixData(gaddag=self._gaddag)
+            else:
+                self._infix_data = infix_data.InfixData(words=self.playable_words)
         return self._infix_data
 
+    @property
+    def gaddag(self) -> gaddag.Gaddag:
+        self._check_lexicon_words()
+        if self._gaddag is None:
+            self._gaddag = gaddag.Gaddag(words=self.playable_words)
+        return self._gaddag
+
+    @property
+    def anagram_index(self) -> anagrams.AnagramIndex:
+        self._check_lexicon_words()
+        if self._anagram_index is None:
+            self._anagram_index = anagrams.AnagramIndex(words=self.playable_words)
+        return self._anagram_index
+
+    # A config loaded from a compiled lexicon is pickled with the lexicon's path instead of its words and GADDAG,
+    # which are memory-mapped from the file and can't be pickled. The file is opened again when it's unpickled,
+    # as it is in worker processes that aren't forked.
+    def __getstate__(self) -> dict:
+        self._check_lexicon_words()
+        result = dict(self.__dict__)
+        if self.lexicon_path is not None:
+            for name in ("playable_words", "_infix_data", "_gaddag", "_anagram_index", "_lexicon_words"):
+                result[name] = None
+        return result
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        if self.lexicon_path is not None:
+            self.playable_words, self._gaddag = lexicon.load_lexicon(self.lexicon_path)
+            self._lexicon_words = self.playable_words
+
 
 # A player in the game.
 @dataclass
@@ -216,16 +276,112 @@ class VisiblePlayerState:
 VISIBLE_PLAYER_STATE = PlayerState | VisiblePlayerState
 
 
+# Return a copy of the given random number generator, which makes the same numbers from here on.
+def copy_rng(rng: Random) -> Random:
+    result = Random.__new__(type(rng))
+    result.setstate(rng.getstate())
+    return result
+
+
 # The state of the tile-bag.
-@dataclass
+# The tiles are in no particular order: they're drawn from random places in the list,
+# so drawing k tiles takes O(k) time and the bag never needs shuffling.
+# Copies share their list of tiles until one of them changes it,
+# so copying a state doesn't copy the bag unless the copy draws from it.
+# A copy of a bag with a random number generator gets a copy of the generator too (also when it's first used),
+# so the copy draws what the bag would have, and drawing from one of them doesn't change what the other draws.
+@dataclass(eq=False)
 class Bag:
-    tiles: list[Tile]
+    _tiles: list[Tile]
+
+    def __init__(self, tiles: Iterable[Tile], rng: Random | None = None):
+        self._tiles = list(tiles)
+        # Whether the list of tiles might be shared with a copy, and has to be copied before it's changed.
+        self._shared = False
+        self._rng = rng
+        # Whether the random number generator might be shared with a copy, and has to be copied before it's used.
+        self._rng_shared = False
+
+    # The tiles in the bag, to be changed. If they're shared with a copy, they're copied first.
+    # Use len() and iter() on the bag to look at them without copying them.
+    @property
+    def tiles(self) -> list[Tile]:
+        if self._shared:
+            self._tiles = list(self._tiles)
+            self._shared = False
+        return self._tiles
+
+    @tiles.setter
+    def tiles(self, tiles: list[Tile]) -> None:
+        self._tiles = tiles
+        self._shared = False
+
+    # Where the random draws come from. The random module is used if this is None.
+    # If it's shared with a copy, it's copied first.
+    @property
+    def rng(self) -> Random | None:
+        if self._rng_shared:
+            self._rng = copy_rng(self._rng)  # type: ignore
+            self._rng_shared = False
+        return self._rng
+
+    @rng.setter
+    def rng(self, rng: Random | None) -> None:
+        self._rng = rng
+        self._rng_shared = False
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+    def __iter__(self) -> Iterator[Tile]:
+        return iter(self._tiles)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Bag):
+            return NotImplemented
+        return self._tiles == other._tiles
+
+    def __repr__(self) -> str:
+        return f"Bag(tiles={self._tiles})"
+
+    # Return a copy of this bag, which shares its tiles until one of them changes.
+    def copy(self) -> "Bag":
+        result = Bag.__new__(Bag)
+        result._tiles = self._tiles
+        result._shared = True
+        self._shared = True
+        result._rng = self._rng
+        result._rng_shared = self._rng_shared = self._rng is not None
+        return result
 
-    def __init__(self, tiles: Iterable[Tile]):
-        self.tiles = list(tiles)
+    # Return a random index into the given number of tiles.
+    def _get_random_index(self, num_tiles: int) -> int:
+        rng = self.rng
+        if rng is None:
+            return randrange(num_tiles)
+        return rng.randrange(num_tiles)
+
+    # Take a tile from a random place in the bag, and return it along with the place, for put_back.
+    def draw_one(self) -> tuple[Tile, int]:
+        tiles = self.tiles
+        # Swap the tile to the end of the list, and take it from there.
+        i = self._get_random_index(len(tiles))
+        tiles[i], tiles[-1] = tiles[-1], tiles[i]
+        return tiles.pop(), i
+
+    # Put a tile taken with draw_one back in the place it came from.
+    # The tiles drawn after it must have been put back first.
+    def put_back(self, tile: Tile, index: int) -> None:
+        tiles = self.tiles
+        tiles.append(tile)
+        tiles[index], tiles[-1] = tiles[-1], tiles[index]
+
+    # Take the given number of tiles from random places in the bag (or all of them, if there aren't that many).
+    def draw(self, num_tiles: int) -> list[Tile]:
+        return [self.draw_one()[0] for _ in range(min(num_tiles, len(self._tiles)))]
 
     def get_visible_to(self, p: Player) -> "VisibleTileBagState":
-        return VisibleTileBagState(tiles=[None] * len(self.tiles))
+        return VisibleTileBagState(tiles=[None] * len(self._tiles))
 
 
 # The state of the tile-bag, as visible to the players.
@@ -282,13 +438,53 @@ def get_adjacent_positions(positions: Iterable[BoardPosition]) -> set[BoardPosit
     return {p for p in result if p not in positions}
 
 
+# The letter code in Board.letters of a square with no letter on it.
+NO_LETTER_CODE = 0
+
+
+# The tiles on a board, as a mapping from position to tile.
+# Reading and writing it reads and writes the board's arrays.
+class BoardTiles(MutableMapping[BoardPosition, Tile]):
+    def __init__(self, board: "Board") -> None:
+        self.board = board
+
+    def __getitem__(self, position: BoardPosition) -> Tile:
+        tile = self.board.get_tile_at(position)
+        if tile is None:
+            raise KeyError(position)
+        return tile
+
+    def __setitem__(self, position: BoardPosition, tile: Tile) -> None:
+        self.board.set_tile_at(position, tile)
+
+    def __delitem__(self, position: BoardPosition) -> None:
+        if self.board.get_tile_at(position) is None:
+            raise KeyError(position)
+        self.board.set_tile_at(position, None)
+
+    # The positions are given row by row.
+    def __iter__(self) -> Generator[BoardPosition, None, None]:
+        width = self.board.width
+        for i, tile in enumerate(self.board.tiles):
+            if tile is not None:
+                yield i % width, i // width
+        yield from list(self.board.outside_tiles)
+
+    def __len__(self) -> int:
+        return self.board.num_tiles
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
 # The state of the board.
-@dataclass
+# The squares are stored row by row in flat arrays, so the square at (x, y) has index y * width + x.
+# position_to_tile is a mapping view of the same tiles, for code that doesn't need the speed.
+@dataclass(eq=False)
 class Board:
     width: int
     height: int
     starting_position: BoardPosition | None
-    position_to_tile: MutableMapping[BoardPosition, Tile]
     position_to_multiplier: Mapping[BoardPosition, Multiplier]
 
     def __init__(
@@ -302,25 +498,118 @@ class Board:
         self.width = width
         self.height = height
         self.starting_position = starting_position
-        self.position_to_tile = dict(position_to_tile)
 
         if isinstance(position_to_multiplier, frozendict):
             self.position_to_multiplier = position_to_multiplier
         else:
             self.position_to_multiplier = frozendict(position_to_multiplier)
 
-    def copy(self) -> Self:
-        return cast(
-            Self,
-            Board(
-                width=self.width,
-                height=self.height,
-                position_to_tile=self.position_to_tile,
-                position_to_multiplier=self.position_to_multiplier,
-                starting_position=self.starting_position,
-            ),
+        # The tile on each square, or None.
+        self.tiles: list[Tile | None] = [None] * (width * height)
+        # The letter on each square as its character code, or NO_LETTER_CODE.
+        self.letters = bytearray(width * height)
+        # The tiles outside of the board. Nothing in a game puts tiles there.
+        self.outside_tiles = dict[BoardPosition, Tile]()
+        self.num_tiles = 0
+        # The Zobrist hash of the tiles on the board (see zobrist.py), kept up to date by set_tile_at.
+        self.zobrist_hash = 0
+        self._position_to_tile = BoardTiles(self)
+        for position, tile in position_to_tile.items():
+            self.set_tile_at(position, tile)
+
+        # The letter and word multiplier of each square (1 if it has none).
+        self.letter_multipliers = bytearray([1]) * (width * height)
+        self.word_multipliers = bytearray([1]) * (width * height)
+        for (x, y), multiplier in self.position_to_multiplier.items():
+            if not self.contains_position((x, y)):
+                continue
+            if isinstance(multiplier, TileMultiplier):
+                self.letter_multipliers[y * width + x] = multiplier.multiplier
+            else:
+                self.word_multipliers[y * width + x] = multiplier.multiplier
+
+    @property
+    def position_to_tile(self) -> BoardTiles:
+        return self._position_to_tile
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Board):
+            return NotImplemented
+        return (
+            self.width == other.width
+            and self.height == other.height
+            and self.starting_position == other.starting_position
+            and self.tiles == other.tiles
+            and self.outside_tiles == other.outside_tiles
+            and self.position_to_multiplier == other.position_to_multiplier
         )
 
+    def __repr__(self) -> str:
+        return (
+            f"Board(width={self.width!r}, height={self.height!r}, "
+            f"starting_position={self.starting_position!r}, "
+            f"position_to_tile={self.position_to_tile!r}, "
+            f"position_to_multiplier={self.position_to_multiplier!r})"
+        )
+
+    def copy(self) -> Self:
+        result = cast(Self, Board.__new__(Board))
+        result.width = self.width
+        result.height = self.height
+        result.starting_position = self.starting_position
+        result.position_to_multiplier = self.position_to_multiplier
+        result.tiles = self.tiles.copy()
+        result.letters = self.letters.copy()
+        result.outside_tiles = self.outside_tiles.copy()
+        result.num_tiles = self.num_tiles
+        result.zobrist_hash = self.zobrist_hash
+        result._position_to_tile = BoardTiles(result)
+        # The multipliers never change, so they're shared.
+        result.letter_multipliers = self.letter_multipliers
+        result.word_multipliers = self.word_multipliers
+        return result
+
+    # Put the given tile at the given position, or take the tile there away if it's None.
+    def set_tile_at(self, position: BoardPosition, tile: Tile | None) -> None:
+        x, y = position
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            old_tile = self.outside_tiles.pop(position, None)
+            if old_tile is not None:
+                self.num_tiles -= 1
+                self.zobrist_hash ^= zobrist.get_tile_key(position, old_tile)
+            if tile is not None:
+                self.num_tiles += 1
+                self.zobrist_hash ^= zobrist.get_tile_key(position, tile)
+                self.outside_tiles[position] = tile
+            return
+
+        i = y * self.width + x
+        old_tile = self.tiles[i]
+        if old_tile is not None:
+            self.num_tiles -= 1
+            self.zobrist_hash ^= zobrist.get_tile_key(i, old_tile)
+        if tile is not None:
+            self.num_tiles += 1
+            self.zobrist_hash ^= zobrist.get_tile_key(i, tile)
+        self.tiles[i] = tile
+        letter = getattr(tile, "letter", None)
+        self.letters[i] = NO_LETTER_CODE if letter is None else ord(letter)
+
+    # Return the index of the given position in the arrays, or -1 if it isn't on the board.
+    def get_index(self, position: BoardPosition) -> int:
+        x, y = position
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return y * self.width + x
+        return -1
+
+    # Return the letter codes of the given row, from left to right.
+    def get_row_letters(self, y: int) -> bytearray:
+        return self.letters[y * self.width : (y + 1) * self.width]
+
+    # Return the letter codes of the given column, from top to bottom.
+    def get_column_letters(self, x: int) -> bytearray:
+        return self.letters[x :: self.width]
+
     # Yield all positions on the board. TODO unit-test.
     def all_positions(self) -> Generator[BoardPosition, None, None]:
         for x in range(self.width):
@@ -338,10 +627,19 @@ class Board:
 
     # Return the tile at the given position, or None if there is none.
     def get_tile_at(self, position: BoardPosition) -> Tile | None:
-        return self.position_to_tile.get(position, None)
+        x, y = position
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.tiles[y * self.width + x]
+        if self.outside_tiles:
+            return self.outside_tiles.get(position)
+        return None
 
     # Return the letter at the given position, or None if there is none.
     def get_letter_at(self, position: BoardPosition) -> LETTER | None:
+        x, y = position
+        if 0 <= x < self.width and 0 <= y < self.height:
+            code = self.letters[y * self.width + x]
+            return None if code == NO_LETTER_CODE else chr(code)  # type: ignore
         tile = self.get_tile_at(position)
         if tile is None:
             return None
@@ -440,17 +738,62 @@ class GameState:
         bag: Bag,
         board: Board,
         game_finished: bool = False,
+        rng: Random | None = None,
+        num_scoreless_turns: int = 0,
     ):
         self.config = config
         self.current_player = current_player
         self.player_to_state = dict(player_to_state)
         self.player_order = tuple(player_order)
         self.bag = bag
+        if rng is not None:
+            self.bag.rng = rng
         self.board = board
+        self.num_scoreless_turns = num_scoreless_turns
         self.game_finished = game_finished
+        # The Zobrist hash of the tiles in the racks and the bag, made when it's first needed.
+        # Move.apply and Move.unapply keep it up to date; set it to None after changing the racks or the bag any other way.
+        self.tiles_hash: int | None = None
+
+    # The game's random number generator, which every random decision in the game should come from.
+    # It's the bag's, so a copy of the state gets a copy of it (see Bag).
+    # The random module is used if this is None.
+    @property
+    def rng(self) -> Random | None:
+        return self.bag.rng
+
+    @rng.setter
+    def rng(self, rng: Random | None) -> None:
+        self.bag.rng = rng
+
+    # Return a new random number generator for a strategy's own choices, seeded from the game's
+    # (or from the random module if the game has none), so that a seeded game is played the same way every time.
+    # Taking the seed from a copy of the state, like the one a strategy is given, doesn't change the tiles drawn.
+    def get_derived_rng(self) -> Random:
+        rng = self.rng
+        return Random(getrandbits(64) if rng is None else rng.getrandbits(64))
+
+    # Return the Zobrist hash of this state (see zobrist.py):
+    # the tiles on the board, in each rack and in the bag, the player to move and the number of scoreless turns.
+    # The scores aren't part of it.
+    def get_zobrist_hash(self) -> int:
+        if self.tiles_hash is None:
+            tiles_hash = zobrist.get_tiles_hash(zobrist.BAG, self.bag)
+            for player, player_state in self.player_to_state.items():
+                tiles_hash += zobrist.get_tiles_hash(
+                    zobrist.get_player_holder(player.position), player_state.tiles
+                )
+            self.tiles_hash = tiles_hash & zobrist.HASH_MASK
+        return (
+            self.board.zobrist_hash
+            ^ self.tiles_hash
+            ^ zobrist.get_key("to move", self.current_player.position)
+            ^ zobrist.get_key("scoreless turns", self.num_scoreless_turns)
+        )
 
     # Return a deep copy of this GameState.
     def copy(self) -> Self:
+        profiling.add_count(profiling.STATES_COPIED)
         # return copy.deepcopy(self)
         val = GameState(
             config=self.config,
@@ -461,11 +804,13 @@ class GameState:
             },
             player_order=self.player_order,
             # bag=copy.deepcopy(self.bag),
-            bag=Bag(tiles=self.bag.tiles),
+            bag=self.bag.copy(),
             # board=copy.deepcopy(self.board),
             board=self.board.copy(),
             game_finished=self.game_finished,
+            num_scoreless_turns=self.num_scoreless_turns,
         )
+        val.tiles_hash = self.tiles_hash
         return val  # type: ignore
         # return GameState(
         #     config=self.config,
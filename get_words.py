@@ -4,6 +4,9 @@ import requests
 import time
 from html.parser import HTMLParser
 
+from gaddag import Gaddag
+import lexicon
+
 
 class GetScrabbleWordsHtmlParser(HTMLParser):
     def __init__(self) -> None:
@@ -199,13 +202,34 @@ def make_infix_data():
                 file.write(f"{word}\n")
 
 
+LEXICON_PATH = os.path.join("Scrabble_Words", "all_scrabble_words.lex")
+
+
+# Compile all of the words in the Scrabble dictionary into a lexicon file.
+# This has to be done again whenever the words change.
+def make_lexicon():
+    lexicon.compile_lexicon(words=get_all_words(), path=LEXICON_PATH)
+
+
+# Return the words and GADDAG from the compiled lexicon, or None if it hasn't been compiled.
+def get_lexicon(
+    _cache=list[tuple[frozenset[str], Gaddag]](),
+) -> tuple[frozenset[str], Gaddag] | None:
+    if not _cache:
+        if not os.path.exists(LEXICON_PATH):
+            return None
+        _cache.append(lexicon.load_lexicon(LEXICON_PATH))
+    return _cache[0]
+
+
 def main():
     # test_1()
     # test_2()
     # test_3()
     # collect_all_words()
     # test_4()
-    make_infix_data()
+    # make_infix_data()
+    make_lexicon()
 
 
 if __name__ == "__main__":
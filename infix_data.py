@@ -2,6 +2,8 @@ from typing import Iterable
 from frozendict import frozendict
 
 from constants import ALPHABET
+from letter_masks import LETTER_TO_BIT, ALL_LETTERS, NO_LETTERS, get_letters
+from gaddag import Gaddag, LETTER_BITS
 
 ALPHABET_SET = frozenset(ALPHABET)
 
@@ -10,11 +12,10 @@ class InfixData:
     def __init__(self, words: Iterable[str]) -> None:
         self.words = set(words)
 
-        alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
-        # From a letter to the strings that can have that letter added to them at the start.
-        can_add_at_start = {c: set[str]() for c in alphabet}
-        # From a letter to the strings that can have that letter added to them at the end.
-        can_add_at_end = {c: set[str]() for c in alphabet}
+        # From a string to the mask of the letters that can be added to it at the start.
+        infix_to_prefix_mask = dict[str, int]()
+        # From a string to the mask of the letters that can be added to it at the end.
+        infix_to_suffix_mask = dict[str, int]()
 
         for word in self.words:
             for i in range(len(word)):
@@ -22,48 +23,71 @@ class InfixData:
                     j = i + l
                     substring = word[i:j]
                     if i > 0:
-                        before = word[i - 1]
-                        can_add_at_start[before].add(substring)
+                        before = LETTER_TO_BIT[word[i - 1]]
+                        infix_to_prefix_mask[substring] = infix_to_prefix_mask.get(substring, NO_LETTERS) | before
                     if j < len(word):
-                        after = word[j]
-                        can_add_at_end[after].add(substring)
+                        after = LETTER_TO_BIT[word[j]]
+                        infix_to_suffix_mask[substring] = infix_to_suffix_mask.get(substring, NO_LETTERS) | after
 
         # Make the dictionaries immutable.
-        self.can_add_at_start = frozendict(
-            {l: frozenset(words) for l, words in can_add_at_start.items()}
-        )
-        self.can_add_at_end = frozendict(
-            {l: frozenset(words) for l, words in can_add_at_end.items()}
-        )
-
-        # Get the dictionaries that go in the other direction.
-        infix_to_prefixes = dict[str, set[str]]()
-        for prefix, infixes in self.can_add_at_start.items():
-            for infix in infixes:
-                if not infix in infix_to_prefixes:
-                    infix_to_prefixes[infix] = set[str]()
-                infix_to_prefixes[infix].add(prefix)
-
-        infix_to_suffixes = dict[str, set[str]]()
-        for suffix, infixes in self.can_add_at_end.items():
-            for infix in infixes:
-                if not infix in infix_to_suffixes:
-                    infix_to_suffixes[infix] = set[str]()
-                infix_to_suffixes[infix].add(suffix)
-
-        # TODO Maybe use tuple instead of frozenset
-        self.infix_to_prefixes = frozendict(
-            {
-                infix: frozenset(prefixes)
-                for infix, prefixes in infix_to_prefixes.items()
-            }
-        )
-        self.infix_to_suffixes = frozendict(
-            {
-                infix: frozenset(suffixes)
-                for infix, suffixes in infix_to_suffixes.items()
-            }
-        )
+        self.infix_to_prefix_mask = frozendict(infix_to_prefix_mask)
+        self.infix_to_suffix_mask = frozendict(infix_to_suffix_mask)
+
+        # The letter-set views of the masks, made when they're first asked for.
+        self._can_add_at_start: frozendict[str, frozenset[str]] | None = None
+        self._can_add_at_end: frozendict[str, frozenset[str]] | None = None
+        self._infix_to_prefixes: frozendict[str, frozenset[str]] | None = None
+        self._infix_to_suffixes: frozendict[str, frozenset[str]] | None = None
+
+    # From a letter to the strings that can have that letter added to them at the start.
+    @property
+    def can_add_at_start(self) -> frozendict[str, frozenset[str]]:
+        if self._can_add_at_start is None:
+            self._can_add_at_start = _get_letter_to_infixes(self.infix_to_prefix_mask)
+        return self._can_add_at_start
+
+    # From a letter to the strings that can have that letter added to them at the end.
+    @property
+    def can_add_at_end(self) -> frozendict[str, frozenset[str]]:
+        if self._can_add_at_end is None:
+            self._can_add_at_end = _get_letter_to_infixes(self.infix_to_suffix_mask)
+        return self._can_add_at_end
+
+    # From a string to the letters that can be added to it at the start.
+    @property
+    def infix_to_prefixes(self) -> frozendict[str, frozenset[str]]:
+        if self._infix_to_prefixes is None:
+            self._infix_to_prefixes = frozendict(
+                {
+                    infix: frozenset(get_letters(mask))
+                    for infix, mask in self.infix_to_prefix_mask.items()
+                }
+            )
+        return self._infix_to_prefixes
+
+    # From a string to the letters that can be added to it at the end.
+    @property
+    def infix_to_suffixes(self) -> frozendict[str, frozenset[str]]:
+        if self._infix_to_suffixes is None:
+            self._infix_to_suffixes = frozendict(
+                {
+                    infix: frozenset(get_letters(mask))
+                    for infix, mask in self.infix_to_suffix_mask.items()
+                }
+            )
+        return self._infix_to_suffixes
+
+    # Return the mask of all possible suffixes for the given string.
+    def get_suffix_mask(self, s: str) -> int:
+        if s == "":
+            return ALL_LETTERS
+        return self.infix_to_suffix_mask.get(s, NO_LETTERS)
+
+    # Return the mask of all possible prefixes for the given string.
+    def get_prefix_mask(self, s: str) -> int:
+        if s == "":
+            return ALL_LETTERS
+        return self.infix_to_prefix_mask.get(s, NO_LETTERS)
 
     # Return all possible suffixes for the given string.
     def get_all_suffixes(self, s: str) -> frozenset[str]:
@@ -76,3 +100,47 @@ class InfixData:
         if s == "":
             return ALPHABET_SET
         return self.infix_to_prefixes.get(s, frozenset())
+
+
+# Answers the same prefix and suffix queries as InfixData, but by walking a GADDAG instead of
+# storing every substring of every word. This needs no building if the GADDAG was loaded from a compiled lexicon.
+class GaddagInfixData:
+    def __init__(self, gaddag: Gaddag) -> None:
+        self.gaddag = gaddag
+
+    # Return the mask of all possible suffixes for the given string.
+    def get_suffix_mask(self, s: str) -> int:
+        if s == "":
+            return ALL_LETTERS
+        node = self.gaddag.follow(s[::-1])
+        if node < 0:
+            return NO_LETTERS
+        return self.gaddag.after_separator_masks[node]
+
+    # Return the mask of all possible prefixes for the given string.
+    def get_prefix_mask(self, s: str) -> int:
+        if s == "":
+            return ALL_LETTERS
+        node = self.gaddag.follow(s[::-1])
+        if node < 0:
+            return NO_LETTERS
+        return self.gaddag.masks[node] & LETTER_BITS
+
+    # Return all possible suffixes for the given string.
+    def get_all_suffixes(self, s: str) -> frozenset[str]:
+        return frozenset(get_letters(self.get_suffix_mask(s)))
+
+    # Return all possible prefixes for the given string.
+    def get_all_prefixes(self, s: str) -> frozenset[str]:
+        return frozenset(get_letters(self.get_prefix_mask(s)))
+
+
+# Return the mapping from each letter to the strings whose mask has that letter.
+def _get_letter_to_infixes(
+    infix_to_mask: frozendict[str, int]
+) -> frozendict[str, frozenset[str]]:
+    letter_to_infixes = {c: set[str]() for c in ALPHABET}
+    for infix, mask in infix_to_mask.items():
+        for c in get_letters(mask):
+            letter_to_infixes[c].add(infix)
+    return frozendict({c: frozenset(infixes) for c, infixes in letter_to_infixes.items()})
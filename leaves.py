@@ -0,0 +1,232 @@
+import os
+import struct
+import sys
+from array import array
+from dataclasses import dataclass
+from math import comb
+from typing import Iterable, Sequence
+
+from constants import ALPHABET
+from game_state import BlankTile, LetterTile, Tile
+
+# A leave is what stays on a player's rack after a move, before they draw.
+# Leaves are written as the sorted characters of their tiles, with "*" for a blank tile, like "AEIS*".
+# A leave table gives an equity value for every leave of up to MAX_LEAVE_SIZE tiles:
+# roughly how many more points than average the player can expect later from keeping those tiles.
+#
+# Every multiset of up to MAX_LEAVE_SIZE of the LEAVE_CHARS has its own index, so a lookup is just
+# a few additions of binomial coefficients. This covers every leave that can come from the Scrabble tiles
+# (plus some that can't, like "QQ", which are never looked up).
+
+BLANK_CHAR = "*"
+LEAVE_CHARS = ALPHABET + BLANK_CHAR
+CHAR_TO_INDEX = {c: i for i, c in enumerate(LEAVE_CHARS)}
+
+MAX_LEAVE_SIZE = 6
+
+# _SIZE_OFFSETS[k] is the index of the first leave with k tiles.
+# There are comb(len(LEAVE_CHARS) + k - 1, k) leaves with k tiles.
+_SIZE_OFFSETS = [0]
+for _k in range(MAX_LEAVE_SIZE + 1):
+    _SIZE_OFFSETS.append(_SIZE_OFFSETS[-1] + comb(len(LEAVE_CHARS) + _k - 1, _k))
+
+# The number of leaves in a leave table.
+NUM_LEAVES = _SIZE_OFFSETS[-1]
+
+# _BINOMIALS[n][k] is comb(n, k), for the arguments the indexing needs.
+_BINOMIALS = [
+    [comb(n, k) for k in range(MAX_LEAVE_SIZE + 1)]
+    for n in range(len(LEAVE_CHARS) + MAX_LEAVE_SIZE)
+]
+
+LEAVE_TABLE_MAGIC = b"SCRBLLVE"
+LEAVE_TABLE_VERSION = 1
+
+_HEADER = struct.Struct("<8sII")
+
+LEAVE_TABLE_PATH = os.path.join("Scrabble_Words", "leave_table.bin")
+
+
+# Return the character for the given tile in a leave.
+def get_leave_char(tile: Tile) -> str:
+    if isinstance(tile, BlankTile):
+        return BLANK_CHAR
+    assert isinstance(tile, LetterTile)
+    return tile.letter
+
+
+# Return the leave with the given characters, sorted.
+def sort_leave(chars: Iterable[str]) -> str:
+    return "".join(sorted(chars, key=CHAR_TO_INDEX.__getitem__))
+
+
+# Return the leave left by taking the given tiles out of the given rack.
+def get_leave(rack: Iterable[Tile], tiles_used: Iterable[Tile] = ()) -> str:
+    chars = [get_leave_char(tile) for tile in rack]
+    for tile in tiles_used:
+        chars.remove(get_leave_char(tile))
+    return sort_leave(chars)
+
+
+# Return the index of the given leave in a leave table.
+# The characters are ranked like a combination in the combinatorial number system:
+# the i-th smallest character index c becomes c + i, which makes them all different.
+def get_leave_index(leave: str) -> int:
+    if len(leave) > MAX_LEAVE_SIZE:
+        raise ValueError(f"Leave {leave!r} has more than {MAX_LEAVE_SIZE} tiles")
+    result = _SIZE_OFFSETS[len(leave)]
+    for i, index in enumerate(sorted([CHAR_TO_INDEX[c] for c in leave])):
+        result += _BINOMIALS[index + i][i + 1]
+    return result
+
+
+# Return every leave of the given number of tiles, in index order.
+# Only the characters up to the given index are used, if one is given.
+def get_all_leaves(num_tiles: int, max_index: int = len(LEAVE_CHARS) - 1) -> Iterable[str]:
+    if num_tiles == 0:
+        yield ""
+        return
+    # In index order, the last (largest) character changes slowest.
+    for last in range(max_index + 1):
+        for rest in get_all_leaves(num_tiles=num_tiles - 1, max_index=last):
+            yield rest + LEAVE_CHARS[last]
+
+
+# The equity values of all of the leaves, indexed by get_leave_index.
+class LeaveTable:
+    def __init__(self, values: Sequence[float]) -> None:
+        if len(values) != NUM_LEAVES:
+            raise ValueError(f"Expected {NUM_LEAVES} leave values, got {len(values)}")
+        self.values = values
+
+    # Return the equity value of the given leave.
+    def get_value(self, leave: str) -> float:
+        return self.values[get_leave_index(leave)]
+
+    # Save the table to the given path, as single-precision floats.
+    def save(self, path: str) -> None:
+        values = array("f", self.values)
+        if sys.byteorder != "little":
+            values.byteswap()
+        with open(path, "wb") as file:
+            file.write(_HEADER.pack(LEAVE_TABLE_MAGIC, LEAVE_TABLE_VERSION, len(values)))
+            file.write(values.tobytes())
+
+    # Load a table saved with save().
+    @classmethod
+    def load(cls, path: str) -> "LeaveTable":
+        with open(path, "rb") as file:
+            data = file.read()
+        magic, version, num_leaves = _HEADER.unpack_from(data)
+        if magic != LEAVE_TABLE_MAGIC:
+            raise ValueError(f"{path} is not a leave table file")
+        if version != LEAVE_TABLE_VERSION:
+            raise ValueError(
+                f"{path} has leave table version {version}, expected {LEAVE_TABLE_VERSION}"
+            )
+        values = array("f")
+        values.frombytes(data[_HEADER.size : _HEADER.size + 4 * num_leaves])
+        if sys.byteorder != "little":
+            values.byteswap()
+        return cls(values=values)
+
+
+# A leave and how many points its player scored on their next turn.
+@dataclass
+class LeaveSample:
+    leave: str
+    next_points: int
+
+
+# Return the features of the given sorted leave for the additive model, with their counts.
+# For each character there's a feature for having one of it, and a feature for each extra copy of it.
+def _get_features(leave: str) -> dict[int, int]:
+    result = dict[int, int]()
+    prev = ""
+    for c in leave:
+        feature = CHAR_TO_INDEX[c]
+        if c == prev:
+            feature += len(LEAVE_CHARS)
+        result[feature] = result.get(feature, 0) + 1
+        prev = c
+    return result
+
+
+# The weight of the additive model against the samples of a leave, in samples.
+PRIOR_WEIGHT = 10
+
+# How much the additive model's weights are pulled towards zero, in samples.
+RIDGE = 5.0
+
+
+# Make a leave table from the given samples.
+# A leave is worth how many more points than average its player scored on their next turn.
+# Most leaves are never seen, so their values come from an additive model fitted to the samples:
+# a value for keeping each kind of tile, and a value for each extra copy of it.
+# The leaves that were seen move towards their own average, the more so the more often they were seen.
+def make_leave_table(samples: Sequence[LeaveSample], num_passes: int = 20) -> LeaveTable:
+    if not samples:
+        return LeaveTable(values=array("f", bytes(4 * NUM_LEAVES)))
+    mean_points = sum([sample.next_points for sample in samples]) / len(samples)
+
+    # Fit the additive model by going over the features one at a time (ridge regression by coordinate descent).
+    num_features = 2 * len(LEAVE_CHARS)
+    weights = [0.0] * num_features
+    residuals = [sample.next_points - mean_points for sample in samples]
+    feature_to_samples = [list[tuple[int, int]]() for _ in range(num_features)]
+    for i, sample in enumerate(samples):
+        for feature, count in _get_features(sort_leave(sample.leave)).items():
+            feature_to_samples[feature].append((i, count))
+    for _ in range(num_passes):
+        for feature, feature_samples in enumerate(feature_to_samples):
+            if not feature_samples:
+                continue
+            weight = weights[feature]
+            numerator = 0.0
+            denominator = RIDGE
+            for i, count in feature_samples:
+                numerator += count * (residuals[i] + count * weight)
+                denominator += count * count
+            new_weight = numerator / denominator
+            for i, count in feature_samples:
+                residuals[i] -= count * (new_weight - weight)
+            weights[feature] = new_weight
+
+    # Get the average of each leave that was seen.
+    leave_to_total = dict[str, float]()
+    leave_to_count = dict[str, int]()
+    for sample in samples:
+        leave = sort_leave(sample.leave)
+        leave_to_total[leave] = leave_to_total.get(leave, 0.0) + sample.next_points - mean_points
+        leave_to_count[leave] = leave_to_count.get(leave, 0) + 1
+
+    # Get the additive model's value of every leave, in index order,
+    # from the value of the leave without its last tile.
+    values = array("f", [0.0])
+    prev_leave_to_value = {"": 0.0}
+    for num_tiles in range(1, MAX_LEAVE_SIZE + 1):
+        leave_to_value = dict[str, float]()
+        for leave in get_all_leaves(num_tiles):
+            rest, c = leave[:-1], leave[-1]
+            feature = CHAR_TO_INDEX[c]
+            if rest.endswith(c):
+                feature += len(LEAVE_CHARS)
+            leave_to_value[leave] = prev_leave_to_value[rest] + weights[feature]
+        values.extend(leave_to_value.values())
+        prev_leave_to_value = leave_to_value
+
+    # Move the leaves that were seen towards their own averages.
+    for leave, total in leave_to_total.items():
+        index = get_leave_index(leave)
+        count = leave_to_count[leave]
+        values[index] = (total + PRIOR_WEIGHT * values[index]) / (count + PRIOR_WEIGHT)
+    return LeaveTable(values=values)
+
+
+# Return the leave table at LEAVE_TABLE_PATH, or None if it hasn't been made (see main.make_leave_table).
+def get_leave_table(_cache=list[LeaveTable]()) -> LeaveTable | None:
+    if not _cache:
+        if not os.path.exists(LEAVE_TABLE_PATH):
+            return None
+        _cache.append(LeaveTable.load(LEAVE_TABLE_PATH))
+    return _cache[0]
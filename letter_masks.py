@@ -0,0 +1,31 @@
+from typing import Iterable
+
+from constants import ALPHABET, LETTER
+
+# Sets of letters stored as integers: bit i is set when the i-th letter of the alphabet is in the set.
+# These are the same bits as the letters in the GADDAG node masks,
+# so a node mask can be ANDed with a letter mask directly.
+
+LETTER_TO_BIT = {c: 1 << i for i, c in enumerate(ALPHABET)}
+
+NO_LETTERS = 0
+ALL_LETTERS = (1 << len(ALPHABET)) - 1
+
+
+# Return the mask of the given letters.
+def get_mask(letters: Iterable[str]) -> int:
+    mask = NO_LETTERS
+    for c in letters:
+        mask |= LETTER_TO_BIT[c]
+    return mask
+
+
+# Return the letters in the given mask, in alphabetical order.
+def get_letters(mask: int) -> tuple[LETTER, ...]:
+    letters = list[LETTER]()
+    while mask:
+        # Take off the lowest bit.
+        bit = mask & -mask
+        letters.append(ALPHABET[bit.bit_length() - 1])  # type: ignore
+        mask ^= bit
+    return tuple(letters)
@@ -0,0 +1,108 @@
+import mmap
+import struct
+import sys
+from array import array
+from typing import Iterable, Sequence
+
+from gaddag import Gaddag
+
+# A compiled lexicon file holds the playable words and their packed GADDAG
+# (with its after-separator masks and the most letters left from each node),
+# which is everything needed to generate moves: the cross-checks and infix queries are answered from the GADDAG.
+# The file is memory-mapped when it's loaded, so a new process is ready to go straight away
+# and processes using the same file share its pages.
+#
+# Layout (all integers little-endian, unsigned 32-bit):
+#   header: magic, version, size of the words in bytes, number of nodes, number of children
+#   the words, ASCII, separated by newlines, padded to a multiple of 4 bytes
+#   the node masks, the first-child indices, the after-separator masks and the most letters left (one per node)
+#   the children
+
+LEXICON_MAGIC = b"SCRBLLEX"
+LEXICON_VERSION = 2
+
+_HEADER = struct.Struct("<8sIIII")
+
+
+# Return the number of bytes needed to pad the given size to a multiple of 4.
+def _get_padding(size: int) -> int:
+    return -size % 4
+
+
+# Return the bytes of the given unsigned 32-bit integers, little-endian.
+def _to_bytes(values: Sequence[int]) -> bytes:
+    result = array("I", values)
+    if sys.byteorder != "little":
+        result.byteswap()
+    return result.tobytes()
+
+
+# Return the given number of unsigned 32-bit integers starting at the given offset.
+# They're a view into the buffer when possible, so nothing is copied.
+def _get_uint32s(buffer: memoryview, offset: int, count: int) -> Sequence[int]:
+    data = buffer[offset : offset + 4 * count]
+    if sys.byteorder == "little":
+        return data.cast("I")
+    result = array("I", data)
+    result.byteswap()
+    return result
+
+
+# Compile the given words into a lexicon file at the given path.
+def compile_lexicon(words: Iterable[str], path: str) -> None:
+    words = sorted(set(words))
+    gaddag = Gaddag(words=words)
+
+    words_bytes = "\n".join(words).encode("ascii")
+    with open(path, "wb") as file:
+        file.write(
+            _HEADER.pack(
+                LEXICON_MAGIC,
+                LEXICON_VERSION,
+                len(words_bytes),
+                gaddag.num_nodes,
+                len(gaddag.children),
+            )
+        )
+        file.write(words_bytes)
+        file.write(bytes(_get_padding(len(words_bytes))))
+        file.write(_to_bytes(gaddag.masks))
+        file.write(_to_bytes(gaddag.first_child))
+        file.write(_to_bytes(gaddag.after_separator_masks))
+        file.write(_to_bytes(gaddag.max_letters_left))
+        file.write(_to_bytes(gaddag.children))
+
+
+# Load the words and the GADDAG from the lexicon file at the given path.
+def load_lexicon(path: str) -> tuple[frozenset[str], Gaddag]:
+    with open(path, "rb") as file:
+        # The map stays open after the file is closed, for as long as the GADDAG uses it.
+        buffer = memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    magic, version, words_size, num_nodes, num_children = _HEADER.unpack_from(buffer)
+    if magic != LEXICON_MAGIC:
+        raise ValueError(f"{path} is not a lexicon file")
+    if version != LEXICON_VERSION:
+        raise ValueError(
+            f"{path} has lexicon version {version}, expected {LEXICON_VERSION}; recompile it"
+        )
+
+    offset = _HEADER.size
+    words_bytes = bytes(buffer[offset : offset + words_size])
+    words = frozenset(words_bytes.decode("ascii").split("\n")) if words_bytes else frozenset()
+    offset += words_size + _get_padding(words_size)
+
+    arrays = list[Sequence[int]]()
+    for count in (num_nodes, num_nodes, num_nodes, num_nodes, num_children):
+        arrays.append(_get_uint32s(buffer, offset=offset, count=count))
+        offset += 4 * count
+    masks, first_child, after_separator_masks, max_letters_left, children = arrays
+
+    gaddag = Gaddag.from_arrays(
+        masks=masks,
+        first_child=first_child,
+        children=children,
+        after_separator_masks=after_separator_masks,
+        max_letters_left=max_letters_left,
+    )
+    return words, gaddag
@@ -1,10 +1,12 @@
 import time
+from functools import partial
 
 from game_state import *
 from rules import *
 from utils import *
 import ai_strategies
 import game_runner
+import leaves
 import tournament
 
 
@@ -83,31 +85,43 @@ def tournament_1():
 def tournament_2():
     players = [
         tournament.TournamentPlayer(
-            get_strategy=lambda: ai_strategies.HighestScoringWordStrategy(),
+            get_strategy=ai_strategies.HighestScoringWordStrategy,
             name="Highest_Score",
         ),
         tournament.TournamentPlayer(
-            get_strategy=lambda: ai_strategies.ScoreAndTilesStrategy(value_per_tile=0.5),
+            get_strategy=partial(
+                ai_strategies.ScoreAndTilesStrategy, value_per_tile=0.5
+            ),
             name="Tiles_0.5",
         ),
         tournament.TournamentPlayer(
-            get_strategy=lambda: ai_strategies.ScoreAndTilesStrategy(value_per_tile=1),
+            get_strategy=partial(
+                ai_strategies.ScoreAndTilesStrategy, value_per_tile=1
+            ),
             name="Tiles_1.0",
         ),
         tournament.TournamentPlayer(
-            get_strategy=lambda: ai_strategies.ScoreAndTilesStrategy(value_per_tile=1.5),
+            get_strategy=partial(
+                ai_strategies.ScoreAndTilesStrategy, value_per_tile=1.5
+            ),
             name="Tiles_1.5",
         ),
         tournament.TournamentPlayer(
-            get_strategy=lambda: ai_strategies.ScoreAndTilesStrategy(value_per_tile=2),
+            get_strategy=partial(
+                ai_strategies.ScoreAndTilesStrategy, value_per_tile=2
+            ),
             name="Tiles_2",
         ),
         tournament.TournamentPlayer(
-            get_strategy=lambda: ai_strategies.ScoreAndTilesStrategy(value_per_tile=2.5),
+            get_strategy=partial(
+                ai_strategies.ScoreAndTilesStrategy, value_per_tile=2.5
+            ),
             name="Tiles_2.5",
         ),
         tournament.TournamentPlayer(
-            get_strategy=lambda: ai_strategies.ScoreAndTilesStrategy(value_per_tile=3.0),
+            get_strategy=partial(
+                ai_strategies.ScoreAndTilesStrategy, value_per_tile=3.0
+            ),
             name="Tiles_3.0",
         ),
     ]
@@ -143,28 +157,31 @@ def tournament_2():
             print(f"{player_i}: {player.name}")
         print("")
 
-        for p1_index in range(len(players) - 1):
-            for p2_index in range(p1_index + 1, len(players)):
-                p1 = players[p1_index]
-                p2 = players[p2_index]
-                print(f"{p1.name} vs {p2.name}.")
-
-                results = tournament.do_tournament_matches(
-                    player_1=p1, player_2=p2, num_matches=1
-                )
-
-                win_table[p1_index, p2_index] += results.num_player_1_wins
-                # loss_table[p2_index, p1_index] += results.num_player_1_wins
-
-                win_table[p2_index, p1_index] += results.num_player_2_wins
-                # loss_table
-
-                # p1_win_prob = results.num_player_1_wins / (
-                #     results.num_player_1_wins + results.num_player_2_wins
-                # )
-                # p2_win_prob = 1 - p1_win_prob
-                # win_prob_table[p1_index, p2_index] = p1_win_prob
-                # win_prob_table[p2_index, p1_index] = p2_win_prob
+        # Run the matches in parallel, and record the results as they come in.
+        pairings = [
+            (p1_index, p2_index)
+            for p1_index in range(len(players) - 1)
+            for p2_index in range(p1_index + 1, len(players))
+        ]
+        for p1_index, p2_index, results in tournament.do_tournament_matches_parallel(
+            players=players, pairings=pairings
+        ):
+            p1 = players[p1_index]
+            p2 = players[p2_index]
+            print(f"{p1.name} vs {p2.name}.")
+
+            win_table[p1_index, p2_index] += results.num_player_1_wins
+            # loss_table[p2_index, p1_index] += results.num_player_1_wins
+
+            win_table[p2_index, p1_index] += results.num_player_2_wins
+            # loss_table
+
+            # p1_win_prob = results.num_player_1_wins / (
+            #     results.num_player_1_wins + results.num_player_2_wins
+            # )
+            # p2_win_prob = 1 - p1_win_prob
+            # win_prob_table[p1_index, p2_index] = p1_win_prob
+            # win_prob_table[p2_index, p1_index] = p2_win_prob
 
         print("")
 
@@ -200,9 +217,44 @@ def tournament_2():
     #         print(f"{p1_index}, {p2_index}: {win_prob_table[p1_index, p2_index]:.02f}")
 
 
+# Make the leave table from games of the highest-scoring-word strategy against itself.
+def make_leave_table(num_games: int = 1000):
+    config = get_scrabble_config()
+    samples = list[leaves.LeaveSample]()
+
+    before = time.time()
+    for game_i in range(num_games):
+        p0 = Player(0)
+        p1 = Player(1)
+        state = GameState(
+            config=config,
+            current_player=p0,
+            player_order=(p0, p1),
+            player_to_state={
+                p0: PlayerState(player=p0, score=0, tiles=list()),
+                p1: PlayerState(player=p1, score=0, tiles=list()),
+            },
+            bag=Bag(tiles=get_scrabble_tiles()),
+            board=get_scrabble_board(),
+        )
+        player_to_strategy = {
+            p0: ai_strategies.HighestScoringWordStrategy(),
+            p1: ai_strategies.HighestScoringWordStrategy(),
+        }
+        samples.extend(
+            game_runner.get_leave_samples(state=state, player_to_strategy=player_to_strategy)
+        )
+        print(f"Game {game_i + 1}: {len(samples)} leaves.")
+    after = time.time()
+    print(f"Took {after-before:.2f} seconds.")
+
+    leaves.make_leave_table(samples=samples).save(leaves.LEAVE_TABLE_PATH)
+
+
 def main():
     # test_1()
     # tournament_1()
+    # make_leave_table()
     tournament_2()
 
 
@@ -0,0 +1,124 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Hashable, Sequence
+
+from game_state import GameState
+from rules import CompactMove
+import profiling
+import zobrist
+
+# A cache of the place-tiles moves (with their points) found for a board and a rack.
+# Positions come up again and again when the same racks are replayed (as in a tournament match)
+# or when several strategies look at the same state, and the moves only depend on the board and the rack,
+# so they only have to be found once.
+# The least recently used move lists are dropped when there are too many of them or they take too much memory.
+
+# A rough estimate of the memory a cached move takes for each tile it places
+# (the compact move, its tiles and letters, and its entry in the list), measured with tracemalloc.
+ESTIMATED_BYTES_PER_TILE = 90
+
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_MAX_BYTES = 256 * 2**20
+
+# A list of place-tiles moves (as compact moves) with their points, in the order they were found.
+MoveList = Sequence[tuple[CompactMove, int]]
+
+
+# How well a move cache is doing.
+@dataclass
+class MoveCacheStats:
+    hits: int
+    misses: int
+    num_entries: int
+    num_bytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        num_lookups = self.hits + self.misses
+        return self.hits / num_lookups if num_lookups else 0.0
+
+
+# Return the key of the moves for the current player in the given state:
+# the lexicon, the bingo bonus (which the points include), the layout of the board, the Zobrist hash of its tiles,
+# and the current player's rack as a multiset.
+def get_move_cache_key(state: GameState) -> Hashable:
+    board = state.board
+    rack = state.player_to_state[state.current_player].tiles
+    return (
+        state.config.gaddag,
+        state.config.min_tiles_for_bingo,
+        state.config.bingo_points,
+        board.width,
+        board.height,
+        board.starting_position,
+        board.position_to_multiplier,
+        board.zobrist_hash,
+        tuple(sorted([zobrist.get_tile_key(zobrist.BAG, tile) for tile in rack])),
+    )
+
+
+# Return the estimated memory taken by the given moves, in bytes.
+def get_estimated_bytes(moves: MoveList) -> int:
+    return ESTIMATED_BYTES_PER_TILE * sum([move.num_tiles for move, _ in moves])
+
+
+# A least-recently-used cache of move lists, bounded by the number of lists and their estimated memory.
+class MoveCache:
+    def __init__(
+        self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # From each key to its moves and their estimated memory, least recently used first.
+        self.key_to_entry = OrderedDict[Hashable, tuple[MoveList, int]]()
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    # Return the moves cached for the given key, or None if there aren't any.
+    def get(self, key: Hashable) -> MoveList | None:
+        entry = self.key_to_entry.get(key)
+        if entry is None:
+            self.misses += 1
+            profiling.add_count(profiling.CACHE_MISSES)
+            return None
+        self.hits += 1
+        profiling.add_count(profiling.CACHE_HITS)
+        self.key_to_entry.move_to_end(key)
+        return entry[0]
+
+    # Cache the moves for the given key, dropping the least recently used moves to make room.
+    def put(self, key: Hashable, moves: MoveList) -> None:
+        num_bytes = get_estimated_bytes(moves)
+        if num_bytes > self.max_bytes or self.max_entries <= 0:
+            return
+        old_entry = self.key_to_entry.pop(key, None)
+        if old_entry is not None:
+            self.num_bytes -= old_entry[1]
+        while self.key_to_entry and (
+            len(self.key_to_entry) >= self.max_entries
+            or self.num_bytes + num_bytes > self.max_bytes
+        ):
+            _, (_, dropped_bytes) = self.key_to_entry.popitem(last=False)
+            self.num_bytes -= dropped_bytes
+        self.key_to_entry[key] = (tuple(moves), num_bytes)
+        self.num_bytes += num_bytes
+
+    def clear(self) -> None:
+        self.key_to_entry.clear()
+        self.num_bytes = 0
+
+    def get_stats(self) -> MoveCacheStats:
+        return MoveCacheStats(
+            hits=self.hits,
+            misses=self.misses,
+            num_entries=len(self.key_to_entry),
+            num_bytes=self.num_bytes,
+        )
+
+
+# Return the move cache shared by everything in this process that asks for it.
+def get_shared_move_cache(_cache=list[MoveCache]()) -> MoveCache:
+    if not _cache:
+        _cache.append(MoveCache())
+    return _cache[0]
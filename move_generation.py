@@ -1,9 +1,16 @@
 # from typing
+from random import Random
+from typing import Any, Callable, Iterable, Iterator
+import heapq
 import itertools
 
 from game_state import *
 from rules import *
+from gaddag import Gaddag, ROOT, CHAR_TO_INDEX, SEPARATOR_INDEX
+from letter_masks import LETTER_TO_BIT, ALL_LETTERS, NO_LETTERS, get_letters
 import infix_data
+import profiling
+from move_cache import MoveCache, get_move_cache_key
 
 
 # def get_horizontal_placements_for_word(
@@ -215,7 +222,8 @@ def get_all_place_tiles_moves_naive(
     return result
 
 
-# Information about what letters can be played where. (This could be computed only on parts of the board that changed.)
+# Information about what letters can be played where.
+# It can be kept between turns: update() only recomputes the rows and columns where letters changed.
 class PlayableLetterInfo:
     def __init__(
         self, state: GameState#, words: Collection[WORD]
@@ -225,92 +233,139 @@ class PlayableLetterInfo:
         self.words = frozenset(state.config.playable_words)
         self.infix_info = state.config.infix_data
 
-        pos_to_vertical_letters = dict[BoardPosition, tuple[LETTER, ...]]()
-
-        # See what letters can be placed vertically in each spot.
-        for pos in board.all_positions():
-            # if pos in [(7, 6), (7, 8)]:
-            #     pass
-            # The letters that make horizontal words can be placed vertically.
-            prefix = self._get_horizontal_prefix(pos=pos)
-            suffix = self._get_horizontal_suffix(pos=pos)
-
-            # We could just use the entire alphabet for possible_middle_letters. TODO check which approach is faster.
-            after_prefix = self.infix_info.get_all_suffixes(prefix)
-            before_suffix = self.infix_info.get_all_prefixes(suffix)
-
-            # before_suffix = self.infix_info.infix_to_prefixes.get(suffix, frozenset())
-            possible_middle_letters = [c for c in after_prefix if c in before_suffix]
-            middle_letters = list[LETTER]()
-            for c in possible_middle_letters:
-                # See the horizontal word made.
-                overall_word = prefix + c + suffix
-                if len(overall_word) == 1 or (overall_word in self.words):
-                    middle_letters.append(c)  # type: ignore
-            pos_to_vertical_letters[pos] = tuple(middle_letters)
-        self.pos_to_vertical_letters = frozendict(pos_to_vertical_letters)
-
-        # See what letters can be placed horizontally in each spot.
-        pos_to_horizontal_letters = dict[BoardPosition, tuple[LETTER, ...]]()
-        for pos in board.all_positions():
-            # The letters that make vertical words can be placed horizontally.
-            prefix = self._get_vertical_prefix(pos=pos)
-            suffix = self._get_vertical_suffix(pos=pos)
-
-            # We could just use the entire alphabet for possible_middle_letters. TODO check which approach is faster.
-            after_prefix = self.infix_info.get_all_suffixes(prefix)
-            before_suffix = self.infix_info.get_all_prefixes(suffix)
-
-            possible_middle_letters = [c for c in after_prefix if c in before_suffix]
-            middle_letters = list[LETTER]()
-            for c in possible_middle_letters:
-                # See the vertical word made.
-                overall_word = prefix + c + suffix
-                if len(overall_word) == 1 or (overall_word in self.words):
-                    middle_letters.append(c)  # type: ignore
-                # if prefix + c + suffix in self.words:
-                #     middle_letters.append(c)  # type: ignore
-            pos_to_horizontal_letters[pos] = tuple(middle_letters)
-        self.pos_to_horizontal_letters = frozendict(pos_to_horizontal_letters)
-
-    def _get_horizontal_affix(self, pos: BoardPosition, inc: Literal[-1, 1]) -> str:
-        x, y = pos
-        backwards_prefix = list[str]()
-        while True:
-            x += inc
-            letter = self.board.get_letter_at((x, y))
-            if letter is None:
-                break
-            backwards_prefix.append(letter)
-        return "".join(backwards_prefix[::inc])  # Reverse it if we went backwards.
-
-    # Return the horizontal prefix before this spot.
-    def _get_horizontal_prefix(self, pos: BoardPosition) -> str:
-        return self._get_horizontal_affix(pos=pos, inc=-1)
-
-    # Return the horizontal suffix after this spot.
-    def _get_horizontal_suffix(self, pos: BoardPosition) -> str:
-        return self._get_horizontal_affix(pos=pos, inc=1)
+        # The letters on the board this info was computed for (see Board.letters), the points of its tiles,
+        # and its Zobrist hash. The cross-word points depend on the tiles' points as well as their letters,
+        # so a blank and a real tile of the same letter aren't the same here.
+        self.letters = board.letters.copy()
+        self.tile_points = _get_tile_points(board.tiles)
+        self.zobrist_hash = board.zobrist_hash
+
+        # See what letters can be placed vertically and horizontally in each spot, as letter masks.
+        self.pos_to_vertical_mask = dict[BoardPosition, int]()
+        self.pos_to_horizontal_mask = dict[BoardPosition, int]()
+        # The points of the tiles in the cross-word a tile placed in each spot would make, or None if it wouldn't make one.
+        self.pos_to_vertical_cross_points = dict[BoardPosition, int | None]()
+        self.pos_to_horizontal_cross_points = dict[BoardPosition, int | None]()
+        for y in range(board.height):
+            self._update_row(y=y)
+        for x in range(board.width):
+            self._update_column(x=x)
+
+    # Return the mask of the letters that can go between the prefix and the suffix.
+    def _get_middle_mask(self, prefix: str, suffix: str) -> int:
+        possible_middle_mask = self.infix_info.get_suffix_mask(
+            prefix
+        ) & self.infix_info.get_prefix_mask(suffix)
+        if prefix == "" and suffix == "":
+            # A single letter is fine by itself.
+            return possible_middle_mask
+
+        middle_mask = NO_LETTERS
+        for c in get_letters(possible_middle_mask):
+            # See the word made.
+            if prefix + c + suffix in self.words:
+                middle_mask |= LETTER_TO_BIT[c]
+        return middle_mask
+
+    # Recompute the masks of the letters that can be placed vertically in this row.
+    # The letters that make horizontal words can be placed vertically.
+    def _update_row(self, y: int) -> None:
+        board = self.board
+        letters = board.get_row_letters(y)
+        tiles = board.tiles[y * board.width : (y + 1) * board.width]
+        for x in range(board.width):
+            prefix, suffix = _get_affixes(letters=letters, i=x)
+            self.pos_to_vertical_mask[x, y] = self._get_middle_mask(prefix=prefix, suffix=suffix)
+            self.pos_to_vertical_cross_points[x, y] = _get_cross_points(tiles=tiles, i=x)
+
+    # Recompute the masks of the letters that can be placed horizontally in this column.
+    # The letters that make vertical words can be placed horizontally.
+    def _update_column(self, x: int) -> None:
+        board = self.board
+        letters = board.get_column_letters(x)
+        tiles = board.tiles[x :: board.width]
+        for y in range(board.height):
+            prefix, suffix = _get_affixes(letters=letters, i=y)
+            self.pos_to_horizontal_mask[x, y] = self._get_middle_mask(prefix=prefix, suffix=suffix)
+            self.pos_to_horizontal_cross_points[x, y] = _get_cross_points(tiles=tiles, i=y)
+
+    # Return whether this info can be brought up to date for the given state with update().
+    def can_update_for(self, state: GameState) -> bool:
+        return (
+            state.config.playable_words is self.words
+            and state.config.infix_data is self.infix_info
+            and state.board.width == self.board.width
+            and state.board.height == self.board.height
+        )
 
-    def _get_vertical_affix(self, pos: BoardPosition, inc: Literal[-1, 1]) -> str:
-        # TODO Eliminate this redundancy.
-        x, y = pos
-        backwards_prefix = list[str]()
-        while True:
-            y += inc
-            letter = self.board.get_letter_at((x, y))
-            if letter is None:
+    # Bring this info up to date with the given board.
+    # Only the rows and columns where tiles were added, removed or changed are recomputed,
+    # since the words a letter could make (and their points) only run along its row and column.
+    def update(self, board: Board) -> None:
+        self.board = board
+        if board.zobrist_hash == self.zobrist_hash:
+            return
+
+        letters = board.letters
+        tile_points = _get_tile_points(board.tiles)
+        changed_rows = set[int]()
+        changed_columns = set[int]()
+        for i in range(len(letters)):
+            if letters[i] != self.letters[i] or tile_points[i] != self.tile_points[i]:
+                changed_rows.add(i // board.width)
+                changed_columns.add(i % board.width)
+        self.letters = letters.copy()
+        self.tile_points = tile_points
+        self.zobrist_hash = board.zobrist_hash
+
+        for y in changed_rows:
+            self._update_row(y=y)
+        for x in changed_columns:
+            self._update_column(x=x)
+
+
+# Return the points of each of the given tiles, or None where there isn't one.
+def _get_tile_points(tiles: Sequence[Tile | None]) -> list[int | None]:
+    return [None if tile is None else tile.points for tile in tiles]
+
+
+# Return the letters before and after the given index in a row or column of letter codes,
+# up to the first square without a letter each way.
+def _get_affixes(letters: bytearray, i: int) -> tuple[str, str]:
+    start = letters.rfind(NO_LETTER_CODE, 0, i) + 1
+    end = letters.find(NO_LETTER_CODE, i + 1)
+    if end < 0:
+        end = len(letters)
+    return letters[start:i].decode("ascii"), letters[i + 1 : end].decode("ascii")
+
+
+# Return the points of the tiles on either side of the given index in a row or column of tiles,
+# or None if there aren't any.
+def _get_cross_points(tiles: Sequence[Tile | None], i: int) -> int | None:
+    points = 0
+    found_tile = False
+    for step in (-1, 1):
+        j = i + step
+        while 0 <= j < len(tiles):
+            tile = tiles[j]
+            if tile is None:
                 break
-            backwards_prefix.append(letter)
-        return "".join(backwards_prefix[::inc])  # Reverse it if we went backwards.
+            points += tile.points
+            found_tile = True
+            j += step
+    return points if found_tile else None
 
-    # Return the vertical prefix above this spot.
-    def _get_vertical_prefix(self, pos: BoardPosition) -> str:
-        return self._get_vertical_affix(pos=pos, inc=-1)
 
-    # Return the vertical suffix below this spot.
-    def _get_vertical_suffix(self, pos: BoardPosition) -> str:
-        return self._get_vertical_affix(pos=pos, inc=1)
+# Return playable letter info for the given state.
+# The previous info is updated and returned if it can be, so it can be kept between turns.
+def get_playable_letter_info(
+    state: GameState, previous: PlayableLetterInfo | None = None
+) -> PlayableLetterInfo:
+    if previous is None or not previous.can_update_for(state):
+        return PlayableLetterInfo(state=state)
+    previous.update(board=state.board)
+    return previous
+
 
 # class ChangeTreeDict:
 #     def __init__(self, )
@@ -325,6 +380,7 @@ class PlaceTilesState:
     before_begin_pos: BoardPosition
     after_end_pos: BoardPosition
     ignore_one_tile_moves: bool
+    blocked_positions: Collection[BoardPosition]
 
     def __init__(
         self,
@@ -335,6 +391,7 @@ class PlaceTilesState:
         before_begin_pos: BoardPosition,
         after_end_pos: BoardPosition,
         ignore_one_tile_moves=False,
+        blocked_positions: Collection[BoardPosition] = frozenset(),
     ) -> None:
         self.pos_to_tile_placed = frozendict(pos_to_tile_placed)
         self.start_pos = start_pos
@@ -343,42 +400,144 @@ class PlaceTilesState:
         self.before_begin_pos = before_begin_pos
         self.after_end_pos = after_end_pos
         self.ignore_one_tile_moves = ignore_one_tile_moves
+        # Empty positions that tiles may not be placed on before the beginning of the word.
+        self.blocked_positions = blocked_positions
 
 
 # Return all the possible tile-placings at the given spot, given the acceptable letters.
 def get_all_possible_placings(
-    ok_side_letters: Collection[LETTER], ok_letters: Collection[LETTER], tile: Tile
+    ok_side_mask: int, ok_mask: int, tile: Tile
 ) -> list[TilePlacing]:
     # Get all of the possible tile-placings.
     placings = list[TilePlacing]()
+    mask = ok_side_mask & ok_mask
     if isinstance(tile, LetterTile):
         # If the letter is okay, we can place this tile here.
-        if tile.letter in ok_side_letters and tile.letter in ok_letters:
+        if mask & LETTER_TO_BIT[tile.letter]:
             placings.append(LetterTilePlacing(tile=tile))
     elif isinstance(tile, BlankTile):
-        if len(ok_side_letters) < len(ok_letters):
-            smaller = ok_side_letters
-            larger = ok_letters
-        else:
-            smaller = ok_letters
-            larger = ok_side_letters
-        for letter in smaller:
-            if letter in larger:
-                placings.append(BlankTilePlacing(tile=tile, letter=letter))
-
-        # for letter in ok_side_letters:
-        #     if letter in ok_letters:
-        #         placings.append(BlankTilePlacing(tile=tile, letter=letter))
+        for letter in get_letters(mask):
+            placings.append(BlankTilePlacing(tile=tile, letter=letter))
     return placings
     # new_tiles_left = list(place_tiles_state.tiles_left)
     # new_tiles_left.remove(tile)
 
 
+# Return the anchor squares of the board: the empty squares next to a tile already on the board.
+# On an empty board, the only anchor is the starting position (or every square, if there isn't one).
+def get_anchor_positions(board: Board) -> set[BoardPosition]:
+    if board.num_tiles == 0:
+        if board.starting_position is None:
+            return set(board.all_positions())
+        return {board.starting_position}
+
+    return {
+        pos
+        for pos in get_adjacent_positions(positions=board.position_to_tile)
+        if board.contains_position(pos)
+    }
+
+
+# Yield the moves (with their points) that can be made on an empty board through the given position.
+# The words the rack can make are looked up in the anagram index, and then placed every way that covers the position.
+def iter_opening_moves(
+    state: GameState, pos: BoardPosition
+) -> Iterator[tuple[CompactMove, int]]:
+    board = state.board
+    config = state.config
+    tile_to_count = dict(get_tile_to_count(tiles=state.player_to_state[state.current_player].tiles))
+    letters = "".join(
+        [tile.letter * count for tile, count in tile_to_count.items() if isinstance(tile, LetterTile)]
+    )
+    num_blanks = sum([count for tile, count in tile_to_count.items() if isinstance(tile, BlankTile)])
+
+    # On an empty board, a move has to make a word by itself.
+    words = config.anagram_index.get_words(letters=letters, num_blanks=num_blanks, min_length=2)
+    x, y = pos
+    for word in sorted(words):
+        tilings = _get_word_tilings(word=word, tile_to_count=tile_to_count)
+        bingo_points = config.bingo_points if len(word) >= config.min_tiles_for_bingo else 0
+        for dx, dy in ((1, 0), (0, 1)):
+            step = dx + dy * board.width
+            # Try each letter of the word on the position.
+            for i in range(len(word)):
+                start_x, start_y = x - i * dx, y - i * dy
+                end_x, end_y = start_x + (len(word) - 1) * dx, start_y + (len(word) - 1) * dy
+                if not (
+                    board.contains_position((start_x, start_y))
+                    and board.contains_position((end_x, end_y))
+                ):
+                    continue
+                start = board.get_index((start_x, start_y))
+                indices = range(start, start + len(word) * step, step)
+                letter_multipliers = [board.letter_multipliers[index] for index in indices]
+                word_multiplier = 1
+                for index in indices:
+                    word_multiplier *= board.word_multipliers[index]
+
+                for tiles, tile_points in tilings:
+                    word_points = 0
+                    for points, letter_multiplier in zip(tile_points, letter_multipliers):
+                        word_points += points * letter_multiplier
+                    yield (
+                        CompactMove(start=start, step=step, tiles=tiles, letters=word),
+                        word_points * word_multiplier + bingo_points,
+                    )
+
+
+# Return every way of spelling out the given word with the given tiles,
+# as the tiles for the letters and their points (nothing for a blank tile).
+def _get_word_tilings(
+    word: str, tile_to_count: dict[Tile, int]
+) -> list[tuple[tuple[Tile, ...], tuple[int, ...]]]:
+    # Get the tiles that can be each letter.
+    letter_options = list[list[tuple[Tile, int]]]()
+    for letter in word:
+        options = list[tuple[Tile, int]]()
+        for tile in tile_to_count:
+            if isinstance(tile, LetterTile):
+                if tile.letter == letter:
+                    options.append((tile, tile.points))
+            else:
+                options.append((tile, 0))
+        letter_options.append(options)
+
+    # Combine them, as long as there are enough of each tile.
+    result = list[tuple[tuple[Tile, ...], tuple[int, ...]]]()
+    counts = dict(tile_to_count)
+    tiles = list[Tile]()
+    tile_points = list[int]()
+
+    def add_tilings(j: int) -> None:
+        if j == len(word):
+            result.append((tuple(tiles), tuple(tile_points)))
+            return
+        for tile, points in letter_options[j]:
+            count = counts[tile]
+            if count == 0:
+                continue
+            counts[tile] = count - 1
+            tiles.append(tile)
+            tile_points.append(points)
+            add_tilings(j + 1)
+            tile_points.pop()
+            tiles.pop()
+            counts[tile] = count
+
+    add_tilings(0)
+    return result
+
+
 # Finds place-tiles moves.
 class PlaceTilesMoveFinder:
-    def __init__(self, words: Collection[WORD]) -> None:
+    # If use_anchors is True, moves are found from the anchor squares, each exactly once.
+    # Otherwise, they're found from every tile on the board, and the duplicates are removed.
+    def __init__(self, words: Collection[WORD], use_anchors: bool = True) -> None:
         self.words = frozenset(words)
+        self.use_anchors = use_anchors
         # self.infix_data = infix_data.InfixData(words=self.words)
+        # Kept between calls, so only the lines of the board that changed are recomputed.
+        self.playable_letter_info: PlayableLetterInfo | None = None
 
     # Return all vertical moves, only going down.
     # Assumes that there is no tile directly above or below the column of already-placed tiles. TODO check for this.
@@ -413,16 +572,15 @@ class PlaceTilesMoveFinder:
         # If it is, recursively get all words you can make with it placed.
         # # Also, if it's already a word, add that.
         x = place_pos[0]
-        ok_letters = playable_letter_info.pos_to_vertical_letters.get(
-            place_pos, tuple[LETTER, ...]()
+        ok_side_mask = playable_letter_info.pos_to_vertical_mask.get(
+            place_pos, NO_LETTERS
         )
-        # ok_suffixes = self.infix_data.get_all_suffixes(place_tiles_state.word)
-        ok_suffixes = state.config.infix_data.get_all_suffixes(place_tiles_state.word)
+        ok_suffix_mask = state.config.infix_data.get_suffix_mask(place_tiles_state.word)
         unique_tiles = set(place_tiles_state.tiles_left)
         for tile in unique_tiles:
             # Get all of the possible tile-placings.
             placings = get_all_possible_placings(
-                ok_side_letters=ok_letters, ok_letters=ok_suffixes, tile=tile  # type: ignore
+                ok_side_mask=ok_side_mask, ok_mask=ok_suffix_mask, tile=tile
             )
             new_tiles_left = list(place_tiles_state.tiles_left)
             new_tiles_left.remove(tile)
@@ -439,9 +597,8 @@ class PlaceTilesMoveFinder:
                     if letter_below is None:
                         # We're past all of the tiles at the top.
                         break
-                    # ok_suffixes = self.infix_data.get_all_suffixes(current_word)
-                    ok_suffixes = state.config.infix_data.get_all_suffixes(current_word)
-                    if not letter_below in ok_suffixes:
+                    next_ok_suffix_mask = state.config.infix_data.get_suffix_mask(current_word)
+                    if not next_ok_suffix_mask & LETTER_TO_BIT[letter_below]:
                         placing_works = False
                         break
                     current_word = current_word + letter_below
@@ -462,6 +619,7 @@ class PlaceTilesMoveFinder:
                     before_begin_pos=place_tiles_state.before_begin_pos,
                     after_end_pos=new_after_end_pos,
                     ignore_one_tile_moves=place_tiles_state.ignore_one_tile_moves,
+                    blocked_positions=place_tiles_state.blocked_positions,
                 )
                 result.update(
                     self._rec_get_all_vertical_moves_down(
@@ -492,21 +650,24 @@ class PlaceTilesMoveFinder:
             )
         )
 
-        # Check if there's room on the board to place a tile above us.
-        if state.board.contains_position(place_tiles_state.before_begin_pos):
+        # Check if there's room on the board to place a tile above us, and whether we may place one there.
+        before_begin_pos = place_tiles_state.before_begin_pos
+        if (
+            state.board.contains_position(before_begin_pos)
+            and before_begin_pos not in place_tiles_state.blocked_positions
+        ):
             # For each tile we could place above us, recursively get all moves with it placed.
             unique_tiles = set(place_tiles_state.tiles_left)
             place_pos = place_tiles_state.before_begin_pos
             x = place_pos[0]
-            ok_letters = playable_letter_info.pos_to_vertical_letters.get(
-                place_pos, tuple[LETTER, ...]()
+            ok_side_mask = playable_letter_info.pos_to_vertical_mask.get(
+                place_pos, NO_LETTERS
             )
-            # ok_prefixes = self.infix_data.get_all_prefixes(place_tiles_state.word)
-            ok_prefixes = state.config.infix_data.get_all_prefixes(place_tiles_state.word)
+            ok_prefix_mask = state.config.infix_data.get_prefix_mask(place_tiles_state.word)
             for tile in unique_tiles:
                 # Get all of the possible tile-placings.
                 placings = get_all_possible_placings(
-                    ok_side_letters=ok_letters, ok_letters=ok_prefixes, tile=tile  # type: ignore
+                    ok_side_mask=ok_side_mask, ok_mask=ok_prefix_mask, tile=tile
                 )
                 new_tiles_left = list(place_tiles_state.tiles_left)
                 new_tiles_left.remove(tile)
@@ -525,9 +686,8 @@ class PlaceTilesMoveFinder:
                         if letter_above is None:
                             # We're past all of the tiles at the top.
                             break
-                        # ok_prefixes = self.infix_data.get_all_prefixes(current_word)
-                        ok_prefixes = state.config.infix_data.get_all_prefixes(current_word)
-                        if not letter_above in ok_prefixes:
+                        next_ok_prefix_mask = state.config.infix_data.get_prefix_mask(current_word)
+                        if not next_ok_prefix_mask & LETTER_TO_BIT[letter_above]:
                             placing_works = False
                             break
                         current_word = letter_above + current_word
@@ -551,6 +711,7 @@ class PlaceTilesMoveFinder:
                         before_begin_pos=new_before_begin_pos,
                         after_end_pos=place_tiles_state.after_end_pos,
                         ignore_one_tile_moves=place_tiles_state.ignore_one_tile_moves,
+                        blocked_positions=place_tiles_state.blocked_positions,
                     )
 
                     # Recursively get all vertical moves with this tile-placing.
@@ -572,6 +733,7 @@ class PlaceTilesMoveFinder:
         pos: BoardPosition,
         placing_at_pos: TilePlacing | None = None,
         ignore_one_tile_moves=False,
+        blocked_positions: Collection[BoardPosition] = frozenset(),
     ) -> set[PlaceTilesMove]:
         board = state.board
         current_word = list[str]()
@@ -619,6 +781,7 @@ class PlaceTilesMoveFinder:
             before_begin_pos=(x, begin_y),
             after_end_pos=(x, end_y),
             ignore_one_tile_moves=ignore_one_tile_moves,
+            blocked_positions=blocked_positions,
         )
 
         # Return all of the vertical moves from here using the recursive algorithm.
@@ -659,16 +822,15 @@ class PlaceTilesMoveFinder:
         # # Also, if it's already a word, add that.
         # x = place_pos[0]
         y = place_pos[1]
-        ok_letters = playable_letter_info.pos_to_horizontal_letters.get(
-            place_pos, tuple[LETTER, ...]()
+        ok_side_mask = playable_letter_info.pos_to_horizontal_mask.get(
+            place_pos, NO_LETTERS
         )
-        # ok_suffixes = self.infix_data.get_all_suffixes(place_tiles_state.word)
-        ok_suffixes = state.config.infix_data.get_all_suffixes(place_tiles_state.word)
+        ok_suffix_mask = state.config.infix_data.get_suffix_mask(place_tiles_state.word)
         unique_tiles = set(place_tiles_state.tiles_left)
         for tile in unique_tiles:
             # Get all of the possible tile-placings.
             placings = get_all_possible_placings(
-                ok_side_letters=ok_letters, ok_letters=ok_suffixes, tile=tile  # type: ignore
+                ok_side_mask=ok_side_mask, ok_mask=ok_suffix_mask, tile=tile
             )
             new_tiles_left = list(place_tiles_state.tiles_left)
             new_tiles_left.remove(tile)
@@ -685,9 +847,8 @@ class PlaceTilesMoveFinder:
                     if letter_after is None:
                         # We're past all of the tiles at the top.
                         break
-                    # ok_suffixes = self.infix_data.get_all_suffixes(current_word)
-                    ok_suffixes = state.config.infix_data.get_all_suffixes(current_word)
-                    if not letter_after in ok_suffixes:
+                    next_ok_suffix_mask = state.config.infix_data.get_suffix_mask(current_word)
+                    if not next_ok_suffix_mask & LETTER_TO_BIT[letter_after]:
                         placing_works = False
                         break
                     current_word = current_word + letter_after
@@ -708,6 +869,7 @@ class PlaceTilesMoveFinder:
                     before_begin_pos=place_tiles_state.before_begin_pos,
                     after_end_pos=new_after_end_pos,
                     ignore_one_tile_moves=place_tiles_state.ignore_one_tile_moves,
+                    blocked_positions=place_tiles_state.blocked_positions,
                 )
                 result.update(
                     self._rec_get_all_horizontal_moves_right(
@@ -738,21 +900,24 @@ class PlaceTilesMoveFinder:
             )
         )
 
-        # Check if there's room on the board to place a tile above us.
-        if state.board.contains_position(place_tiles_state.before_begin_pos):
+        # Check if there's room on the board to place a tile above us, and whether we may place one there.
+        before_begin_pos = place_tiles_state.before_begin_pos
+        if (
+            state.board.contains_position(before_begin_pos)
+            and before_begin_pos not in place_tiles_state.blocked_positions
+        ):
             # For each tile we could place above us, recursively get all moves with it placed.
             unique_tiles = set(place_tiles_state.tiles_left)
             place_pos = place_tiles_state.before_begin_pos
             y = place_pos[1]
-            ok_letters = playable_letter_info.pos_to_horizontal_letters.get(
-                place_pos, tuple[LETTER, ...]()
+            ok_side_mask = playable_letter_info.pos_to_horizontal_mask.get(
+                place_pos, NO_LETTERS
             )
-            # ok_prefixes = self.infix_data.get_all_prefixes(place_tiles_state.word)
-            ok_prefixes = state.config.infix_data.get_all_prefixes(place_tiles_state.word)
+            ok_prefix_mask = state.config.infix_data.get_prefix_mask(place_tiles_state.word)
             for tile in unique_tiles:
                 # Get all of the possible tile-placings.
                 placings = get_all_possible_placings(
-                    ok_side_letters=ok_letters, ok_letters=ok_prefixes, tile=tile  # type: ignore
+                    ok_side_mask=ok_side_mask, ok_mask=ok_prefix_mask, tile=tile
                 )
                 new_tiles_left = list(place_tiles_state.tiles_left)
                 new_tiles_left.remove(tile)
@@ -771,9 +936,8 @@ class PlaceTilesMoveFinder:
                         if letter_before is None:
                             # We're past all of the tiles at the top.
                             break
-                        # ok_prefixes = self.infix_data.get_all_prefixes(current_word)
-                        ok_prefixes = state.config.infix_data.get_all_prefixes(current_word)
-                        if not letter_before in ok_prefixes:
+                        next_ok_prefix_mask = state.config.infix_data.get_prefix_mask(current_word)
+                        if not next_ok_prefix_mask & LETTER_TO_BIT[letter_before]:
                             placing_works = False
                             break
                         current_word = letter_before + current_word
@@ -797,6 +961,7 @@ class PlaceTilesMoveFinder:
                         before_begin_pos=new_before_begin_pos,
                         after_end_pos=place_tiles_state.after_end_pos,
                         ignore_one_tile_moves=place_tiles_state.ignore_one_tile_moves,
+                        blocked_positions=place_tiles_state.blocked_positions,
                     )
 
                     # Recursively get all horizontal moves with this tile-placing.
@@ -818,6 +983,7 @@ class PlaceTilesMoveFinder:
         pos: BoardPosition,
         placing_at_pos: TilePlacing | None = None,
         ignore_one_tile_moves=False,
+        blocked_positions: Collection[BoardPosition] = frozenset(),
     ) -> set[PlaceTilesMove]:
         board = state.board
         current_word = list[str]()
@@ -865,6 +1031,7 @@ class PlaceTilesMoveFinder:
             before_begin_pos=(begin_x, y),
             after_end_pos=(end_x, y),
             ignore_one_tile_moves=ignore_one_tile_moves,
+            blocked_positions=blocked_positions,
         )
 
         # Return all of the horizontal moves from here using the recursive algorithm.
@@ -960,9 +1127,9 @@ class PlaceTilesMoveFinder:
             # See what tiles we can place there.
             # ok_letters = self.infix_data.get_all_suffixes(horizontal_word)
             unique_tiles = set(state.player_to_state[state.current_player].tiles)
-            ok_side_letters = playable_letter_info.pos_to_vertical_letters.get(spot_to_side, tuple[LETTER, ...]())
+            ok_side_mask = playable_letter_info.pos_to_vertical_mask.get(spot_to_side, NO_LETTERS)
             for tile in unique_tiles:
-                placings = get_all_possible_placings(ok_side_letters=ok_side_letters, ok_letters=ALPHABET, tile=tile)  # type: ignore
+                placings = get_all_possible_placings(ok_side_mask=ok_side_mask, ok_mask=ALL_LETTERS, tile=tile)
                 # For each placing, see all vertical words you can make with it.
                 for placing in placings:
                     result.update(
@@ -999,11 +1166,11 @@ class PlaceTilesMoveFinder:
             # See what tiles we can place there.
             # ok_letters = self.infix_data.get_all_suffixes(horizontal_word)
             unique_tiles = set(state.player_to_state[state.current_player].tiles)
-            ok_side_letters = playable_letter_info.pos_to_horizontal_letters.get(
-                spot_to_side, tuple[LETTER, ...]()
+            ok_side_mask = playable_letter_info.pos_to_horizontal_mask.get(
+                spot_to_side, NO_LETTERS
             )
             for tile in unique_tiles:
-                placings = get_all_possible_placings(ok_side_letters=ok_side_letters, ok_letters=ALPHABET, tile=tile)  # type: ignore
+                placings = get_all_possible_placings(ok_side_mask=ok_side_mask, ok_mask=ALL_LETTERS, tile=tile)
                 # For each placing, see all horizontal words you can make with it.
                 for placing in placings:
                     result.update(
@@ -1046,30 +1213,55 @@ class PlaceTilesMoveFinder:
         state: GameState,
         playable_letter_info: PlayableLetterInfo,
         pos: BoardPosition,
+    ) -> set[PlaceTilesMove]:
+        return {
+            move.to_place_tiles_move(board=state.board)
+            for move, _ in iter_opening_moves(state=state, pos=pos)
+        }
+
+    # Return all moves whose leftmost (or topmost) anchor is the given anchor.
+    # Moves that place a single tile are only found horizontally.
+    def _get_all_anchor_moves(
+        self,
+        state: GameState,
+        playable_letter_info: PlayableLetterInfo,
+        anchor: BoardPosition,
+        anchors: Collection[BoardPosition],
+        ignore_one_tile_moves: bool,
     ) -> set[PlaceTilesMove]:
         result = set[PlaceTilesMove]()
 
+        horizontal_ok_mask = playable_letter_info.pos_to_horizontal_mask.get(
+            anchor, NO_LETTERS
+        )
+        vertical_ok_mask = playable_letter_info.pos_to_vertical_mask.get(
+            anchor, NO_LETTERS
+        )
         unique_tiles = set(state.player_to_state[state.current_player].tiles)
         for tile in unique_tiles:
-            placings = get_all_possible_placings(ok_side_letters=ALPHABET, ok_letters=ALPHABET, tile=tile)  # type: ignore
-            # For each placing, see all of the words you can make with it.
+            placings = get_all_possible_placings(ok_side_mask=horizontal_ok_mask, ok_mask=ALL_LETTERS, tile=tile)
             for placing in placings:
                 result.update(
                     self._get_all_horizontal_straight_moves(
                         state=state,
                         playable_letter_info=playable_letter_info,
-                        pos=pos,
+                        pos=anchor,
                         placing_at_pos=placing,
-                        ignore_one_tile_moves=True,
+                        ignore_one_tile_moves=ignore_one_tile_moves,
+                        blocked_positions=anchors,
                     )
                 )
+
+            placings = get_all_possible_placings(ok_side_mask=vertical_ok_mask, ok_mask=ALL_LETTERS, tile=tile)
+            for placing in placings:
                 result.update(
                     self._get_all_vertical_straight_moves(
                         state=state,
                         playable_letter_info=playable_letter_info,
-                        pos=pos,
+                        pos=anchor,
                         placing_at_pos=placing,
                         ignore_one_tile_moves=True,
+                        blocked_positions=anchors,
                     )
                 )
 
@@ -1078,13 +1270,32 @@ class PlaceTilesMoveFinder:
     def get_all_place_tiles_moves(self, state: GameState) -> set[PlaceTilesMove]:
         result = set[PlaceTilesMove]()
 
-        playable_letter_info = PlayableLetterInfo(
-            state=state
+        playable_letter_info = get_playable_letter_info(
+            state=state, previous=self.playable_letter_info
         )
+        self.playable_letter_info = playable_letter_info
 
         board = state.board
+
+        # Find the moves from each anchor. Since no move is found twice, the sets are disjoint.
+        if self.use_anchors:
+            anchors = get_anchor_positions(board)
+            ignore_one_tile_moves = board.num_tiles == 0
+            for anchor in anchors:
+                result.update(
+                    self._get_all_anchor_moves(
+                        state=state,
+                        playable_letter_info=playable_letter_info,
+                        anchor=anchor,
+                        anchors=anchors,
+                        ignore_one_tile_moves=ignore_one_tile_moves,
+                    )
+                )
+            profiling.add_count(profiling.MOVES_GENERATED, len(result))
+            return result
+
         # If there's an initial tile and it hasn't been placed on, place a move on it.
-        if len(board.position_to_tile) == 0:
+        if board.num_tiles == 0:
             # If there's no starting position specified, we can play anywhere.
             # Otherwise, we have to play on the starting position.
             if board.starting_position is None:
@@ -1096,13 +1307,14 @@ class PlaceTilesMoveFinder:
                             pos=pos,
                         )
                     )
-                return result
             else:
-                return self._get_all_place_tiles_moves_no_anchor(
+                result = self._get_all_place_tiles_moves_no_anchor(
                     state=state,
                     playable_letter_info=playable_letter_info,
                     pos=board.starting_position,
                 )
+            profiling.add_count(profiling.MOVES_GENERATED, len(result))
+            return result
 
         # For every tile in the board, makes moves from it.
         for pos in board.position_to_tile:
@@ -1119,4 +1331,692 @@ class PlaceTilesMoveFinder:
                 )
             )
 
+        profiling.add_count(profiling.MOVES_GENERATED, len(result))
+        return result
+
+
+# The value of a move for best_moves, from its points and the number of tiles it places.
+MoveKey = Callable[[int, int], Any]
+
+
+# Return the points of a move, ignoring the number of tiles it places.
+def get_points_key(points: int, num_tiles: int) -> int:
+    return points
+
+
+# The best moves found so far by some key, keeping at most k of them in a heap.
+class _BestMoves:
+    def __init__(self, k: int, key: MoveKey) -> None:
+        self.k = k
+        self.key = key
+        # Entries are (key value, order found, move, points), so the worst move is at the top.
+        self.heap = list[tuple[Any, int, CompactMove, int]]()
+        # The moves offered, whether or not they were one of the best, and the moves added.
+        self.num_offered = 0
+        self.num_found = 0
+
+    # Return whether there are k moves already.
+    def is_full(self) -> bool:
+        return len(self.heap) >= self.k
+
+    # Return whether a move with the given key value would be one of the best moves.
+    # Ties go to the move found first.
+    def could_add(self, value: Any) -> bool:
+        return len(self.heap) < self.k or value > self.heap[0][0]
+
+    # Return whether a move that was found, with the given key value, would be one of the best moves.
+    # Unlike could_add, it counts the move as offered.
+    def offer(self, value: Any) -> bool:
+        self.num_offered += 1
+        return self.could_add(value)
+
+    def add(self, value: Any, move: CompactMove, points: int) -> None:
+        # Moves found later sort lower, so that they're dropped first among equal moves.
+        entry = (value, -self.num_found, move, points)
+        self.num_found += 1
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        else:
+            heapq.heapreplace(self.heap, entry)
+
+    # Return the moves and their points, best first.
+    def get_moves(self) -> list[tuple[CompactMove, int]]:
+        return [(move, points) for _, _, move, points in sorted(self.heap, reverse=True)]
+
+
+# Optimistic limits on what placing tiles along a run of squares can add to a move's score.
+# A run starts at a square and goes forwards to the end of its line, and the tiles go on its first empty squares.
+# The lists are indexed by the number of tiles placed.
+@dataclass
+class _RunBound:
+    # The most tiles that fit in the run.
+    max_tiles: int
+    # The points of the tiles already on the board that the word could reach.
+    board_points: list[int]
+    # The most the tiles could add to the main word before its word multiplier,
+    # pairing the most valuable tiles with the biggest letter multipliers.
+    letter_points: list[int]
+    # The product of the word multipliers.
+    word_multiplier: list[int]
+    # The most the tiles could score in cross-words.
+    cross_word_points: list[int]
+
+
+# The bounds of the runs along the lines in one direction, made when they're first needed.
+# The squares are given by their index in the board's arrays.
+class _RunBounds:
+    def __init__(
+        self,
+        board: Board,
+        direction: Direction,
+        cross_points: Sequence[int | None],
+        top_tile_points: Sequence[int],
+    ) -> None:
+        self.board = board
+        self.direction = direction
+        self.step = 1 if direction == Direction.HORIZONTAL else board.width
+        self.cross_points = cross_points
+        # The points of the tiles in the rack, most valuable first.
+        self.top_tile_points = top_tile_points
+        self.index_to_bound = dict[int, _RunBound]()
+
+    # Return the bound of the run starting at the square with the given index.
+    def get(self, index: int) -> _RunBound:
+        bound = self.index_to_bound.get(index)
+        if bound is None:
+            bound = self._get_bound(index)
+            self.index_to_bound[index] = bound
+        return bound
+
+    def _get_bound(self, index: int) -> _RunBound:
+        board = self.board
+        top_tile_points = self.top_tile_points
+        num_tiles = len(top_tile_points)
+        max_tile_points = top_tile_points[0] if top_tile_points else 0
+
+        # Go along the run until there are more empty squares than tiles.
+        board_points = list[int]()
+        letter_multipliers = list[int]()
+        word_multipliers = list[int]()
+        cross_word_points = list[int]()
+        points = 0
+        if self.direction == Direction.HORIZONTAL:
+            end = (index // board.width + 1) * board.width
+        else:
+            end = len(board.tiles)
+        i = index
+        while i < end:
+            tile = board.tiles[i]
+            if tile is not None:
+                points += tile.points
+            else:
+                # The tiles up to here can be reached by placing one tile fewer than this.
+                board_points.append(points)
+                if len(letter_multipliers) == num_tiles:
+                    break
+
+                letter_multiplier = board.letter_multipliers[i]
+                word_multiplier = board.word_multipliers[i]
+                letter_multipliers.append(letter_multiplier)
+                word_multipliers.append(word_multiplier)
+
+                cross_points = self.cross_points[i]
+                cross_word_points.append(
+                    0
+                    if cross_points is None
+                    else (cross_points + max_tile_points * letter_multiplier) * word_multiplier
+                )
+            i += self.step
+        else:
+            board_points.append(points)
+
+        # The runs that end early can't place any more tiles.
+        while len(board_points) <= num_tiles:
+            board_points.append(points)
+
+        result = _RunBound(
+            max_tiles=len(letter_multipliers),
+            board_points=board_points,
+            letter_points=[0],
+            word_multiplier=[1],
+            cross_word_points=[0],
+        )
+        for n in range(1, num_tiles + 1):
+            result.letter_points.append(
+                sum(
+                    [
+                        tile_points * letter_multiplier
+                        for tile_points, letter_multiplier in zip(
+                            top_tile_points, sorted(letter_multipliers[:n], reverse=True)
+                        )
+                    ]
+                )
+            )
+            word_multiplier = word_multipliers[n - 1] if n <= len(word_multipliers) else 1
+            result.word_multiplier.append(result.word_multiplier[-1] * word_multiplier)
+            cross_points = cross_word_points[n - 1] if n <= len(cross_word_points) else 0
+            result.cross_word_points.append(result.cross_word_points[-1] + cross_points)
         return result
+
+
+# The state of a search for the moves through one anchor square, in one direction.
+# The squares are looked up by their index in the board's arrays (see Board),
+# so only the squares that get tiles placed on them are made into positions.
+class _GaddagSearch:
+    def __init__(
+        self,
+        board: Board,
+        gaddag: Gaddag,
+        tile_to_count: dict[Tile, int],
+        is_anchor: bytearray,
+        ok_masks: Sequence[int],
+        cross_points: Sequence[int | None],
+        anchor: BoardPosition,
+        direction: Direction,
+        min_tiles_placed: int,
+        config: GameConfig,
+        best: _BestMoves | None = None,
+        run_bounds: _RunBounds | None = None,
+    ) -> None:
+        self.board = board
+        self.tiles = board.tiles
+        self.letters = board.letters
+        self.gaddag = gaddag
+        self.tile_to_count = tile_to_count
+        # Whether each square is an anchor.
+        self.is_anchor = is_anchor
+        # The cross-check mask and cross points of each square.
+        self.ok_masks = ok_masks
+        self.cross_points = cross_points
+        self.anchor = anchor
+
+        # Going one square along the line moves this far in the arrays.
+        x, y = anchor
+        self.anchor_index = y * board.width + x
+        if direction == Direction.HORIZONTAL:
+            self.step = 1
+            # The offsets of the ends of the anchor's line.
+            self.min_offset, self.max_offset = -x, board.width - 1 - x
+        else:
+            self.step = board.width
+            self.min_offset, self.max_offset = -y, board.height - 1 - y
+        self.min_tiles_placed = min_tiles_placed
+        self.min_tiles_for_bingo = config.min_tiles_for_bingo
+        self.bingo_points = config.bingo_points
+
+        # If we're only keeping the best moves, they go here instead of being yielded,
+        # and the run bounds are used to stop searching when we can't find a better one.
+        self.best = best
+        self.run_bounds = run_bounds
+        self.num_tiles = sum(tile_to_count.values())
+
+        # The tiles placed so far and their letters, in order along the line,
+        # and the offset of the first of them.
+        self.placed_tiles = list[Tile]()
+        self.placed_letters = list[LETTER]()
+        self.start_offset = 0
+
+        # The score of the move so far, kept up to date as tiles are placed and taken back.
+        # The main word's points are only multiplied by its word multiplier at the end.
+        self.word_length = 0
+        self.word_points = 0
+        self.word_multiplier = 1
+        self.cross_word_points = 0
+
+    # Return whether there is no tile at the given offset from the anchor (or it's off the board).
+    def _is_empty(self, offset: int) -> bool:
+        if offset < self.min_offset or offset > self.max_offset:
+            return True
+        return self.tiles[self.anchor_index + offset * self.step] is None
+
+    # Return the tiles placed so far as a move, along with its points,
+    # or None if they aren't a move or they go into the best moves instead.
+    def _record(self) -> tuple[CompactMove, int] | None:
+        num_placed = len(self.placed_tiles)
+        if num_placed < self.min_tiles_placed:
+            return None
+
+        # A one-letter main word doesn't count.
+        points = self.cross_word_points
+        if self.word_length > 1:
+            points += self.word_points * self.word_multiplier
+        if num_placed >= self.min_tiles_for_bingo:
+            points += self.bingo_points
+
+        if self.best is None:
+            return self._get_move(), points
+        value = self.best.key(points, num_placed)
+        if self.best.offer(value):
+            self.best.add(value=value, move=self._get_move(), points=points)
+        return None
+
+    # Return the tiles placed so far as a compact move.
+    def _get_move(self) -> CompactMove:
+        return CompactMove(
+            start=self.anchor_index + self.start_offset * self.step,
+            step=self.step,
+            tiles=tuple(self.placed_tiles),
+            letters="".join(self.placed_letters),
+        )
+
+    # Return the best key value any move going forwards from the given offset could have, having reached the given node.
+    # It assumes the rest of the rack goes on the best of the squares the word could still reach.
+    def _get_best_possible_value(self, offset: int, node: int) -> Any:
+        run_bound = self.run_bounds.get(self.anchor_index + offset * self.step)  # type: ignore
+        num_placed = len(self.placed_tiles)
+        # No more tiles can be placed than there are letters left on the way to the end of a word,
+        # or empty squares left in the line.
+        num_left = min(
+            self.num_tiles - num_placed,
+            self.gaddag.max_letters_left[node],
+            run_bound.max_tiles,
+        )
+
+        points = (
+            (
+                self.word_points
+                + run_bound.board_points[num_left]
+                + run_bound.letter_points[num_left]
+            )
+            * self.word_multiplier
+            * run_bound.word_multiplier[num_left]
+            + self.cross_word_points
+            + run_bound.cross_word_points[num_left]
+        )
+        num_tiles = num_placed + num_left
+        if num_tiles >= self.min_tiles_for_bingo:
+            points += self.bingo_points
+        return self.best.key(points, num_tiles)  # type: ignore
+
+    # Yield all the moves that use the square at the given offset next, having reached the given node.
+    def gen(self, offset: int, node: int) -> Iterator[tuple[CompactMove, int]]:
+        # Stop if nothing from here could be one of the best moves.
+        # This is only checked going forwards, when the squares the word can still reach are known.
+        if (
+            offset > 0
+            and self.best is not None
+            and self.best.is_full()
+            and not self.best.could_add(self._get_best_possible_value(offset=offset, node=node))
+        ):
+            return
+
+        index = self.anchor_index + offset * self.step
+
+        # If there's already a letter here, the word has to go through it.
+        code = self.letters[index]
+        if code != NO_LETTER_CODE:
+            yield from self.go_on(offset=offset, letter=chr(code), node=node, tile=None)
+            return
+
+        # Otherwise, try placing each of the tiles we have left,
+        # as long as the letter is allowed by the cross-checks and can continue a word from this node.
+        # The node mask's letter bits line up with the cross-check mask, so one AND gives the letters to try.
+        ok_mask = self.ok_masks[index] & self.gaddag.masks[node]
+        if not ok_mask:
+            return
+        for tile, count in list(self.tile_to_count.items()):
+            if count == 0:
+                continue
+            if isinstance(tile, LetterTile):
+                if not ok_mask & LETTER_TO_BIT[tile.letter]:
+                    continue
+                letters = tile.letter
+            else:
+                letters = get_letters(ok_mask)
+
+            self.tile_to_count[tile] = count - 1
+            for letter in letters:
+                yield from self.go_on(offset=offset, letter=letter, node=node, tile=tile)
+            self.tile_to_count[tile] = count
+
+    # Continue the search after the given letter is at the given offset,
+    # either on the board already or on the given tile from the rack.
+    def go_on(
+        self, offset: int, letter: LETTER, node: int, tile: Tile | None
+    ) -> Iterator[tuple[CompactMove, int]]:
+        gaddag = self.gaddag
+        child = gaddag.get_child(node, CHAR_TO_INDEX[letter])
+        if child < 0:
+            return
+
+        # Add the letter to the score.
+        index = self.anchor_index + offset * self.step
+        prev_score = (
+            self.word_length,
+            self.word_points,
+            self.word_multiplier,
+            self.cross_word_points,
+            self.start_offset,
+        )
+        self.word_length += 1
+        if tile is None:
+            self.word_points += self.tiles[index].points  # type: ignore
+        else:
+            # Going backwards, each tile is the new first one.
+            if offset <= 0:
+                self.placed_tiles.insert(0, tile)
+                self.placed_letters.insert(0, letter)
+                self.start_offset = offset
+            else:
+                if not self.placed_tiles:
+                    self.start_offset = offset
+                self.placed_tiles.append(tile)
+                self.placed_letters.append(letter)
+
+            # Blank tiles are worth nothing, and the multipliers only count for newly placed tiles.
+            tile_points = 0 if isinstance(tile, BlankTile) else tile.points
+            tile_points *= self.board.letter_multipliers[index]
+            word_multiplier = self.board.word_multipliers[index]
+            self.word_points += tile_points
+            self.word_multiplier *= word_multiplier
+
+            cross_points = self.cross_points[index]
+            if cross_points is not None:
+                self.cross_word_points += (cross_points + tile_points) * word_multiplier
+
+        if offset <= 0:
+            # We're going backwards from the anchor.
+            before_empty = self._is_empty(offset - 1)
+            if before_empty and self._is_empty(1):
+                # A single tile with nothing before or after it only makes the cross-word,
+                # which the cross-checks already allow.
+                if gaddag.is_terminal(child) or offset == 0:
+                    found = self._record()
+                    if found is not None:
+                        yield found
+
+            # Keep going backwards, as long as we don't place a tile on another anchor.
+            # (The move will be found from that anchor instead.)
+            if offset > self.min_offset and (
+                not before_empty or not self.is_anchor[index - self.step]
+            ):
+                yield from self.gen(offset=offset - 1, node=child)
+
+            # Switch to going forwards from the anchor, if the word can start here.
+            if before_empty and self.max_offset >= 1:
+                sep_child = gaddag.get_child(child, SEPARATOR_INDEX)
+                if sep_child >= 0:
+                    yield from self.gen(offset=1, node=sep_child)
+        else:
+            # We're going forwards from the anchor.
+            after_empty = self._is_empty(offset + 1)
+            if after_empty and gaddag.is_terminal(child):
+                found = self._record()
+                if found is not None:
+                    yield found
+
+            if offset < self.max_offset:
+                yield from self.gen(offset=offset + 1, node=child)
+
+        if tile is not None:
+            if offset <= 0:
+                del self.placed_tiles[0]
+                del self.placed_letters[0]
+            else:
+                self.placed_tiles.pop()
+                self.placed_letters.pop()
+        (
+            self.word_length,
+            self.word_points,
+            self.word_multiplier,
+            self.cross_word_points,
+            self.start_offset,
+        ) = prev_score
+
+
+# Checking the move generator against the rules, for debugging.
+# A sampled fraction of the moves GaddagMoveFinder finds are validated again by PlaceTilesMove.is_valid
+# (without trusting them) and scored again by get_points, and the ones that disagree are counted.
+# The rate is zero by default, so normal runs don't go over their moves a second time.
+class GeneratorSelfCheck:
+    # The most mismatches kept for looking at.
+    MAX_MISMATCHES_KEPT = 100
+
+    def __init__(self, rate: float = 0.0, seed: int | None = None) -> None:
+        # The fraction of the moves to check.
+        self.rate = rate
+        self.random = Random(seed)
+        self.num_checked = 0
+        self.num_mismatches = 0
+        # The first mismatches, as the move and the points the generator gave it.
+        self.mismatches = list[tuple[PlaceTilesMove, int]]()
+
+    # Return whether the next move should be checked.
+    def should_check(self) -> bool:
+        return self.rate >= 1 or (self.rate > 0 and self.random.random() < self.rate)
+
+    # Check the given move and the points the generator gave it against the rules, and return whether they agree.
+    def check(self, state: GameState, move: PlaceTilesMove, points: int) -> bool:
+        self.num_checked += 1
+        untrusted_move = PlaceTilesMove(position_to_placing=move.position_to_placing)
+        if untrusted_move.is_valid(state=state):
+            if move.get_points(board=state.board, config=state.config) == points:
+                return True
+        self.num_mismatches += 1
+        if len(self.mismatches) < self.MAX_MISMATCHES_KEPT:
+            self.mismatches.append((move, points))
+        return False
+
+    def reset(self) -> None:
+        self.num_checked = 0
+        self.num_mismatches = 0
+        self.mismatches.clear()
+
+
+# Return the self-check used by every GaddagMoveFinder in this process.
+# Turn it on with set_self_check_rate.
+def get_self_check(_cache=list[GeneratorSelfCheck]()) -> GeneratorSelfCheck:
+    if not _cache:
+        _cache.append(GeneratorSelfCheck())
+    return _cache[0]
+
+
+# Set the fraction of the moves found that are checked against the rules (0 to turn checking off).
+def set_self_check_rate(rate: float, seed: int | None = None) -> None:
+    self_check = get_self_check()
+    self_check.rate = rate
+    self_check.random.seed(seed)
+
+
+# Yield the given moves, checking the sampled ones against the rules.
+def _iter_self_checked(
+    state: GameState, moves: Iterable[tuple[CompactMove, int]], self_check: GeneratorSelfCheck
+) -> Iterator[tuple[CompactMove, int]]:
+    for move, points in moves:
+        if self_check.should_check():
+            self_check.check(
+                state=state, move=move.to_place_tiles_move(board=state.board), points=points
+            )
+        yield move, points
+
+
+# Finds place-tiles moves by walking the GADDAG of the playable words from the anchor squares.
+# Each move is found exactly once, from the leftmost (or topmost) anchor it covers.
+# Moves that place a single tile are only found horizontally.
+# If a move cache is given, the moves for each board and rack are only searched for once.
+class GaddagMoveFinder:
+    def __init__(self, words: Collection[WORD], move_cache: MoveCache | None = None) -> None:
+        self.words = frozenset(words)
+        # Kept between calls, so only the lines of the board that changed are recomputed.
+        self.playable_letter_info: PlayableLetterInfo | None = None
+        self.move_cache = move_cache
+
+    def get_all_place_tiles_moves(self, state: GameState) -> set[PlaceTilesMove]:
+        return set(self.iter_place_tiles_moves(state=state))
+
+    # Return all place-tiles moves, with the number of points each one scores (including the bingo bonus).
+    # These are the points PlaceTilesMove.get_points would give, without copying the state to find them.
+    def get_all_place_tiles_moves_with_points(
+        self, state: GameState
+    ) -> dict[PlaceTilesMove, int]:
+        return dict(self.iter_place_tiles_moves_with_points(state=state))
+
+    # Yield the place-tiles moves one at a time, as they're found, so the caller can stop early.
+    # Every move is found exactly once, so nothing has to be remembered to skip duplicates.
+    # The state mustn't change until the caller is done with the moves.
+    def iter_place_tiles_moves(self, state: GameState) -> Iterator[PlaceTilesMove]:
+        for move, _ in self.iter_place_tiles_moves_with_points(state=state):
+            yield move
+
+    # Yield the place-tiles moves and their points one at a time, as they're found.
+    def iter_place_tiles_moves_with_points(
+        self, state: GameState
+    ) -> Iterator[tuple[PlaceTilesMove, int]]:
+        board = state.board
+        for move, points in self.iter_compact_moves_with_points(state=state):
+            yield move.to_place_tiles_move(board=board), points
+
+    # Yield the moves and their points as compact moves, which are much cheaper to make.
+    # Callers that look at lots of moves but only play one should use these,
+    # and only turn the one they play into a PlaceTilesMove.
+    def iter_compact_moves_with_points(
+        self, state: GameState
+    ) -> Iterator[tuple[CompactMove, int]]:
+        if self.move_cache is None:
+            moves = self._search_counted(state=state)
+        else:
+            moves = self._iter_and_cache(state=state)
+        self_check = get_self_check()
+        if self_check.rate > 0:
+            return _iter_self_checked(state=state, moves=moves, self_check=self_check)
+        return moves
+
+    # Yield the moves from the cache, or search for them and cache them if the caller takes all of them.
+    def _iter_and_cache(self, state: GameState) -> Iterator[tuple[CompactMove, int]]:
+        key = get_move_cache_key(state)
+        moves = self.move_cache.get(key)  # type: ignore
+        if moves is not None:
+            yield from moves
+            return
+        found = list[tuple[CompactMove, int]]()
+        for move in self._search_counted(state=state):
+            found.append(move)
+            yield move
+        self.move_cache.put(key, found)  # type: ignore
+
+    # Return the k best place-tiles moves with their points, best first.
+    # Moves are compared by key(points, number of tiles placed), which is just the points by default.
+    # The key must never go down when the points or the number of tiles go up:
+    # that's what lets the search skip the branches that can't beat the k-th best move found so far.
+    def best_moves(
+        self, state: GameState, k: int = 1, key: MoveKey = get_points_key
+    ) -> list[tuple[PlaceTilesMove, int]]:
+        best = _BestMoves(k=k, key=key)
+        if k <= 0:
+            return []
+        if self.move_cache is not None:
+            # All of the moves are found (or taken from the cache), so that they can be cached.
+            # They're in the order the search finds them, so ties are broken the same way.
+            for move, points in self.iter_compact_moves_with_points(state=state):
+                value = key(points, move.num_tiles)
+                if best.could_add(value):
+                    best.add(value=value, move=move, points=points)
+        else:
+            # The moves are kept in the heap instead of being yielded.
+            for _ in self._search(state=state, best=best):
+                pass
+            profiling.add_count(profiling.MOVES_GENERATED, best.num_offered)
+            self_check = get_self_check()
+            if self_check.rate > 0:
+                for _ in _iter_self_checked(
+                    state=state, moves=best.get_moves(), self_check=self_check
+                ):
+                    pass
+
+        # Only the best moves are made into PlaceTilesMoves.
+        return [
+            (move.to_place_tiles_move(board=state.board), points)
+            for move, points in best.get_moves()
+        ]
+
+    # Search for the moves, counting them if the work done is being counted (see profiling.py).
+    def _search_counted(self, state: GameState) -> Iterator[tuple[CompactMove, int]]:
+        moves = self._search(state=state)
+        if profiling.is_counting():
+            return profiling.iter_counted(profiling.MOVES_GENERATED, moves)
+        return moves
+
+    # Search for the moves from every anchor, yielding them or keeping the best of them.
+    def _search(
+        self, state: GameState, best: _BestMoves | None = None
+    ) -> Iterator[tuple[CompactMove, int]]:
+        board = state.board
+        playable_letter_info = get_playable_letter_info(
+            state=state, previous=self.playable_letter_info
+        )
+        self.playable_letter_info = playable_letter_info
+        anchors = get_anchor_positions(board)
+
+        # The first move is looked up in the anagram index instead.
+        if board.num_tiles == 0 and board.starting_position is not None:
+            for move, points in iter_opening_moves(state=state, pos=board.starting_position):
+                if best is None:
+                    yield move, points
+                    continue
+                value = best.key(points, move.num_tiles)
+                if best.offer(value):
+                    best.add(value=value, move=move, points=points)
+            return
+
+        # Moves on an empty board have to make a word by themselves.
+        ignore_one_tile_moves = board.num_tiles == 0
+
+        player_state = state.player_to_state[state.current_player]
+        tile_to_count = dict(get_tile_to_count(tiles=player_state.tiles))
+
+        # For bounding the best moves, get the points of the tiles in the rack, most valuable first.
+        # Blank tiles are worth nothing when they're placed.
+        top_tile_points = sorted(
+            [0 if isinstance(tile, BlankTile) else tile.points for tile in player_state.tiles],
+            reverse=True,
+        )
+
+        # Lay out what the searches look up for each square like the board's arrays.
+        is_anchor = bytearray(board.width * board.height)
+        for x, y in anchors:
+            is_anchor[y * board.width + x] = 1
+        positions = [(x, y) for y in range(board.height) for x in range(board.width)]
+        directions = list[tuple[Direction, list[int], list[int | None], int, _RunBounds | None]]()
+        for direction, pos_to_ok_mask, pos_to_cross_points, min_tiles_placed in (
+            (
+                Direction.HORIZONTAL,
+                playable_letter_info.pos_to_horizontal_mask,
+                playable_letter_info.pos_to_horizontal_cross_points,
+                2 if ignore_one_tile_moves else 1,
+            ),
+            (
+                Direction.VERTICAL,
+                playable_letter_info.pos_to_vertical_mask,
+                playable_letter_info.pos_to_vertical_cross_points,
+                2,
+            ),
+        ):
+            ok_masks = [pos_to_ok_mask.get(pos, NO_LETTERS) for pos in positions]
+            cross_points = [pos_to_cross_points.get(pos) for pos in positions]
+            run_bounds = None
+            if best is not None:
+                run_bounds = _RunBounds(
+                    board=board,
+                    direction=direction,
+                    cross_points=cross_points,
+                    top_tile_points=top_tile_points,
+                )
+            directions.append((direction, ok_masks, cross_points, min_tiles_placed, run_bounds))
+
+        for anchor in anchors:
+            for direction, ok_masks, cross_points, min_tiles_placed, run_bounds in directions:
+                search = _GaddagSearch(
+                    board=board,
+                    gaddag=state.config.gaddag,
+                    tile_to_count=tile_to_count,
+                    is_anchor=is_anchor,
+                    ok_masks=ok_masks,
+                    cross_points=cross_points,
+                    anchor=anchor,
+                    direction=direction,
+                    min_tiles_placed=min_tiles_placed,
+                    config=state.config,
+                    best=best,
+                    run_bounds=run_bounds,
+                )
+                yield from search.gen(offset=0, node=ROOT)
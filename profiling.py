@@ -0,0 +1,225 @@
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Iterator, TypeVar
+import time
+
+# Opt-in profiling of games (see game_runner.run_game): how long each phase of each turn takes,
+# and how much work is done in it, aggregated by strategy.
+#
+# The work is counted where it's done, with add_count. Nothing is counted unless a profile is counting,
+# so it only costs a check otherwise.
+
+# The phases of a turn.
+# The strategy choosing its move.
+STRATEGY = "strategy"
+# Checking that the move is valid.
+IS_VALID = "is_valid"
+# Performing the move.
+PERFORM = "perform"
+# Copying the state for the strategies and the caller.
+COPY = "copy"
+# Telling the strategies about the new state.
+NOTIFY = "notify"
+PHASES = (STRATEGY, IS_VALID, PERFORM, COPY, NOTIFY)
+
+# The counters.
+# The place-tiles moves the move finders found, including the ones the best-move searches found and didn't keep.
+# The moves in the branches those searches skip aren't found, so they aren't counted.
+MOVES_GENERATED = "moves_generated"
+# The moves checked with is_valid.
+MOVES_VALIDATED = "moves_validated"
+STATES_COPIED = "states_copied"
+# Lookups in move caches.
+CACHE_HITS = "cache_hits"
+CACHE_MISSES = "cache_misses"
+COUNTERS = (MOVES_GENERATED, MOVES_VALIDATED, STATES_COPIED, CACHE_HITS, CACHE_MISSES)
+
+T = TypeVar("T")
+
+# The counters being added to. Only the innermost ones are added to.
+_active_counters = list[dict[str, int]]()
+
+
+# Return whether the work done is being counted.
+def is_counting() -> bool:
+    return bool(_active_counters)
+
+
+# Add the given amount to the given counter, if the work done is being counted.
+def add_count(name: str, amount: int = 1) -> None:
+    if _active_counters:
+        counters = _active_counters[-1]
+        counters[name] = counters.get(name, 0) + amount
+
+
+# Yield the given items, and add how many were taken to the given counter when done.
+def iter_counted(name: str, items: Iterable[T]) -> Iterator[T]:
+    count = 0
+    try:
+        for item in items:
+            count += 1
+            yield item
+    finally:
+        add_count(name, count)
+
+
+# Count the work done inside this context in the given counters.
+@contextmanager
+def counting(counters: dict[str, int]) -> Iterator[dict[str, int]]:
+    _active_counters.append(counters)
+    try:
+        yield counters
+    finally:
+        _active_counters.pop()
+
+
+# Add the counts in the second counters to the first.
+def add_counters(counters: dict[str, int], other: dict[str, int]) -> None:
+    for name, count in other.items():
+        counters[name] = counters.get(name, 0) + count
+
+
+# The time spent in each phase of a turn, and the work done in it.
+# The notify phase includes the time spent notifying every strategy.
+@dataclass
+class TurnProfile:
+    game: int
+    turn: int
+    strategy: str
+    phase_to_seconds: dict[str, float] = field(default_factory=dict)
+    counters: dict[str, int] = field(default_factory=dict)
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "game": self.game,
+            "turn": self.turn,
+            "strategy": self.strategy,
+            "phase_to_seconds": dict(self.phase_to_seconds),
+            "counters": dict(self.counters),
+        }
+
+
+# The time a strategy's phases took over all of its turns, and the work done in them.
+# Notifying a strategy counts towards that strategy, whoever's turn it is.
+@dataclass
+class StrategyProfile:
+    num_turns: int = 0
+    phase_to_seconds: dict[str, float] = field(default_factory=dict)
+    # The longest any one run of each phase took.
+    phase_to_max_seconds: dict[str, float] = field(default_factory=dict)
+    counters: dict[str, int] = field(default_factory=dict)
+
+    def add_phase(self, phase: str, seconds: float, counters: dict[str, int]) -> None:
+        self.phase_to_seconds[phase] = self.phase_to_seconds.get(phase, 0.0) + seconds
+        self.phase_to_max_seconds[phase] = max(self.phase_to_max_seconds.get(phase, 0.0), seconds)
+        add_counters(self.counters, counters)
+
+    # Add the other profile to this one.
+    def add(self, other: "StrategyProfile") -> None:
+        self.num_turns += other.num_turns
+        for phase, seconds in other.phase_to_seconds.items():
+            self.phase_to_seconds[phase] = self.phase_to_seconds.get(phase, 0.0) + seconds
+        for phase, seconds in other.phase_to_max_seconds.items():
+            self.phase_to_max_seconds[phase] = max(self.phase_to_max_seconds.get(phase, 0.0), seconds)
+        add_counters(self.counters, other.counters)
+
+    def get_total_seconds(self) -> float:
+        return sum(self.phase_to_seconds.values())
+
+    def to_json(self) -> dict[str, Any]:
+        total_seconds = self.get_total_seconds()
+        phases = dict[str, Any]()
+        for phase in PHASES:
+            if phase not in self.phase_to_seconds:
+                continue
+            seconds = self.phase_to_seconds[phase]
+            phases[phase] = {
+                "seconds": seconds,
+                "seconds_per_turn": seconds / self.num_turns if self.num_turns else 0.0,
+                "max_seconds": self.phase_to_max_seconds[phase],
+                "fraction": seconds / total_seconds if total_seconds else 0.0,
+            }
+        return {
+            "num_turns": self.num_turns,
+            "seconds": total_seconds,
+            "phases": phases,
+            "counters": {name: self.counters.get(name, 0) for name in COUNTERS},
+        }
+
+
+# A profile of one or more games, filled in by game_runner.run_game.
+# The turns are only kept if keep_turns is True. Otherwise only the totals for each strategy are.
+class GameProfile:
+    def __init__(self, keep_turns: bool = True) -> None:
+        self.keep_turns = keep_turns
+        self.num_games = 0
+        self.turns = list[TurnProfile]()
+        self.strategy_to_profile = dict[str, StrategyProfile]()
+        self._turn: TurnProfile | None = None
+        self._num_game_turns = 0
+
+    def get_strategy_profile(self, strategy: str) -> StrategyProfile:
+        result = self.strategy_to_profile.get(strategy)
+        if result is None:
+            result = self.strategy_to_profile[strategy] = StrategyProfile()
+        return result
+
+    def start_game(self) -> None:
+        self.num_games += 1
+        self._turn = None
+        self._num_game_turns = 0
+
+    # Start the turn of the given strategy. The phases until the next turn count towards this one.
+    def start_turn(self, strategy: str) -> None:
+        self._turn = TurnProfile(game=self.num_games - 1, turn=self._num_game_turns, strategy=strategy)
+        self._num_game_turns += 1
+        if self.keep_turns:
+            self.turns.append(self._turn)
+        self.get_strategy_profile(strategy).num_turns += 1
+
+    # Time the phase done inside this context and count the work done in it, for the given strategy.
+    @contextmanager
+    def phase(self, phase: str, strategy: str) -> Iterator[None]:
+        counters = dict[str, int]()
+        before = time.perf_counter()
+        try:
+            with counting(counters):
+                yield
+        finally:
+            seconds = time.perf_counter() - before
+            self.get_strategy_profile(strategy).add_phase(
+                phase=phase, seconds=seconds, counters=counters
+            )
+            turn = self._turn
+            if turn is not None:
+                turn.phase_to_seconds[phase] = turn.phase_to_seconds.get(phase, 0.0) + seconds
+                add_counters(turn.counters, counters)
+
+    # Add the other profile (of other games) to this one.
+    def add(self, other: "GameProfile") -> None:
+        if self.keep_turns:
+            for turn in other.turns:
+                self.turns.append(
+                    TurnProfile(
+                        game=self.num_games + turn.game,
+                        turn=turn.turn,
+                        strategy=turn.strategy,
+                        phase_to_seconds=dict(turn.phase_to_seconds),
+                        counters=dict(turn.counters),
+                    )
+                )
+        self.num_games += other.num_games
+        for strategy, profile in other.strategy_to_profile.items():
+            self.get_strategy_profile(strategy).add(profile)
+
+    # Return the profile as JSON-compatible data: the totals for each strategy, and the turns if they're kept.
+    def to_json(self) -> dict[str, Any]:
+        result: dict[str, Any] = {
+            "num_games": self.num_games,
+            "strategies": {
+                strategy: profile.to_json() for strategy, profile in self.strategy_to_profile.items()
+            },
+        }
+        if self.keep_turns:
+            result["turns"] = [turn.to_json() for turn in self.turns]
+        return result
@@ -1,11 +1,12 @@
 from dataclasses import dataclass
 from abc import ABC, abstractmethod
-from random import shuffle
 
 # import game_state
 from constants import *
 from game_state import *
 from game_state import BoardPosition, GameState
+import profiling
+import zobrist
 
 
 @dataclass
@@ -46,6 +47,29 @@ class BlankTilePlacing:
 TilePlacing = LetterTilePlacing | BlankTilePlacing
 
 
+# What's needed to undo a move that was made with Move.apply.
+@dataclass
+class MoveUndo:
+    # The player who made the move.
+    current_player: Player
+    num_scoreless_turns: int
+    game_finished: bool
+    # Every player's score before the move, in the order of player_to_state.
+    # (The end of the game can change all of them.)
+    scores: list[int]
+    # The tiles taken out of the player's rack, and the indices they were taken from, in order.
+    rack_tiles: list[Tile]
+    rack_indices: list[int]
+    # The indices in the bag the player drew tiles from, in order.
+    bag_indices: list[int]
+    # The number of tiles put into the bag after drawing.
+    num_tiles_to_bag: int = 0
+    # The positions of the tiles placed on the board.
+    positions: Iterable[BoardPosition] = ()
+    # The state's hash of the racks and the bag.
+    tiles_hash: int | None = None
+
+
 # Any Scrabble move.
 class Move(ABC):
     # Return whether this move is valid in the given state.
@@ -54,10 +78,86 @@ class Move(ABC):
         ...
 
     # Perform this move by changing the given state.
-    @abstractmethod
     def perform(self, state: GameState) -> None:
+        self.apply(state=state)
+
+    # Perform this move by changing the given state, and return what's needed to undo it.
+    # Nothing else is copied, so search can go forwards and backwards through one state.
+    @abstractmethod
+    def apply(self, state: GameState) -> MoveUndo:
         ...
 
+    # Undo this move, given what apply returned when it was made.
+    # It must be the last move applied to the state that hasn't been undone.
+    def unapply(self, state: GameState, undo: MoveUndo) -> None:
+        player_state = state.player_to_state[undo.current_player]
+
+        for position in undo.positions:
+            state.board.set_tile_at(position, None)
+
+        # Take back the tiles put into the bag, then put the drawn tiles back where they came from.
+        bag_tiles = state.bag.tiles
+        for _ in range(undo.num_tiles_to_bag):
+            bag_tiles.pop()
+        undraw_tiles_for_player(player=player_state, bag=state.bag, indices=undo.bag_indices)
+
+        # Put the tiles taken from the rack back where they were.
+        for i in range(len(undo.rack_tiles) - 1, -1, -1):
+            player_state.tiles.insert(undo.rack_indices[i], undo.rack_tiles[i])
+
+        for other_player_state, score in zip(state.player_to_state.values(), undo.scores):
+            other_player_state.score = score
+        state.current_player = undo.current_player
+        state.num_scoreless_turns = undo.num_scoreless_turns
+        state.game_finished = undo.game_finished
+        state.tiles_hash = undo.tiles_hash
+
+
+# Return the start of the undo record for a move about to be made in the given state.
+def _get_move_undo(state: GameState) -> MoveUndo:
+    return MoveUndo(
+        current_player=state.current_player,
+        num_scoreless_turns=state.num_scoreless_turns,
+        game_finished=state.game_finished,
+        scores=[player_state.score for player_state in state.player_to_state.values()],
+        rack_tiles=list[Tile](),
+        rack_indices=list[int](),
+        bag_indices=list[int](),
+        tiles_hash=state.tiles_hash,
+    )
+
+
+# Bring the state's hash of the racks and the bag up to date after a move, from its undo record.
+# The tiles taken from the rack went onto the board, apart from the given tiles, which went into the bag.
+def _update_tiles_hash(state: GameState, undo: MoveUndo, tiles_to_bag: Iterable[Tile] = ()) -> None:
+    if state.tiles_hash is None:
+        return
+    holder = zobrist.get_player_holder(undo.current_player.position)
+    tiles_hash = state.tiles_hash
+    for tile in undo.rack_tiles:
+        tiles_hash -= zobrist.get_tile_key(holder, tile)
+    for tile in tiles_to_bag:
+        tiles_hash += zobrist.get_tile_key(zobrist.BAG, tile)
+
+    # The drawn tiles are at the end of the rack.
+    player_state = state.player_to_state[undo.current_player]
+    num_drawn = len(undo.bag_indices)
+    for tile in player_state.tiles[len(player_state.tiles) - num_drawn :]:
+        tiles_hash += zobrist.get_tile_key(holder, tile) - zobrist.get_tile_key(zobrist.BAG, tile)
+    state.tiles_hash = tiles_hash & zobrist.HASH_MASK
+
+
+# Take the given tile out of the given player's rack, and record where it was.
+# Return whether it was there.
+def _remove_tile_from_rack(player: PlayerState, tile: Tile, undo: MoveUndo) -> bool:
+    try:
+        index = player.tiles.index(tile)
+    except ValueError:
+        return False
+    undo.rack_tiles.append(player.tiles.pop(index))
+    undo.rack_indices.append(index)
+    return True
+
 
 # For each player, deduct the points of the tiles he still has in his rack from his score.
 # If requested, also add the points of all other player's tiles to the current player's score.
@@ -82,110 +182,158 @@ def deduct_final_tile_points(state: GameState, add_to_current_player: bool) -> N
         ].score += total_other_player_tile_points
 
 
+# Return the points the current player would get for going out by placing the given number of tiles:
+# if that empties both the bag and the player's rack, the game ends and the player gets the points
+# of the tiles in the other players' racks.
+def get_going_out_points(state: GameState, num_tiles_placed: int) -> int:
+    player_state = state.player_to_state[state.current_player]
+    if len(state.bag) > 0 or num_tiles_placed < len(player_state.tiles):
+        return 0
+
+    points = 0
+    for other_player, other_player_state in state.player_to_state.items():
+        if other_player == state.current_player:
+            continue
+        for tile in other_player_state.tiles:
+            points += tile.points
+    return points
+
+
 # Have the given player draw the given number of tiles.
 def draw_tiles_for_player(player: PlayerState, bag: Bag, num_tiles: int) -> None:
-    shuffle(bag.tiles)
-    num_tiles = min(num_tiles, len(bag.tiles))
-    drawn_tiles, remaining_tiles = bag.tiles[:num_tiles], bag.tiles[num_tiles:]
-    player.tiles.extend(drawn_tiles)
-    bag.tiles = remaining_tiles
-    shuffle(bag.tiles)
+    player.tiles.extend(bag.draw(num_tiles))
+
+
+# Have the given player draw the given number of tiles from random places in the bag,
+# and return the places so that undraw_tiles_for_player can put them back exactly.
+def draw_tiles_reversibly(player: PlayerState, bag: Bag, num_tiles: int) -> list[int]:
+    indices = list[int]()
+    for _ in range(min(num_tiles, len(bag))):
+        tile, i = bag.draw_one()
+        player.tiles.append(tile)
+        indices.append(i)
+    return indices
+
+
+# Undo draw_tiles_reversibly, given the places it returned.
+def undraw_tiles_for_player(player: PlayerState, bag: Bag, indices: Sequence[int]) -> None:
+    for i in reversed(indices):
+        bag.put_back(player.tiles.pop(), i)
 
 
 # Draw the given number of tiles from the bag and return them.
 def draw_tiles(bag: Bag, num_tiles: int) -> list[Tile]:
-    shuffle(bag.tiles)
-    num_tiles = min(num_tiles, len(bag.tiles))
-    drawn_tiles, remaining_tiles = bag.tiles[:num_tiles], bag.tiles[num_tiles:]
-    bag.tiles = remaining_tiles
-    shuffle(bag.tiles)  # TODO maybe remove this.
-    return drawn_tiles
+    return bag.draw(num_tiles)
+
+
+# Return the word going in the given direction through the given position, if any,
+# by going from square to square. This also finds words with tiles outside the board.
+def _get_word_at_by_walking(
+    board: Board, pos: BoardPosition, dx: int, dy: int
+) -> WordOnBoard | None:
+    if board.get_letter_at(pos) is None:
+        return None
+
+    # Get the start of the word.
+    x, y = pos
+    while board.get_letter_at((x - dx, y - dy)) is not None:
+        x -= dx
+        y -= dy
+
+    pos_to_tile = dict[BoardPosition, Tile]()
+    while board.get_letter_at((x, y)) is not None:
+        pos_to_tile[x, y] = board.get_tile_at((x, y))  # type: ignore
+        x += dx
+        y += dy
+
+    # Don't count one-letter words.
+    if len(pos_to_tile) == 1:
+        return None
+    return WordOnBoard(position_to_tile=pos_to_tile)
 
 
 # Return the horizontal word at the given position, if any.
 def get_horizontal_word_at(board: Board, pos: BoardPosition) -> WordOnBoard | None:
-    center = board.get_letter_at(pos)
-    if center is None:
+    if board.outside_tiles:
+        return _get_word_at_by_walking(board=board, pos=pos, dx=1, dy=0)
+    index = board.get_index(pos)
+    if index < 0 or board.letters[index] == NO_LETTER_CODE:
         return None
 
-    # Get the start of the word.
+    # Find the ends of the word in its row.
     x, y = pos
-    start_x = x
-    while True:
-        start_x -= 1
-        if board.get_letter_at((start_x, y)) is None:
-            start_x += 1
-            break
-
-    # Get the end of the word.
-    end_x = x
-    while True:
-        end_x += 1
-        if board.get_letter_at((end_x, y)) is None:
-            end_x -= 1
-            break
+    row = board.get_row_letters(y)
+    start_x = row.rfind(NO_LETTER_CODE, 0, x) + 1
+    end_x = row.find(NO_LETTER_CODE, x + 1)
+    if end_x < 0:
+        end_x = board.width
 
     # Don't count one-letter words.
-    if start_x == end_x:
+    if end_x - start_x == 1:
         return None
 
+    row_start = y * board.width
     pos_to_tile = dict[BoardPosition, Tile]()
-    for x in range(start_x, end_x + 1):
-        letter_pos = x, y
-        tile = board.get_tile_at(letter_pos)
-        if tile is None:
-            return None  # Shouldn't happen
-        pos_to_tile[letter_pos] = tile
+    for x in range(start_x, end_x):
+        pos_to_tile[x, y] = board.tiles[row_start + x]  # type: ignore
     return WordOnBoard(position_to_tile=pos_to_tile)
 
 
 # Return the vertical word at the given position, if any.
 def get_vertical_word_at(board: Board, pos: BoardPosition) -> WordOnBoard | None:
-    center = board.get_letter_at(pos)
-    if center is None:
+    if board.outside_tiles:
+        return _get_word_at_by_walking(board=board, pos=pos, dx=0, dy=1)
+    index = board.get_index(pos)
+    if index < 0 or board.letters[index] == NO_LETTER_CODE:
         return None
 
-    # Get the start of the word.
+    # Find the ends of the word in its column.
     x, y = pos
-    start_y = y
-    while True:
-        start_y -= 1
-        if board.get_letter_at((x, start_y)) is None:
-            start_y += 1
-            break
-
-    # Get the end of the word.
-    end_y = y
-    while True:
-        end_y += 1
-        if board.get_letter_at((x, end_y)) is None:
-            end_y -= 1
-            break
+    column = board.get_column_letters(x)
+    start_y = column.rfind(NO_LETTER_CODE, 0, y) + 1
+    end_y = column.find(NO_LETTER_CODE, y + 1)
+    if end_y < 0:
+        end_y = board.height
 
     # Don't count one-letter words.
-    if start_y == end_y:
+    if end_y - start_y == 1:
         return None
 
     pos_to_tile = dict[BoardPosition, Tile]()
-    for y in range(start_y, end_y + 1):
-        letter_pos = x, y
-        tile = board.get_tile_at(letter_pos)
-        if tile is None:
-            return None  # Shouldn't happen
-        pos_to_tile[letter_pos] = tile
+    for y in range(start_y, end_y):
+        pos_to_tile[x, y] = board.tiles[y * board.width + x]  # type: ignore
     return WordOnBoard(position_to_tile=pos_to_tile)
 
 
+# Return what a generated move is trusted for: the layout of the board and the Zobrist hash of its tiles.
+# A move found for a board with different tiles (an older state, or another game) isn't trusted on this one.
+def get_board_trust_key(board: Board) -> tuple[int, int, BoardPosition | None, int]:
+    return (board.width, board.height, board.starting_position, board.zobrist_hash)
+
+
 # A move where a single word is placed.
 @dataclass
 class PlaceTilesMove(Move):
     position_to_placing: Mapping[BoardPosition, TilePlacing]
 
     def __init__(
-        self, position_to_placing: Mapping[BoardPosition, TilePlacing]
+        self,
+        position_to_placing: Mapping[BoardPosition, TilePlacing],
+        trusted_board: Board | None = None,
     ) -> None:
         self.position_to_placing = frozendict(position_to_placing)
         self._hash: int | None = None
+        # If this move came from the move generator, the key of the board it was found for (see get_board_trust_key).
+        # On that board, it's known to be in a line, connected to the other tiles, and to make only playable words,
+        # so is_valid doesn't check again. On any other board, it's checked like any other move.
+        # It isn't part of the move's equality.
+        self.trusted_board_key = (
+            None if trusted_board is None else get_board_trust_key(trusted_board)
+        )
+
+    # Return whether this move is trusted on the given board.
+    def is_trusted_on(self, board: Board) -> bool:
+        return self.trusted_board_key is not None and self.trusted_board_key == get_board_trust_key(board)
 
     def __hash__(self) -> int:
         if self._hash is None:
@@ -201,7 +349,7 @@ class PlaceTilesMove(Move):
                 tile = BlankTile(letter=placing.letter)
             else:
                 tile = placing.tile
-            board.position_to_tile[position] = tile
+            board.set_tile_at(position, tile)
         
         result = list[WordOnBoard]()
         is_vertical = False
@@ -314,6 +462,7 @@ class PlaceTilesMove(Move):
         )
 
     def is_valid(self, state: GameState) -> bool:
+        profiling.add_count(profiling.MOVES_VALIDATED)
         # You can't do any moves if the game if over.
         if state.game_finished:
             return False
@@ -322,98 +471,101 @@ class PlaceTilesMove(Move):
         if len(self.position_to_placing) == 0:
             return False
 
-        # Reordering this to make move generation faster. (bad idea?)
-        # At least one tile in the move must be adjacent to a tile already on the board,
-        # unless there are no tiles already on the board, in which case the move
-        # must place at least one tile on the designated starting position.
-        if len(state.board.position_to_tile) == 0:
-            if state.board.starting_position is not None:
-                on_starting_position = False
-                for position in self.position_to_placing:
-                    if position == state.board.starting_position:
-                        on_starting_position = True
-                        break
-                if not on_starting_position:
-                    return False
-        else:
-            adj_to_board = get_adjacent_positions(
-                positions=state.board.position_to_tile
-            )
-            one_adj_to_board = False
-            for position in self.position_to_placing:
-                if position in adj_to_board:
-                    one_adj_to_board = True
-                    break
-            if not one_adj_to_board:
-                return False
-
-        # Reordering this as well. (bad idea?)
-        # All words made by this placement must be in the dictionary.
-        new_words = self.get_words_made(board=state.board)
-        # new_word_vals = [w.get_word() for w in new_words]
-        new_word_vals = [w.word for w in new_words]
-        for word in new_word_vals:
-            if not word in state.config.playable_words:
+        # The tiles must go on empty squares of the board.
+        board = state.board
+        for position in self.position_to_placing:
+            index = board.get_index(position)
+            if index < 0 or board.tiles[index] is not None:
                 return False
 
-        player_state = state.player_to_state[state.current_player]
-
         # Check if the player has all of the tiles to be played.
+        player_state = state.player_to_state[state.current_player]
         move_tiles = [placing.tile for placing in self.position_to_placing.values()]
         if not all_tiles_available(
             available_tiles=player_state.tiles, requested_tiles=move_tiles
         ):
             return False
 
-        # If the move places a tile outside the board, it isn't valid.
-        for position in self.position_to_placing:
-            if not state.board.contains_position(position):
-                return False
+        if self.is_trusted_on(board):
+            return True
+        return self._is_valid_placement(board=board, config=state.config)
 
-        # If the move places a tile onto a tile already on the board, it isn't valid.
-        for position in self.position_to_placing:
-            if state.board.get_tile_at(position) is not None:
+    # Return whether the tiles of this move are in a line with no gaps, connect to the tiles already on the board
+    # (or cover the starting position, if there are none), and make only playable words, of which there's at least one.
+    # The tiles must go on empty squares of the board.
+    # Only the lines through the placed tiles are looked at, so the board isn't copied.
+    def _is_valid_placement(self, board: Board, config: GameConfig) -> bool:
+        # The move must be in a line, either from left to right or from top to bottom.
+        # A single tile counts as both, and its words in both directions are checked either way.
+        position_to_letter = dict[BoardPosition, LETTER]()
+        for position, placing in self.position_to_placing.items():
+            if placing.letter is None:
                 return False
+            position_to_letter[position] = placing.letter
+        positions = list(position_to_letter)
+        x, y = positions[0]
+        if all([p_y == y for _, p_y in positions]):
+            main_line = board.get_row_letters(y)
+            main_coords = [p_x for p_x, _ in positions]
+            # Each tile's cross-word is in its column, at its y.
+            cross_lines = [(board.get_column_letters(p_x), y) for p_x, _ in positions]
+        elif all([p_x == x for p_x, _ in positions]):
+            main_line = board.get_column_letters(x)
+            main_coords = [p_y for _, p_y in positions]
+            # Each tile's cross-word is in its row, at its x.
+            cross_lines = [(board.get_row_letters(p_y), x) for _, p_y in positions]
+        else:
+            return False
 
-        # The move must be in a line, either from left to right or from top to bottom.
-        if not self._is_any_linear_placement(board=state.board):
+        # Put the letters into their line, which must have no gaps between them.
+        for coord, letter in zip(main_coords, position_to_letter.values()):
+            main_line[coord] = ord(letter)
+        first, last = min(main_coords), max(main_coords)
+        if main_line.find(NO_LETTER_CODE, first, last + 1) >= 0:
             return False
 
-        # # At least one tile in the move must be adjacent to a tile already on the board,
-        # # unless there are no tiles already on the board, in which case the move
-        # # must place at least one tile on the designated starting position.
-        # if len(state.board.position_to_tile) == 0:
-        #     if state.board.starting_position is not None:
-        #         on_starting_position = False
-        #         for position in self.position_to_placing:
-        #             if position == state.board.starting_position:
-        #                 on_starting_position = True
-        #                 break
-        #         if not on_starting_position:
-        #             return False
-        # else:
-        #     adj_to_board = get_adjacent_positions(
-        #         positions=state.board.position_to_tile
-        #     )
-        #     one_adj_to_board = False
-        #     for position in self.position_to_placing:
-        #         if position in adj_to_board:
-        #             one_adj_to_board = True
-        #             break
-        #     if not one_adj_to_board:
-        #         return False
-
-        # # All words made by this placement must be in the dictionary.
-        # new_words = self.get_words_made(board=state.board)
-        # new_word_vals = [w.get_word() for w in new_words]
-        # for word in new_word_vals:
-        #     if not word in state.config.playable_words:
-        #         return False
-
-        # The move must make at least one new word.
-        if len(new_words) == 0:
+        # Get the main word, which goes on through the letters on either side.
+        start = main_line.rfind(NO_LETTER_CODE, 0, first) + 1
+        end = main_line.find(NO_LETTER_CODE, last + 1)
+        if end < 0:
+            end = len(main_line)
+        words = list[str]()
+        if end - start > 1:
+            words.append(main_line[start:end].decode("ascii"))
+
+        # Get the cross-word made by each tile.
+        num_cross_words = 0
+        for (cross_line, i), letter in zip(cross_lines, position_to_letter.values()):
+            cross_start = cross_line.rfind(NO_LETTER_CODE, 0, i) + 1
+            cross_end = cross_line.find(NO_LETTER_CODE, i + 1)
+            if cross_end < 0:
+                cross_end = len(cross_line)
+            if cross_end - cross_start > 1:
+                words.append(
+                    cross_line[cross_start:i].decode("ascii")
+                    + letter
+                    + cross_line[i + 1 : cross_end].decode("ascii")
+                )
+                num_cross_words += 1
+
+        # At least one tile in the move must be next to a tile already on the board,
+        # which is when the main word has letters already on the board or there's a cross-word.
+        # If there are no tiles on the board, the move must cover the starting position instead.
+        if board.num_tiles == 0:
+            if (
+                board.starting_position is not None
+                and board.starting_position not in position_to_letter
+            ):
+                return False
+        elif end - start == len(positions) and num_cross_words == 0:
             return False
 
+        # The move must make at least one word, and all of them must be playable.
+        if len(words) == 0:
+            return False
+        for word in words:
+            if word not in config.playable_words:
+                return False
         return True
 
     # Return the number of points scored in a particular word in this move.
@@ -443,19 +595,27 @@ class PlaceTilesMove(Move):
         word_points *= word_multiplier
         return word_points
 
-    def perform(self, state: GameState) -> None:
+    # Return the number of points this move scores on the given board, including the bingo bonus.
+    # This doesn't include the points for going out at the end of the game.
+    def get_points(self, board: Board, config: GameConfig) -> int:
         # Get all of the new words.
-        new_words = self.get_words_made(board=state.board)
+        new_words = self.get_words_made(board=board)
 
         # Determine the number of points scored with words.
         word_points = 0
         for word in new_words:
-            word_points += self.get_points_for_word(board=state.board, word=word)
+            word_points += self.get_points_for_word(board=board, word=word)
         turn_points = word_points
 
         # Determine whether there was a bingo, and add the points if there was.
-        if len(self.position_to_placing) >= state.config.min_tiles_for_bingo:
-            turn_points += state.config.bingo_points
+        if len(self.position_to_placing) >= config.min_tiles_for_bingo:
+            turn_points += config.bingo_points
+
+        return turn_points
+
+    def apply(self, state: GameState) -> MoveUndo:
+        undo = _get_move_undo(state)
+        turn_points = self.get_points(board=state.board, config=state.config)
 
         # Add the points to the player's score.
         player_state = state.player_to_state[state.current_player]
@@ -474,43 +634,81 @@ class PlaceTilesMove(Move):
 
         # Remove the played tiles from the player's rack.
         for placing in self.position_to_placing.values():
-            player_state.tiles.remove(placing.tile)
+            _remove_tile_from_rack(player=player_state, tile=placing.tile, undo=undo)
 
         # Place the tiles on the board.
         for position, placing in self.position_to_placing.items():
             tile = placing.tile
             if isinstance(placing, BlankTilePlacing):
                 tile = BlankTile(letter=placing.letter, points=placing.tile.points)
-            state.board.position_to_tile[position] = tile
+            state.board.set_tile_at(position, tile)
+        undo.positions = self.position_to_placing
 
         # If there are no tiles to draw, and the player has no tiles left,
         # give the bonuses and penalties for unplayed tiles and end the game.
         # Otherwise, draw new tiles.
-        if len(state.bag.tiles) == 0 and len(player_state.tiles) == 0:
+        if len(state.bag) == 0 and len(player_state.tiles) == 0:
             state.game_finished = True
             deduct_final_tile_points(state=state, add_to_current_player=True)
         else:
             # Draw new tiles.
-            draw_tiles_for_player(
+            undo.bag_indices = draw_tiles_reversibly(
                 player=player_state,
                 bag=state.bag,
                 num_tiles=len(self.position_to_placing),
             )
-            # num_tiles_to_draw = min(len(state.bag.tiles), len(self.position_to_placing))
-            # shuffle(state.bag.tiles)
-            # drawn_tiles, remaining_tiles = (
-            #     state.bag.tiles[:num_tiles_to_draw],
-            #     state.bag.tiles[num_tiles_to_draw:],
-            # )
-            # player_state.tiles.extend(drawn_tiles)
-            # state.bag.tiles = remaining_tiles
+        _update_tiles_hash(state=state, undo=undo)
 
         # If the game is finished, don't advance to the next player.
-        if state.game_finished:
-            return
-
-        # Advance to the next player.
-        advance_player(state)
+        if not state.game_finished:
+            # Advance to the next player.
+            advance_player(state)
+        return undo
+
+
+# A place-tiles move in a compact form, for the move generator to make lots of them cheaply:
+# the index of the square of its first tile, the step between squares along its line (1 or the board's width),
+# and the tiles it places in order along the line, with the letters they're played as.
+# The tiles go on the empty squares from the first one on, skipping the tiles already on the board,
+# so a compact move only means something on the board it was found for.
+# It's turned into a PlaceTilesMove with to_place_tiles_move when it's needed.
+class CompactMove:
+    __slots__ = ("start", "step", "tiles", "letters")
+
+    def __init__(self, start: int, step: int, tiles: tuple[Tile, ...], letters: str) -> None:
+        self.start = start
+        self.step = step
+        self.tiles = tiles
+        self.letters = letters
+
+    def __repr__(self) -> str:
+        return f"CompactMove(start={self.start}, step={self.step}, tiles={self.tiles}, letters={self.letters!r})"
+
+    # Return the number of tiles this move places.
+    @property
+    def num_tiles(self) -> int:
+        return len(self.tiles)
+
+    # Return whether the tile at the given place in the move is a blank tile.
+    def is_blank(self, i: int) -> bool:
+        return isinstance(self.tiles[i], BlankTile)
+
+    # Return this move as a PlaceTilesMove on the given board, which must be the one it was found for.
+    # It's trusted on that board, since compact moves only come from the move generator.
+    def to_place_tiles_move(self, board: Board) -> PlaceTilesMove:
+        position_to_placing = dict[BoardPosition, TilePlacing]()
+        board_tiles = board.tiles
+        index = self.start
+        for tile, letter in zip(self.tiles, self.letters):
+            while board_tiles[index] is not None:
+                index += self.step
+            position = (index % board.width, index // board.width)
+            if isinstance(tile, BlankTile):
+                position_to_placing[position] = BlankTilePlacing(tile=tile, letter=letter)
+            else:
+                position_to_placing[position] = LetterTilePlacing(tile=tile)  # type: ignore
+            index += self.step
+        return PlaceTilesMove(position_to_placing=position_to_placing, trusted_board=board)
 
 
 # Return the mapping from a tile to the number of times it occurs in the given list. TODO generify(?).
@@ -547,6 +745,7 @@ class ExchangeTilesMove(Move):
         self.tiles = list(tiles)
 
     def is_valid(self, state: GameState) -> bool:
+        profiling.add_count(profiling.MOVES_VALIDATED)
         # TODO make a downcall in the base-class so I don't have to code this repeatedly(?).
         # You can't do any moves if the game is over.
         if state.game_finished:
@@ -560,48 +759,39 @@ class ExchangeTilesMove(Move):
             return False
 
         # You can only turn in tiles if at least seven tiles are in the bag.
-        if len(state.bag.tiles) < state.config.min_tiles_for_turn_in:
+        if len(state.bag) < state.config.min_tiles_for_turn_in:
             return False
 
         return True
 
-    def perform(self, state: GameState) -> None:
+    def apply(self, state: GameState) -> MoveUndo:
+        undo = _get_move_undo(state)
         state.num_scoreless_turns += 1
         end_game_for_scoreless_turns(state)
 
         player_state = state.player_to_state[state.current_player]
 
         # Remove the tiles to be exchanged from the player's tiles.
+        # If a tile isn't there, the is_valid() method should have caught it; it's skipped.
         for tile in self.tiles:
-            try:
-                player_state.tiles.remove(tile)
-            except ValueError:
-                # We tried to remove a tile that wasn't there. The is_valid() method should have caught this.
-                pass
+            _remove_tile_from_rack(player=player_state, tile=tile, undo=undo)
 
         # Give the player the same number of tiles (or as many as possible) from the bag.
-        draw_tiles_for_player(
+        undo.bag_indices = draw_tiles_reversibly(
             player=player_state, bag=state.bag, num_tiles=len(self.tiles)
         )
-        # tiles_to_draw = min(len(self.tiles), len(state.bag.tiles))
-        # shuffle(state.bag.tiles)
-        # drawn_tiles, remaining_tiles = (
-        #     state.bag.tiles[:tiles_to_draw],
-        #     state.bag.tiles[tiles_to_draw:],
-        # )
-        # player_state.tiles.extend(drawn_tiles)
 
-        # state.bag.tiles = remaining_tiles + self.tiles
-        # Put the player's tiles into the bag and shuffle it.
+        # Put the player's tiles into the bag.
+        # The bag doesn't need shuffling, since tiles are drawn from random places in it.
         state.bag.tiles.extend(self.tiles)
-        shuffle(state.bag.tiles)
+        undo.num_tiles_to_bag = len(self.tiles)
+        _update_tiles_hash(state=state, undo=undo, tiles_to_bag=self.tiles)
 
         # If the game is finished, don't advance to the next player.
-        if state.game_finished:
-            return
-
-        # Finally, advance to the next player.
-        advance_player(state)
+        if not state.game_finished:
+            # Finally, advance to the next player.
+            advance_player(state)
+        return undo
 
 
 # Return the index of the next player.
@@ -638,14 +828,15 @@ class PassMove(Move):
     def is_valid(self, state: GameState) -> bool:
         return not state.game_finished
 
-    def perform(self, state: GameState) -> None:
+    def apply(self, state: GameState) -> MoveUndo:
+        undo = _get_move_undo(state)
         state.num_scoreless_turns += 1
         end_game_for_scoreless_turns(state)
 
         # If the game is finished, don't advance to the next player.
-        if state.game_finished:
-            return
-        advance_player(state)
+        if not state.game_finished:
+            advance_player(state)
+        return undo
 
 
 # TODO Take only the state visible to the player.
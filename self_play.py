@@ -0,0 +1,488 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from random import Random
+from typing import Callable, Iterator
+import lzma
+import multiprocessing
+import os
+import struct
+
+from utils import *
+from rules import *
+import ai_strategies
+import game_runner
+import leaves
+
+# Self-play writes the positions of many games between AI players to disk, for fitting leave tables
+# and evaluation functions.
+#
+# The games go into a directory of chunk files, each holding a run of consecutive games.
+# A chunk is written to a temporary file and renamed when it's complete, so the chunks on disk are
+# never partly written, and they're never changed afterwards. Writing more games adds more chunks.
+# If self-play is interrupted, running it again with the same directory carries on after the last chunk.
+# Each game is dealt from its own random number generator, seeded from the seed of the run and the
+# game's index, so the games don't depend on how many workers there were or where the run was resumed.
+#
+# Chunk layout (all integers little-endian):
+#   header: magic, version, the seed of the run, the index of the first game, number of games,
+#       number of positions, size of the data once it's decompressed
+#   the data, compressed with LZMA: the games one after the other
+# Game layout:
+#   header: index, board width, board height, number of players, number of positions
+#   each player's final score (signed 16-bit)
+#   the positions
+# Position layout, for the position each move was made in:
+#   the player to move, the number of tiles in the bag, the change in that player's score (signed 16-bit)
+#   the board: a byte for each square, row by row, 0 if it's empty, or its letter (lower case for a blank)
+#   each player's rack in leave characters (see leaves.py), after its length
+#   the move: MOVE_PASS, MOVE_EXCHANGE and the tiles exchanged, or MOVE_PLACE_TILES, the index of the square
+#   of its first tile, whether it goes down, and the tiles it places in order (as for the board)
+
+SELF_PLAY_MAGIC = b"SCRBLSLF"
+SELF_PLAY_VERSION = 1
+
+_CHUNK_HEADER = struct.Struct("<8sIQIIII")
+_GAME_HEADER = struct.Struct("<IBBBH")
+_POSITION_HEADER = struct.Struct("<BBh")
+_PLACE_TILES_HEADER = struct.Struct("<HB")
+
+MOVE_PASS = 0
+MOVE_EXCHANGE = 1
+MOVE_PLACE_TILES = 2
+
+CHUNK_FILE_PREFIX = "chunk-"
+CHUNK_FILE_SUFFIX = ".bin"
+
+DEFAULT_GAMES_PER_CHUNK = 500
+
+
+# A position from a self-play game, with the move made in it and how the game turned out.
+@dataclass
+class PositionRecord:
+    game_index: int
+    width: int
+    height: int
+    # The letter on each square, row by row: "." if it's empty, lower case for a blank.
+    board: str
+    # Each player's rack in leave characters, in the order the players play.
+    racks: list[str]
+    # The index of the player to move.
+    player: int
+    bag_count: int
+    # The move in a compact notation: "" for passing, "-" and the tiles for exchanging,
+    # or "x,y>" (across) or "x,yv" (down) and the tiles placed, for placing tiles, like "7,7>CAT".
+    move: str
+    # How much the player's score changed because of the move (including the end of the game).
+    score_delta: int
+    # The player's final score minus the best final score of the other players.
+    outcome: int
+
+
+# Return the byte for the given tile on the board or in a move: its letter, lower case for a blank.
+def _get_tile_byte(tile: Tile, letter: str) -> int:
+    if isinstance(tile, BlankTile):
+        return ord(letter.lower())
+    return ord(letter)
+
+
+# Return the bytes of the given tiles as leave characters, after their number.
+def _encode_tiles(tiles: Iterable[Tile]) -> bytes:
+    chars = "".join([leaves.get_leave_char(tile) for tile in tiles])
+    return bytes([len(chars)]) + chars.encode("ascii")
+
+
+# Return the board as bytes, a byte for each square.
+def _encode_board(board: Board) -> bytes:
+    result = bytearray(board.letters)
+    for i, tile in enumerate(board.tiles):
+        if isinstance(tile, BlankTile):
+            result[i] = _get_tile_byte(tile, tile.letter)  # type: ignore
+    return bytes(result)
+
+
+# Return the given move, made in the given state, as bytes.
+def _encode_move(move: Move, state: GameState) -> bytes:
+    if isinstance(move, ExchangeTilesMove):
+        return bytes([MOVE_EXCHANGE]) + _encode_tiles(move.tiles)
+    if not isinstance(move, PlaceTilesMove):
+        return bytes([MOVE_PASS])
+
+    width = state.board.width
+    positions = sorted(move.position_to_placing, key=lambda position: (position[1], position[0]))
+    (x, y) = positions[0]
+    goes_down = len(positions) > 1 and positions[1][0] == x
+    tiles = bytes(
+        [
+            _get_tile_byte(move.position_to_placing[position].tile, move.position_to_placing[position].letter)
+            for position in positions
+        ]
+    )
+    return (
+        bytes([MOVE_PLACE_TILES])
+        + _PLACE_TILES_HEADER.pack(y * width + x, goes_down)
+        + bytes([len(tiles)])
+        + tiles
+    )
+
+
+# Play a game from the given state, and return its positions as bytes, in the layout described above.
+def _play_game(
+    game_index: int, state: GameState, player_to_strategy: Mapping[Player, MoveGetter]
+) -> bytes:
+    positions = list[bytes]()
+    players = list(state.player_order)
+    prev_state: GameState | None = None
+    for move, new_state in game_runner.run_game(
+        state=state, player_to_strategy=player_to_strategy, random_init=False
+    ):
+        if move is not None and prev_state is not None:
+            player = prev_state.current_player
+            score_delta = (
+                new_state.player_to_state[player].score - prev_state.player_to_state[player].score
+            )
+            positions.append(
+                _POSITION_HEADER.pack(
+                    players.index(player), min(len(prev_state.bag), 255), score_delta
+                )
+                + _encode_board(prev_state.board)
+                + b"".join([_encode_tiles(prev_state.player_to_state[p].tiles) for p in players])
+                + _encode_move(move=move, state=prev_state)
+            )
+        prev_state = new_state
+
+    board = state.board
+    return (
+        _GAME_HEADER.pack(game_index, board.width, board.height, len(players), len(positions))
+        + struct.pack(f"<{len(players)}h", *[state.player_to_state[p].score for p in players])
+        + b"".join(positions)
+    )
+
+
+# Return the random number generator for the game with the given index in a run with the given seed.
+def _get_game_rng(seed: int, game_index: int) -> Random:
+    return Random(f"{seed}:{game_index}")
+
+
+# Set up and play the game with the given index, with the given strategy for every player.
+def play_self_play_game(
+    game_index: int,
+    seed: int,
+    config: GameConfig,
+    get_strategy: Callable[[], MoveGetter],
+    num_players: int = 2,
+) -> bytes:
+    rng = _get_game_rng(seed=seed, game_index=game_index)
+    players = [Player(i) for i in range(num_players)]
+    state = GameState(
+        config=config,
+        current_player=rng.choice(players),
+        player_order=players,
+        player_to_state={p: PlayerState(player=p, score=0, tiles=list()) for p in players},
+        bag=Bag(tiles=get_scrabble_tiles(rng=rng)),
+        board=get_scrabble_board(),
+        rng=rng,
+    )
+    for player_state in state.player_to_state.values():
+        draw_tiles_for_player(
+            player=player_state, bag=state.bag, num_tiles=state.config.max_tiles_in_hand
+        )
+    player_to_strategy = {p: get_strategy() for p in players}
+    return _play_game(game_index=game_index, state=state, player_to_strategy=player_to_strategy)
+
+
+# Return the path of the chunk starting with the given game.
+def _get_chunk_path(directory: str, first_game_index: int) -> str:
+    return os.path.join(directory, f"{CHUNK_FILE_PREFIX}{first_game_index:09d}{CHUNK_FILE_SUFFIX}")
+
+
+# Return the paths of the chunks in the given directory, in the order of their games.
+def get_chunk_paths(directory: str) -> list[str]:
+    if not os.path.isdir(directory):
+        return []
+    return [
+        os.path.join(directory, name)
+        for name in sorted(os.listdir(directory))
+        if name.startswith(CHUNK_FILE_PREFIX) and name.endswith(CHUNK_FILE_SUFFIX)
+    ]
+
+
+# Return the header of the chunk at the given path, which starts the given data:
+# (the seed of the run, the index of the first game, number of games, number of positions, size of the data).
+def _unpack_chunk_header(data: bytes, path: str) -> tuple[int, int, int, int, int]:
+    if len(data) < _CHUNK_HEADER.size:
+        raise ValueError(f"{path} is not a self-play chunk file")
+    magic, version, seed, first_game_index, num_games, num_positions, size = _CHUNK_HEADER.unpack_from(
+        data
+    )
+    if magic != SELF_PLAY_MAGIC:
+        raise ValueError(f"{path} is not a self-play chunk file")
+    if version != SELF_PLAY_VERSION:
+        raise ValueError(f"{path} has self-play version {version}, expected {SELF_PLAY_VERSION}")
+    return seed, first_game_index, num_games, num_positions, size
+
+
+# Return the header of the chunk at the given path (see _unpack_chunk_header).
+def read_chunk_header(path: str) -> tuple[int, int, int, int, int]:
+    with open(path, "rb") as file:
+        return _unpack_chunk_header(data=file.read(_CHUNK_HEADER.size), path=path)
+
+
+# Write the given games as a chunk in the given directory.
+def _write_chunk(
+    directory: str, seed: int, first_game_index: int, games: list[bytes], num_positions: int
+) -> None:
+    data = b"".join(games)
+    path = _get_chunk_path(directory=directory, first_game_index=first_game_index)
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(
+            _CHUNK_HEADER.pack(
+                SELF_PLAY_MAGIC,
+                SELF_PLAY_VERSION,
+                seed,
+                first_game_index,
+                len(games),
+                num_positions,
+                len(data),
+            )
+        )
+        file.write(lzma.compress(data))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+# Return the number of games already in the given directory, which must come from a run with the given seed.
+# Chunks that weren't finished are deleted.
+def _get_num_games_written(directory: str, seed: int) -> int:
+    for name in os.listdir(directory):
+        if name.startswith(CHUNK_FILE_PREFIX) and name.endswith(".tmp"):
+            os.remove(os.path.join(directory, name))
+
+    num_games = 0
+    for path in get_chunk_paths(directory):
+        chunk_seed, first_game_index, chunk_num_games, _, _ = read_chunk_header(path)
+        if chunk_seed != seed:
+            raise ValueError(f"{path} is from a run with seed {chunk_seed}, not {seed}")
+        if first_game_index != num_games:
+            raise ValueError(f"{path} starts with game {first_game_index}, expected {num_games}")
+        num_games += chunk_num_games
+    return num_games
+
+
+# The config and strategy-getter used by a self-play worker process.
+_worker_config: GameConfig | None = None
+_worker_get_strategy: Callable[[], MoveGetter] | None = None
+
+
+# Set up a self-play worker process.
+def _init_self_play_worker(config: GameConfig, get_strategy: Callable[[], MoveGetter]) -> None:
+    global _worker_config, _worker_get_strategy
+    _worker_config = config
+    _worker_get_strategy = get_strategy
+    # Make sure the lexicon data is ready before any games start.
+    _worker_config.gaddag
+
+
+# Play the game with the given index in a worker process, and return it with its number of positions.
+def _play_worker_game(game_index: int, seed: int, num_players: int) -> tuple[bytes, int]:
+    game = play_self_play_game(
+        game_index=game_index,
+        seed=seed,
+        config=_worker_config,  # type: ignore
+        get_strategy=_worker_get_strategy,  # type: ignore
+        num_players=num_players,
+    )
+    return game, _GAME_HEADER.unpack_from(game)[4]
+
+
+# Play games between copies of the strategy given by get_strategy until the given directory has
+# the given number of games, and return the number of games played.
+# Games are played on a pool of worker processes (one for each CPU by default), or in this process
+# if there's one worker. Only a few games per worker are in flight at once, and they're written
+# in order as they finish, so memory stays bounded however many games are played.
+# If no config is given, the Scrabble config is used. If no strategy is given, the players play the
+# highest-scoring word.
+def run_self_play(
+    directory: str,
+    num_games: int,
+    get_strategy: Callable[[], MoveGetter] | None = None,
+    seed: int = 0,
+    num_workers: int | None = None,
+    num_players: int = 2,
+    games_per_chunk: int = DEFAULT_GAMES_PER_CHUNK,
+    config: GameConfig | None = None,
+) -> int:
+    if get_strategy is None:
+        get_strategy = ai_strategies.HighestScoringWordStrategy
+    if config is None:
+        config = get_scrabble_config()
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+
+    os.makedirs(directory, exist_ok=True)
+    first_game_index = _get_num_games_written(directory=directory, seed=seed)
+    if first_game_index >= num_games:
+        return 0
+
+    # The games of the chunk being filled.
+    games = list[bytes]()
+    num_positions = 0
+
+    def add_game(game: bytes, game_num_positions: int) -> None:
+        nonlocal first_game_index, games, num_positions
+        games.append(game)
+        num_positions += game_num_positions
+        if len(games) >= games_per_chunk:
+            _write_chunk(
+                directory=directory,
+                seed=seed,
+                first_game_index=first_game_index,
+                games=games,
+                num_positions=num_positions,
+            )
+            first_game_index += len(games)
+            games = list[bytes]()
+            num_positions = 0
+
+    game_indices = range(first_game_index, num_games)
+    try:
+        if num_workers <= 1:
+            for game_index in game_indices:
+                game = play_self_play_game(
+                    game_index=game_index,
+                    seed=seed,
+                    config=config,
+                    get_strategy=get_strategy,
+                    num_players=num_players,
+                )
+                add_game(game=game, game_num_positions=_GAME_HEADER.unpack_from(game)[4])
+        else:
+            _play_games_parallel(
+                game_indices=game_indices,
+                seed=seed,
+                num_workers=num_workers,
+                num_players=num_players,
+                config=config,
+                get_strategy=get_strategy,
+                add_game=add_game,
+            )
+    finally:
+        # Write the last games, even if they don't fill a chunk (or self-play was interrupted).
+        if games:
+            _write_chunk(
+                directory=directory,
+                seed=seed,
+                first_game_index=first_game_index,
+                games=games,
+                num_positions=num_positions,
+            )
+    return len(game_indices)
+
+
+# Play the games with the given indices on a pool of worker processes,
+# and give each one (with its number of positions) to add_game, in order.
+def _play_games_parallel(
+    game_indices: Iterable[int],
+    seed: int,
+    num_workers: int,
+    num_players: int,
+    config: GameConfig,
+    get_strategy: Callable[[], MoveGetter],
+    add_game: Callable[[bytes, int], None],
+) -> None:
+    # If we can fork, load the lexicon here once, and the workers share it instead of each loading it.
+    # Otherwise the config is sent to the workers with the path of its compiled lexicon instead of
+    # its memory-mapped GADDAG, and each worker opens the lexicon again (see GameConfig.__getstate__).
+    if "fork" in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context("fork")
+        config.gaddag
+    else:
+        mp_context = multiprocessing.get_context()
+
+    executor = ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=mp_context,
+        initializer=_init_self_play_worker,
+        initargs=(config, get_strategy),
+    )
+    try:
+        # Keep a couple of games per worker going, and take them back in order.
+        running = deque[Future]()
+        for game_index in game_indices:
+            running.append(executor.submit(_play_worker_game, game_index, seed, num_players))
+            if len(running) >= 2 * num_workers:
+                add_game(*running.popleft().result())
+        while running:
+            add_game(*running.popleft().result())
+    finally:
+        # If we stop early, don't play the games that haven't started.
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+# Return the move encoded at the given offset in the given data, in the notation of PositionRecord.move,
+# and the offset after it.
+def _decode_move(data: bytes, offset: int, width: int) -> tuple[str, int]:
+    kind = data[offset]
+    offset += 1
+    if kind == MOVE_PASS:
+        return "", offset
+    if kind == MOVE_EXCHANGE:
+        num_tiles = data[offset]
+        return "-" + data[offset + 1 : offset + 1 + num_tiles].decode("ascii"), offset + 1 + num_tiles
+    start, goes_down = _PLACE_TILES_HEADER.unpack_from(data, offset)
+    offset += _PLACE_TILES_HEADER.size
+    num_tiles = data[offset]
+    tiles = data[offset + 1 : offset + 1 + num_tiles].decode("ascii")
+    direction = "v" if goes_down else ">"
+    return f"{start % width},{start // width}{direction}{tiles}", offset + 1 + num_tiles
+
+
+# Yield the positions of the games in the chunk at the given path.
+def iter_chunk_records(path: str) -> Iterator[PositionRecord]:
+    with open(path, "rb") as file:
+        chunk = file.read()
+    _, _, num_games, _, _ = _unpack_chunk_header(data=chunk, path=path)
+    data = lzma.decompress(chunk[_CHUNK_HEADER.size :])
+
+    offset = 0
+    for _ in range(num_games):
+        game_index, width, height, num_players, num_positions = _GAME_HEADER.unpack_from(data, offset)
+        offset += _GAME_HEADER.size
+        final_scores = struct.unpack_from(f"<{num_players}h", data, offset)
+        offset += 2 * num_players
+
+        for _ in range(num_positions):
+            player, bag_count, score_delta = _POSITION_HEADER.unpack_from(data, offset)
+            offset += _POSITION_HEADER.size
+            board = data[offset : offset + width * height].replace(b"\0", b".").decode("ascii")
+            offset += width * height
+            racks = list[str]()
+            for _ in range(num_players):
+                num_tiles = data[offset]
+                racks.append(data[offset + 1 : offset + 1 + num_tiles].decode("ascii"))
+                offset += 1 + num_tiles
+            move, offset = _decode_move(data=data, offset=offset, width=width)
+
+            best_other_score = max(
+                [score for i, score in enumerate(final_scores) if i != player], default=0
+            )
+            yield PositionRecord(
+                game_index=game_index,
+                width=width,
+                height=height,
+                board=board,
+                racks=racks,
+                player=player,
+                bag_count=bag_count,
+                move=move,
+                score_delta=score_delta,
+                outcome=final_scores[player] - best_other_score,
+            )
+
+
+# Yield the positions of all of the games in the given directory, in the order of the games.
+def iter_self_play_records(directory: str) -> Iterator[PositionRecord]:
+    for path in get_chunk_paths(directory):
+        yield from iter_chunk_records(path)
@@ -1,11 +1,16 @@
-from typing import Callable
+from typing import Callable, Generator, Iterable
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dataclasses import dataclass
-from random import shuffle
 from enum import Enum
+from random import Random
+import multiprocessing
+import os
+import random
 
 from utils import *
 from rules import *
 import game_runner
+import profiling
 
 
 # A player in a tournament.
@@ -40,12 +45,14 @@ class MatchResults:
 
 
 # Run a single game in a tournament match.
+# If a profile is given, the game is profiled into it, with the strategies under the players' names.
 def do_tournament_game(
     state: GameState,
     player_1: TournamentPlayer,
     player_1_rack: list[Tile],
     player_2: TournamentPlayer,
     player_2_rack: list[Tile],
+    profile: profiling.GameProfile | None = None,
 ) -> GameResult:
     state = state.copy()
 
@@ -58,9 +65,6 @@ def do_tournament_game(
     state.player_to_state[p1].tiles = player_1_rack
     state.player_to_state[p2].tiles = player_2_rack
 
-    # Shuffle the tiles in the bag.
-    shuffle(state.bag.tiles)
-
     # Set the starting player.
     state.current_player = p1
 
@@ -72,7 +76,11 @@ def do_tournament_game(
 
     # Play the game until the end.
     for _, new_state in game_runner.run_game(
-        state=state, player_to_strategy=player_to_strategy, random_init=False
+        state=state,
+        player_to_strategy=player_to_strategy,
+        random_init=False,
+        profile=profile,
+        player_to_name={p1: player_1.name, p2: player_2.name},
     ):
         pass
 
@@ -90,27 +98,38 @@ def do_tournament_game(
 
 
 # Run a tournament match between the two players.
-# TODO make the config of the game configurable.
+# If no config is given, the Scrabble config is used.
+# The tiles are drawn with the given random number generator, if there is one. Each of the four games gets
+# its own copy of it, so the games draw the same tiles as long as the players play the same tiles.
+# If a profile is given, the games are profiled into it.
 def do_tournament_match(
-    player_1: TournamentPlayer, player_2: TournamentPlayer
+    player_1: TournamentPlayer,
+    player_2: TournamentPlayer,
+    config: GameConfig | None = None,
+    rng: Random | None = None,
+    profile: profiling.GameProfile | None = None,
 ) -> MatchResults:
+    if config is None:
+        config = get_scrabble_config()
+
     # Set up the initial state.
     p1 = Player(0)
     p2 = Player(1)
     state = GameState(
-        config=get_scrabble_config(),
+        config=config,
         current_player=p1,
         player_order=(p1, p2),
         player_to_state={
             p1: PlayerState(p1, 0, list()),
             p2: PlayerState(p2, 0, list()),
         },
-        bag=Bag(get_scrabble_tiles()),
+        bag=Bag(get_scrabble_tiles(rng=rng)),
         board=get_scrabble_board(),
+        rng=rng,
     )
 
-    # Shuffle the tiles in the bag and determine the two starting racks.
-    shuffle(state.bag.tiles)
+    # Determine the two starting racks.
+    # The bag doesn't need shuffling, since tiles are drawn from random places in it.
     # print(f"There are {len(state.bag.tiles)} in the bag before drawing racks.")
     rack_1 = draw_tiles(bag=state.bag, num_tiles=7)
     rack_2 = draw_tiles(bag=state.bag, num_tiles=7)
@@ -167,6 +186,7 @@ def do_tournament_match(
         player_1_rack=rack_1,
         player_2=player_2,
         player_2_rack=rack_2,
+        profile=profile,
     )
     if result == GameResult.PLAYER_1_WINS:
         num_player_1_wins += 1
@@ -182,6 +202,7 @@ def do_tournament_match(
         player_1_rack=rack_2,
         player_2=player_2,
         player_2_rack=rack_1,
+        profile=profile,
     )
     if result == GameResult.PLAYER_1_WINS:
         num_player_1_wins += 1
@@ -197,6 +218,7 @@ def do_tournament_match(
         player_1_rack=rack_1,
         player_2=player_1,
         player_2_rack=rack_2,
+        profile=profile,
     )
     if result == GameResult.PLAYER_1_WINS:
         # We have to reverse this, because player 2 was going first.
@@ -213,6 +235,7 @@ def do_tournament_match(
         player_1_rack=rack_2,
         player_2=player_1,
         player_2_rack=rack_1,
+        profile=profile,
     )
     if result == GameResult.PLAYER_1_WINS:
         num_player_2_wins += 1
@@ -240,15 +263,26 @@ def do_tournament_match(
 
 
 # Run the requested number of tournament matches and return the aggregate results.
+# If a profile is given, the games are profiled into it.
 def do_tournament_matches(
-    player_1: TournamentPlayer, player_2: TournamentPlayer, num_matches: int
+    player_1: TournamentPlayer,
+    player_2: TournamentPlayer,
+    num_matches: int,
+    config: GameConfig | None = None,
+    rng: Random | None = None,
+    profile: profiling.GameProfile | None = None,
 ) -> MatchResults:
+    if config is None:
+        config = get_scrabble_config()
+
     num_player_1_wins = 0
     num_player_2_wins = 0
     num_ties = 0
     for i in range(num_matches):
         # print(f"Match {i+1} out of {num_matches}:")
-        match_results = do_tournament_match(player_1=player_1, player_2=player_2)
+        match_results = do_tournament_match(
+            player_1=player_1, player_2=player_2, config=config, rng=rng, profile=profile
+        )
         # print("")
         num_player_1_wins += match_results.num_player_1_wins
         num_player_2_wins += match_results.num_player_2_wins
@@ -261,3 +295,111 @@ def do_tournament_matches(
         num_player_2_wins=num_player_2_wins,
         num_ties=num_ties,
     )
+
+
+# The players and config used by a tournament worker process.
+# They're set up once when the worker starts, so the lexicon is only loaded (or built) once per worker.
+_worker_players = list[TournamentPlayer]()
+_worker_config: GameConfig | None = None
+
+
+# Set up a tournament worker process.
+def _init_tournament_worker(
+    players: list[TournamentPlayer], config: GameConfig | None
+) -> None:
+    global _worker_players, _worker_config
+    _worker_players = players
+    _worker_config = get_scrabble_config() if config is None else config
+    # Make sure the lexicon data is ready before any games start.
+    _worker_config.gaddag
+
+    # Forked workers start with the same random state, so they'd all deal the same tiles.
+    random.seed()
+
+
+# Run a tournament match in a worker process, between the players with the given indices.
+# The tiles are drawn with a random number generator with the given seed, if there is one.
+# Only the counts are sent back, since the players' strategy-getters might not be picklable,
+# with the totals of the match's profile if it's profiled.
+def _do_worker_tournament_match(
+    player_1_index: int, player_2_index: int, seed: str | None = None, use_profile: bool = False
+) -> tuple[int, int, int, int, int, profiling.GameProfile | None]:
+    profile = profiling.GameProfile(keep_turns=False) if use_profile else None
+    results = do_tournament_match(
+        player_1=_worker_players[player_1_index],
+        player_2=_worker_players[player_2_index],
+        config=_worker_config,
+        rng=None if seed is None else Random(seed),
+        profile=profile,
+    )
+    return (
+        player_1_index,
+        player_2_index,
+        results.num_player_1_wins,
+        results.num_player_2_wins,
+        results.num_ties,
+        profile,
+    )
+
+
+# Run a tournament match for each pair of player indices on a pool of worker processes,
+# yielding the indices and the results of each match as soon as it finishes.
+# By default there is one worker for each CPU.
+# If no config is given, each worker uses the Scrabble config.
+# If a seed is given, each match's tiles come from a random number generator seeded from it and the match's
+# place in the pairings, so the matches can be replayed however they're spread over the workers.
+# If a profile is given, the totals of each match's profile are added to it as the match finishes.
+def do_tournament_matches_parallel(
+    players: list[TournamentPlayer],
+    pairings: Iterable[tuple[int, int]],
+    num_workers: int | None = None,
+    config: GameConfig | None = None,
+    seed: int | None = None,
+    profile: profiling.GameProfile | None = None,
+) -> Generator[tuple[int, int, MatchResults], None, None]:
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+
+    # If we can fork, load the lexicon here once, and the workers share it instead of each loading it.
+    # Forking also means the players don't have to be picklable.
+    if "fork" in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context("fork")
+        if config is None:
+            config = get_scrabble_config()
+        config.gaddag
+    else:
+        mp_context = multiprocessing.get_context()
+
+    executor = ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=mp_context,
+        initializer=_init_tournament_worker,
+        initargs=(players, config),
+    )
+    try:
+        futures = [
+            executor.submit(
+                _do_worker_tournament_match,
+                p1_index,
+                p2_index,
+                None if seed is None else f"{seed}:{i}",
+                profile is not None,
+            )
+            for i, (p1_index, p2_index) in enumerate(pairings)
+        ]
+        for future in as_completed(futures):
+            p1_index, p2_index, num_p1_wins, num_p2_wins, num_ties, match_profile = (
+                future.result()
+            )
+            if profile is not None and match_profile is not None:
+                profile.add(match_profile)
+            yield p1_index, p2_index, MatchResults(
+                player_1=players[p1_index],
+                player_2=players[p2_index],
+                num_player_1_wins=num_p1_wins,
+                num_player_2_wins=num_p2_wins,
+                num_ties=num_ties,
+            )
+    finally:
+        # If we stop early, don't run the matches that haven't started.
+        executor.shutdown(wait=True, cancel_futures=True)
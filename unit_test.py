@@ -1,10 +1,35 @@
+import copy
+import itertools
+import multiprocessing
+import os
+import pickle
+import sys
+import tempfile
 import unittest
+from functools import partial
+from typing import Callable
 
 from game_state import *
 from rules import *
 from utils import *
 from move_generation import *
+from move_cache import *
+from gaddag import *
+from letter_masks import *
+import lexicon
+import move_generation
 import infix_data
+import leaves
+import anagrams
+import endgame
+import profiling
+
+# The strategies are imported by module name from their folder.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "Ai_Strategies"))
+import ai_strategies
+import self_play
+import tournament
+import simulation
 
 
 class UtilsTest(unittest.TestCase):
@@ -363,9 +388,169 @@ class StateTest(unittest.TestCase):
         self.assertEqual(board.get_letter_at((2, 1)), "A")
         self.assertEqual(board.get_letter_at((3, 1)), "R")
 
+    def test_board_arrays(self):
+        board = get_board_from_strings(tile_string="CaT \n AAr")
+        self.assertEqual(board.get_row_letters(0), bytearray(b"CAT\0"))
+        self.assertEqual(board.get_row_letters(1), bytearray(b"\0AAR"))
+        self.assertEqual(board.get_column_letters(1), bytearray(b"AA"))
+        self.assertEqual(board.num_tiles, 6)
+        self.assertEqual(len(board.position_to_tile), 6)
+
+        # Writing through the mapping view changes the arrays, and copies don't share them.
+        copy = board.copy()
+        board.position_to_tile[3, 0] = LetterTile("S")
+        del board.position_to_tile[1, 1]
+        self.assertEqual(board.get_row_letters(0), bytearray(b"CATS"))
+        self.assertEqual(board.get_column_letters(1), bytearray(b"A\0"))
+        self.assertEqual(board.num_tiles, 6)
+        self.assertEqual(board.get_tile_at((1, 1)), None)
+        self.assertNotEqual(board, copy)
+        self.assertEqual(copy.get_row_letters(0), bytearray(b"CAT\0"))
+
+        board.set_tile_at((3, 0), None)
+        board.set_tile_at((1, 1), LetterTile("A"))
+        self.assertEqual(board, copy)
+        self.assertEqual(dict(board.position_to_tile), dict(copy.position_to_tile))
+
+    def test_board_zobrist_hash(self):
+        board = get_board_from_strings(tile_string="CaT \n AAr")
+        same_board = get_board_from_strings(tile_string="    \n AAr")
+        same_board.set_tile_at((2, 0), LetterTile("T"))
+        same_board.set_tile_at((0, 0), LetterTile("C"))
+        same_board.set_tile_at((1, 0), BlankTile("A"))
+        self.assertEqual(board.zobrist_hash, same_board.zobrist_hash)
+        self.assertEqual(board.copy().zobrist_hash, board.zobrist_hash)
+
+        # The hash depends on the tiles, their letters and their places.
+        other_hashes = set[int]()
+        for x, y, tile in (
+            (3, 0, LetterTile("S")),
+            (1, 0, LetterTile("A")),
+            (1, 0, BlankTile("E")),
+            (0, 1, LetterTile("C")),
+        ):
+            other_board = board.copy()
+            other_board.set_tile_at((x, y), tile)
+            other_hashes.add(other_board.zobrist_hash)
+        self.assertEqual(len(other_hashes), 4)
+        self.assertNotIn(board.zobrist_hash, other_hashes)
+
+        # Taking a tile away and putting it back gives the same hash.
+        board.set_tile_at((2, 0), None)
+        self.assertNotEqual(board.zobrist_hash, same_board.zobrist_hash)
+        board.set_tile_at((2, 0), LetterTile("T"))
+        self.assertEqual(board.zobrist_hash, same_board.zobrist_hash)
+
+    def test_game_state_copy_hash(self):
+        p0 = Player(0)
+        p1 = Player(1)
+        state = GameState(
+            config=GameConfig(
+                playable_words=tuple(),
+                min_tiles_for_turn_in=7,
+                max_tiles_in_hand=7,
+                min_tiles_for_bonus=7,
+                bonus_points=50,
+                scoreless_turns_to_end_game=6,
+            ),
+            current_player=p0,
+            player_order=[p0, p1],
+            player_to_state={
+                p0: PlayerState(p0, 0, get_tiles_from_string("AB")),
+                p1: PlayerState(p1, 0, get_tiles_from_string("C*")),
+            },
+            bag=Bag(tiles=get_tiles_from_string("DEF")),
+            board=get_board_from_strings(tile_string="CaT \n    "),
+            num_scoreless_turns=3,
+        )
+
+        # A copy keeps the number of scoreless turns, so it hashes the same.
+        state_copy = state.copy()
+        self.assertEqual(state_copy.num_scoreless_turns, 3)
+        self.assertEqual(state_copy, state)
+        self.assertEqual(state_copy.get_zobrist_hash(), state.get_zobrist_hash())
+
+        state_copy.num_scoreless_turns = 0
+        self.assertNotEqual(state_copy.get_zobrist_hash(), state.get_zobrist_hash())
+
+    def test_bag_copy(self):
+        bag = Bag(tiles=get_tiles_from_string("ABC"))
+        bag_copy = bag.copy()
+        self.assertEqual(bag_copy, bag)
+        self.assertIs(bag_copy._tiles, bag._tiles)
+
+        # Changing either one copies the tiles first.
+        bag_copy.tiles.append(LetterTile("D"))
+        self.assertEqual(bag.tiles, get_tiles_from_string("ABC"))
+        self.assertEqual(len(bag_copy), 4)
+        bag.draw(2)
+        self.assertEqual(len(bag), 1)
+        self.assertEqual(len(bag_copy), 4)
+
+    def test_bag_copy_rng(self):
+        tiles = get_tiles_from_string("ABCDEFG")
+        bag = Bag(tiles=tiles, rng=Random(3))
+        bag.draw(1)
+        bag_copy = bag.copy()
+        self.assertIs(bag_copy._rng, bag._rng)
+
+        # The copy draws what the bag draws, whichever draws first.
+        copy_draw = bag_copy.draw(3)
+        self.assertIsNot(bag_copy.rng, bag.rng)
+        self.assertEqual(bag.draw(3), copy_draw)
+
+        # The state's random number generator is its bag's.
+        state = GameState(
+            config=GameConfig(
+                playable_words=tuple(),
+                min_tiles_for_turn_in=7,
+                max_tiles_in_hand=7,
+                min_tiles_for_bonus=7,
+                bonus_points=50,
+                scoreless_turns_to_end_game=6,
+            ),
+            current_player=Player(0),
+            player_order=[Player(0)],
+            player_to_state={Player(0): PlayerState(Player(0), 0, list())},
+            bag=Bag(tiles=tiles),
+            board=get_board_from_strings(multiplier_string=" "),
+            rng=Random(4),
+        )
+        self.assertIs(state.rng, state.bag.rng)
+        state_copy = state.copy()
+        self.assertEqual(state_copy.rng.random(), state.rng.random())  # type: ignore
+
+        # The same generator shuffles the tiles the same way.
+        self.assertEqual(get_scrabble_tiles(rng=Random(5)), get_scrabble_tiles(rng=Random(5)))
+
+    def test_bag_draw(self):
+        tiles = get_tiles_from_string("ABCDEFG")
+
+        # The same seed draws the same tiles.
+        draws = list[list[Tile]]()
+        for _ in range(2):
+            bag = Bag(tiles=tiles, rng=Random(5))
+            draws.append(bag.draw(3))
+            self.assertEqual(len(bag), 4)
+            self.assertCountEqual(draws[-1] + list(bag), tiles)
+        self.assertEqual(draws[0], draws[1])
+
+        # Drawing more tiles than there are takes all of them.
+        self.assertEqual(len(bag.draw(10)), 4)
+        self.assertEqual(len(bag), 0)
+
+        # Tiles put back in the reverse order they were drawn leave the bag as it was.
+        bag = Bag(tiles=tiles, rng=Random(5))
+        drawn = [bag.draw_one() for _ in range(3)]
+        for tile, index in reversed(drawn):
+            bag.put_back(tile, index)
+        self.assertEqual(bag.tiles, tiles)
+
     def test_get_multiplier_at(self):
         board = get_board_from_strings(multiplier_string=" 2\nB ")
         self.assertEqual(board.get_multiplier_at((0, 0)), None)
+        self.assertEqual(board.letter_multipliers, bytearray([1, 1, 3, 1]))
+        self.assertEqual(board.word_multipliers, bytearray([1, 2, 1, 1]))
         self.assertEqual(board.get_multiplier_at((1, 0)), WordMultiplier(2))
         self.assertEqual(board.get_multiplier_at((0, 1)), TileMultiplier(3))
         self.assertEqual(board.get_multiplier_at((1, 1)), None)
@@ -1093,6 +1278,93 @@ class RulesTest(unittest.TestCase):
         state.player_to_state[self.p0].tiles = [LetterTile(letter="A")]
         self.assertFalse(move_7.is_valid(state=state))
 
+    def test_place_tiles_move_is_valid_2(self):
+        state = self.empty_state.copy()
+        state.config = GameConfig(
+            playable_words=("CAT", "CATS", "TA"),
+            min_tiles_for_turn_in=7,
+            max_tiles_in_hand=7,
+            min_tiles_for_bonus=7,
+            bonus_points=50,
+            scoreless_turns_to_end_game=6,
+        )
+        state.board = get_board_from_strings(tile_string="CAT \n    ")
+        state.player_to_state[self.p0].tiles = get_tiles_from_string("SA")
+
+        pairs = (
+            # Extending a word.
+            ("   S", True),
+            # Making only a cross-word.
+            ("\n  A", True),
+            # Not touching any tiles.
+            ("\n   A", False),
+            # Making an unplayable cross-word.
+            ("   S\n   A", False),
+            # Making an unplayable main word.
+            ("\n SA", False),
+        )
+        for tile_string, exp_valid in pairs:
+            move = get_place_tiles_move_from_string(tile_string=tile_string)
+            self.assertEqual(move.is_valid(state=state), exp_valid, tile_string)
+
+    def test_compact_move_to_place_tiles_move(self):
+        board = get_board_from_strings(tile_string="    \n A  \n    \n    ")
+        tiles = (LetterTile("C"), BlankTile(), LetterTile("T"))
+
+        # Going down the second column, the tiles skip over the A.
+        move = CompactMove(start=1, step=4, tiles=tiles, letters="CST")
+        self.assertEqual(move.num_tiles, 3)
+        self.assertTrue(move.is_blank(1))
+        self.assertEqual(
+            move.to_place_tiles_move(board=board),
+            PlaceTilesMove(
+                position_to_placing={
+                    (1, 0): LetterTilePlacing(tile=tiles[0]),
+                    (1, 2): BlankTilePlacing(tile=tiles[1], letter="S"),  # type: ignore
+                    (1, 3): LetterTilePlacing(tile=tiles[2]),
+                }
+            ),
+        )
+        self.assertTrue(move.to_place_tiles_move(board=board).is_trusted_on(board))
+
+    def test_place_tiles_move_is_valid_trusted(self):
+        state = self.empty_state.copy()
+        state.board = get_board_from_strings(tile_string="CAT \n    ")
+        state.player_to_state[self.p0].tiles = get_tiles_from_string("SA")
+
+        # A trusted move's words aren't looked up on the board it's trusted on.
+        move = get_place_tiles_move_from_string(tile_string="   S")
+        trusted_move = PlaceTilesMove(
+            position_to_placing=move.position_to_placing, trusted_board=state.board
+        )
+        self.assertFalse(move.is_valid(state=state))
+        self.assertTrue(trusted_move.is_valid(state=state))
+        self.assertEqual(move, trusted_move)
+        self.assertEqual(hash(move), hash(trusted_move))
+
+        # But its tiles still have to be on the rack and go onto empty squares.
+        for tile_string in ("   X", "  S", "    S"):
+            move = get_place_tiles_move_from_string(tile_string=tile_string)
+            trusted_move = PlaceTilesMove(
+                position_to_placing=move.position_to_placing, trusted_board=state.board
+            )
+            self.assertFalse(trusted_move.is_valid(state=state))
+
+        # On any other board (like a stale one), it's checked in full.
+        other_state = state.copy()
+        other_state.board = get_board_from_strings(tile_string="CAB \n    ")
+        move = get_place_tiles_move_from_string(tile_string="   S")
+        trusted_move = PlaceTilesMove(
+            position_to_placing=move.position_to_placing, trusted_board=state.board
+        )
+        self.assertFalse(trusted_move.is_trusted_on(other_state.board))
+        self.assertFalse(trusted_move.is_valid(state=other_state))
+        self.assertTrue(
+            PlaceTilesMove(
+                position_to_placing=move.position_to_placing, trusted_board=other_state.board
+            ).is_valid(state=other_state)
+        )
+
     def test_place_tiles_move_get_points_for_word(self):
         pairs = (
             ("   ", 6),
@@ -1300,6 +1572,148 @@ class RulesTest(unittest.TestCase):
         self.assertEqual(state, exp_state)
 
 
+    # Return everything about the given state that applying and unapplying a move could change.
+    def _get_snapshot(self, state: GameState):
+        return (
+            dict(state.board.position_to_tile),
+            [(p_state.score, list(p_state.tiles)) for p_state in state.player_to_state.values()],
+            list(state.bag.tiles),
+            state.current_player,
+            state.num_scoreless_turns,
+            state.game_finished,
+        )
+
+    # Assert that applying the given move changes the state like performing it,
+    # and that unapplying it restores the state exactly.
+    def _assert_apply_unapply(self, state: GameState, move: Move):
+        before = self._get_snapshot(state)
+        hash_before = state.get_zobrist_hash()
+        performed_state = state.copy()
+        move.perform(performed_state)
+
+        undo = move.apply(state)
+        self.assertEqual(len(state.bag.tiles), len(performed_state.bag.tiles))
+        self.assertEqual(state.board, performed_state.board)
+        for player in state.player_order:
+            p_state = state.player_to_state[player]
+            performed_p_state = performed_state.player_to_state[player]
+            self.assertEqual(p_state.score, performed_p_state.score)
+            self.assertEqual(len(p_state.tiles), len(performed_p_state.tiles))
+        self.assertEqual(state.current_player, performed_state.current_player)
+        self.assertEqual(state.num_scoreless_turns, performed_state.num_scoreless_turns)
+        self.assertEqual(state.game_finished, performed_state.game_finished)
+
+        # The hash kept up to date by apply is the same as one made from scratch.
+        rehashed_state = state.copy()
+        rehashed_state.tiles_hash = None
+        self.assertEqual(state.get_zobrist_hash(), rehashed_state.get_zobrist_hash())
+        self.assertNotEqual(state.get_zobrist_hash(), hash_before)
+
+        move.unapply(state, undo)
+        self.assertEqual(self._get_snapshot(state), before)
+        self.assertEqual(state.get_zobrist_hash(), hash_before)
+
+    def test_move_apply_unapply_1(self):
+        # Placing tiles and drawing.
+        state = self.empty_state.copy()
+        letter_to_points = {c: 1 for c in "BAGXYZ"}
+        state.bag.tiles = get_tiles_from_string("XYZ*", letter_to_points=letter_to_points)
+        state.player_to_state[self.p0].tiles = get_tiles_from_string(
+            "ZBxAG", letter_to_points=letter_to_points
+        )
+        state.player_to_state[self.p1].score = 5
+        state.num_scoreless_turns = 2
+        state.board = get_board_from_strings(tile_string="    ")
+        move = get_place_tiles_move_from_string("BAG", letter_to_points=letter_to_points)
+        self._assert_apply_unapply(state=state, move=move)
+
+        # Placing tiles and going out.
+        state.bag.tiles = list[Tile]()
+        state.player_to_state[self.p0].tiles = get_tiles_from_string(
+            "BGA", letter_to_points=letter_to_points
+        )
+        state.player_to_state[self.p1].tiles = get_tiles_from_string(
+            "XY", letter_to_points=letter_to_points
+        )
+        # The racks and the bag were changed directly, so their hash has to be made again.
+        state.tiles_hash = None
+        self._assert_apply_unapply(state=state, move=move)
+
+    def test_move_apply_unapply_2(self):
+        # Exchanging tiles.
+        state = self.empty_state.copy()
+        state.config.min_tiles_for_turn_in = 1
+        state.bag.tiles = get_tiles_from_string("ABCDEFG")
+        state.player_to_state[self.p0].tiles = get_tiles_from_string("XYZXQ")
+        move = ExchangeTilesMove(tiles=get_tiles_from_string("XQ"))
+        self._assert_apply_unapply(state=state, move=move)
+
+        # Passing, including the pass that ends the game.
+        state.player_to_state[self.p1].tiles = get_tiles_from_string("AB")
+        state.tiles_hash = None
+        for num_scoreless_turns in (0, 5):
+            state.num_scoreless_turns = num_scoreless_turns
+            self._assert_apply_unapply(state=state, move=PassMove())
+
+    def test_draw_tiles_reversibly(self):
+        bag = Bag(tiles=get_tiles_from_string("ABCDE"))
+        player_state = PlayerState(player=self.p0, score=0, tiles=get_tiles_from_string("Z"))
+        indices = draw_tiles_reversibly(player=player_state, bag=bag, num_tiles=3)
+        self.assertEqual(len(indices), 3)
+        self.assertEqual(len(bag.tiles), 2)
+        self.assertCountEqual(
+            bag.tiles + player_state.tiles[1:], get_tiles_from_string("ABCDE")
+        )
+
+        undraw_tiles_for_player(player=player_state, bag=bag, indices=indices)
+        self.assertEqual(bag.tiles, get_tiles_from_string("ABCDE"))
+        self.assertEqual(player_state.tiles, get_tiles_from_string("Z"))
+
+        # Only the tiles in the bag can be drawn.
+        indices = draw_tiles_reversibly(player=player_state, bag=bag, num_tiles=7)
+        self.assertEqual(len(indices), 5)
+        self.assertEqual(bag.tiles, [])
+
+
+# A moves-finder that checks the moves it finds against the ones a new moves-finder finds in the same state,
+# counting the searches where they differ.
+# If use_new is True, it returns the new moves-finder's moves, as if there were a new one for every search.
+class CheckedMovesFinder(GaddagMoveFinder):
+    def __init__(self, words: Iterable[WORD], use_new: bool = False) -> None:
+        super().__init__(words=words)
+        self.use_new = use_new
+        self.num_searches = 0
+        self.num_mismatches = 0
+
+    def _check(self, found: list, expected: list) -> None:
+        self.num_searches += 1
+        if found != expected:
+            self.num_mismatches += 1
+
+    def iter_compact_moves_with_points(self, state: GameState) -> Iterator[tuple[CompactMove, int]]:
+        moves = list(super().iter_compact_moves_with_points(state=state))
+        expected = list(GaddagMoveFinder(words=self.words).iter_compact_moves_with_points(state=state))
+
+        def get_keys(moves: Iterable[tuple[CompactMove, int]]) -> list:
+            return sorted(
+                [
+                    (move.start, move.step, move.letters, tuple([t.points for t in move.tiles]), points)
+                    for move, points in moves
+                ]
+            )
+
+        self._check(found=get_keys(moves), expected=get_keys(expected))
+        return iter(expected if self.use_new else moves)
+
+    def best_moves(
+        self, state: GameState, k: int = 1, key: MoveKey = get_points_key
+    ) -> list[tuple[PlaceTilesMove, int]]:
+        moves = super().best_moves(state=state, k=k, key=key)
+        expected = GaddagMoveFinder(words=self.words).best_moves(state=state, k=k, key=key)
+        self._check(found=moves, expected=expected)
+        return expected if self.use_new else moves
+
+
 class MoveGenerationTest(unittest.TestCase):
     def setUp(self):
         self.maxDiff = None
@@ -1437,6 +1851,23 @@ class MoveGenerationTest(unittest.TestCase):
         }
         self.assertDictEqual(dict(infix_info.infix_to_suffixes), exp_infix_to_suffixes)
 
+        # The masks hold the same letters.
+        self.assertEqual(infix_info.get_prefix_mask("ATA"), get_mask("BT"))
+        self.assertEqual(infix_info.get_suffix_mask("BA"), get_mask("ABT"))
+        self.assertEqual(infix_info.get_suffix_mask(""), ALL_LETTERS)
+        self.assertEqual(infix_info.get_prefix_mask("Q"), NO_LETTERS)
+
+    def test_letter_masks(self):
+        self.assertEqual(get_mask(""), NO_LETTERS)
+        self.assertEqual(get_mask(ALPHABET), ALL_LETTERS)
+        self.assertEqual(get_mask("BAB"), LETTER_TO_BIT["A"] | LETTER_TO_BIT["B"])
+        self.assertEqual(get_letters(get_mask("ZTAB")), ("A", "B", "T", "Z"))
+        self.assertEqual(get_letters(NO_LETTERS), ())
+
+        # The letter bits are the same as the GADDAG's.
+        for c in ALPHABET:
+            self.assertEqual(LETTER_TO_BIT[c], 1 << CHAR_TO_INDEX[c])
+
     def test_get_all_vertical_straight_moves_1(self):
         state = self.empty_state.copy()
         state.board.position_to_tile[7, 7] = LetterTile("A", points=1)
@@ -2579,5 +3010,1123 @@ class MoveGenerationTest(unittest.TestCase):
         self.assertCountEqual(moves, exp_moves)
 
 
+    def test_get_all_place_tiles_moves_4(self):
+        state = self.empty_state.copy()
+
+        # BATATA across, ABBA down from its first A, and TAT down from its second T.
+        for i, letter in enumerate("BATATA"):
+            state.board.position_to_tile[4 + i, 7] = LetterTile(letter, points=1)  # type: ignore
+        for i, letter in enumerate("BBA"):
+            state.board.position_to_tile[5, 8 + i] = LetterTile(letter, points=1)  # type: ignore
+        for i, letter in enumerate("AT"):
+            state.board.position_to_tile[8, 8 + i] = LetterTile(letter, points=1)  # type: ignore
+
+        a = LetterTile("A", points=1)
+        b = LetterTile("B", points=1)
+        t = LetterTile("T", points=1)
+        blank = BlankTile()
+        state.player_to_state[self.p0].tiles = [a, t, b, blank]
+
+        # Finding the moves from the anchors finds the same moves as finding them from every tile.
+        anchor_moves = PlaceTilesMoveFinder(
+            words=self.small_dictionary
+        ).get_all_place_tiles_moves(state=state)
+        tile_moves = PlaceTilesMoveFinder(
+            words=self.small_dictionary, use_anchors=False
+        ).get_all_place_tiles_moves(state=state)
+        self.assertCountEqual(anchor_moves, tile_moves)
+
+        # BATT along the bottom goes through two tiles already on the board.
+        for a_placing in (LetterTilePlacing(tile=a), BlankTilePlacing(tile=blank, letter="A")):
+            exp_move = PlaceTilesMove(
+                position_to_placing={(6, 9): a_placing, (7, 9): LetterTilePlacing(tile=t)}
+            )
+            self.assertIn(exp_move, anchor_moves)
+
+    def test_get_anchor_positions(self):
+        board = get_board_from_strings(tile_string="    \n AB \n    ")
+        exp_anchors = {(1, 0), (2, 0), (0, 1), (3, 1), (1, 2), (2, 2)}
+        self.assertSetEqual(get_anchor_positions(board), exp_anchors)
+
+        # On an empty board, the anchor is the starting position, if there is one.
+        board = get_board_from_strings(tile_string="  \n  ")
+        self.assertSetEqual(get_anchor_positions(board), {(0, 0), (1, 0), (0, 1), (1, 1)})
+        board.starting_position = (1, 1)
+        self.assertSetEqual(get_anchor_positions(board), {(1, 1)})
+
+    def test_get_gaddag_strings(self):
+        strings = get_gaddag_strings("BAT")
+        exp_strings = ["TAB", "B|AT", "AB|T"]
+        self.assertCountEqual(strings, exp_strings)
+
+    def test_gaddag_1(self):
+        gaddag = Gaddag(words=self.small_dictionary)
+
+        for word in self.small_dictionary:
+            self.assertTrue(gaddag.contains_word(word))
+            for s in get_gaddag_strings(word):
+                node = gaddag.follow(s)
+                self.assertGreaterEqual(node, 0)
+                self.assertTrue(gaddag.is_terminal(node))
+
+        for word in ("", "A", "B", "TT", "ABB", "BATAT", "BATATAS", "CAT"):
+            self.assertFalse(gaddag.contains_word(word))
+
+        # Following the reversed start of BATATA, the separator and then the rest of it,
+        # only a full word is terminal.
+        self.assertFalse(gaddag.is_terminal(gaddag.follow("TAB|AT")))
+        self.assertTrue(gaddag.is_terminal(gaddag.follow("TAB|ATA")))
+        self.assertEqual(gaddag.follow("TAB|ATT"), -1)
+
+        # The most letters left from the root is the length of the longest word.
+        self.assertEqual(
+            gaddag.max_letters_left[ROOT], max([len(word) for word in self.small_dictionary])
+        )
+        self.assertEqual(gaddag.max_letters_left[gaddag.follow("TAB|AT")], 1)
+        self.assertEqual(gaddag.max_letters_left[gaddag.follow("TAB|ATA")], 0)
+
+    def test_gaddag_infix_data(self):
+        infix_info = infix_data.InfixData(words=self.small_dictionary)
+        gaddag_infix_info = infix_data.GaddagInfixData(gaddag=Gaddag(words=self.small_dictionary))
+
+        # Both answer the same for every substring of every word, and for strings that aren't substrings.
+        substrings = {"", "Q", "AAA", "BATATAB"}
+        for word in self.small_dictionary:
+            for i in range(len(word)):
+                for j in range(i + 1, len(word) + 1):
+                    substrings.add(word[i:j])
+        for s in substrings:
+            self.assertEqual(gaddag_infix_info.get_prefix_mask(s), infix_info.get_prefix_mask(s))
+            self.assertEqual(gaddag_infix_info.get_suffix_mask(s), infix_info.get_suffix_mask(s))
+
+    def test_lexicon(self):
+        with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as directory:
+            path = os.path.join(directory, "words.lex")
+            lexicon.compile_lexicon(words=self.small_dictionary, path=path)
+            words, gaddag = lexicon.load_lexicon(path)
+
+            self.assertEqual(words, self.small_dictionary)
+            exp_gaddag = Gaddag(words=self.small_dictionary)
+            self.assertEqual(list(gaddag.masks), list(exp_gaddag.masks))
+            self.assertEqual(list(gaddag.first_child), list(exp_gaddag.first_child))
+            self.assertEqual(list(gaddag.children), list(exp_gaddag.children))
+            self.assertEqual(
+                list(gaddag.after_separator_masks), list(exp_gaddag.after_separator_masks)
+            )
+            self.assertEqual(list(gaddag.max_letters_left), list(exp_gaddag.max_letters_left))
+            for word in self.small_dictionary:
+                self.assertTrue(gaddag.contains_word(word))
+
+            # A config made from the loaded lexicon finds the same moves.
+            state = self.empty_state.copy()
+            for i, letter in enumerate("BAT"):
+                state.board.position_to_tile[6 + i, 7] = LetterTile(letter, points=1)  # type: ignore
+            state.player_to_state[self.p0].tiles = [LetterTile("A", points=1), BlankTile()]
+            exp_moves = self.moves_finder.get_all_place_tiles_moves(state=state)
+
+            state.config = GameConfig(
+                playable_words=words,
+                min_tiles_for_turn_in=7,
+                max_tiles_in_hand=7,
+                min_tiles_for_bonus=7,
+                bonus_points=50,
+                scoreless_turns_to_end_game=6,
+                gaddag=gaddag,
+            )
+            self.assertIs(state.config.gaddag, gaddag)
+            self.assertIsInstance(state.config.infix_data, infix_data.GaddagInfixData)
+            moves_finder = GaddagMoveFinder(words=words)
+            self.assertCountEqual(moves_finder.get_all_place_tiles_moves(state=state), exp_moves)
+
+    def test_gaddag_move_finder_1(self):
+        state = self.empty_state.copy()
+        state.board = get_board_from_strings(tile_string="  \n  ")
+
+        # Give the player a two A's.
+        a = LetterTile("A", points=1)
+        state.player_to_state[self.p0].tiles = [a, a]
+
+        moves_finder = GaddagMoveFinder(words=self.small_dictionary)
+        moves = moves_finder.get_all_place_tiles_moves(state=state)
+
+        pl = LetterTilePlacing(tile=a)
+        exp_moves = [
+            PlaceTilesMove(position_to_placing={(0, 0): pl, (0, 1): pl}),
+            PlaceTilesMove(position_to_placing={(1, 0): pl, (1, 1): pl}),
+            PlaceTilesMove(position_to_placing={(0, 0): pl, (1, 0): pl}),
+            PlaceTilesMove(position_to_placing={(0, 1): pl, (1, 1): pl}),
+        ]
+        self.assertCountEqual(moves, exp_moves)
+
+    def test_gaddag_move_finder_2(self):
+        state = self.empty_state.copy()
+
+        # Give the player a two A's.
+        a = LetterTile("A", points=1)
+        state.player_to_state[self.p0].tiles = [a, a]
+
+        moves_finder = GaddagMoveFinder(words=self.small_dictionary)
+        moves = moves_finder.get_all_place_tiles_moves(state=state)
+
+        pl = LetterTilePlacing(tile=a)
+        exp_moves = [
+            PlaceTilesMove(position_to_placing={(7, 7): pl, (7, 8): pl}),
+            PlaceTilesMove(position_to_placing={(7, 7): pl, (7, 6): pl}),
+            PlaceTilesMove(position_to_placing={(7, 7): pl, (6, 7): pl}),
+            PlaceTilesMove(position_to_placing={(7, 7): pl, (8, 7): pl}),
+        ]
+        self.assertCountEqual(moves, exp_moves)
+
+    def test_gaddag_move_finder_3(self):
+        state = self.empty_state.copy()
+        state.board.position_to_tile[7, 7] = LetterTile("A", points=1)
+
+        # Give the player a two A's.
+        a = LetterTile("A", points=1)
+        state.player_to_state[self.p0].tiles = [a, a]
+
+        moves_finder = GaddagMoveFinder(words=self.small_dictionary)
+        moves = moves_finder.get_all_place_tiles_moves(state=state)
+
+        pl = LetterTilePlacing(tile=a)
+        exp_moves = [
+            PlaceTilesMove(position_to_placing={(7, 8): pl}),
+            PlaceTilesMove(position_to_placing={(7, 6): pl}),
+            PlaceTilesMove(position_to_placing={(6, 7): pl}),
+            PlaceTilesMove(position_to_placing={(8, 7): pl}),
+            PlaceTilesMove(position_to_placing={(6, 6): pl, (6, 7): pl}),
+            PlaceTilesMove(position_to_placing={(6, 7): pl, (6, 8): pl}),
+            PlaceTilesMove(position_to_placing={(8, 6): pl, (8, 7): pl}),
+            PlaceTilesMove(position_to_placing={(8, 7): pl, (8, 8): pl}),
+            PlaceTilesMove(position_to_placing={(6, 6): pl, (7, 6): pl}),
+            PlaceTilesMove(position_to_placing={(7, 6): pl, (8, 6): pl}),
+            PlaceTilesMove(position_to_placing={(6, 8): pl, (7, 8): pl}),
+            PlaceTilesMove(position_to_placing={(7, 8): pl, (8, 8): pl}),
+        ]
+        self.assertCountEqual(moves, exp_moves)
+
+    def test_gaddag_move_finder_4(self):
+        state = self.empty_state.copy()
+
+        # BATATA across, ABBA down from its first A, and TAT down from its second T.
+        for i, letter in enumerate("BATATA"):
+            state.board.position_to_tile[4 + i, 7] = LetterTile(letter, points=1)  # type: ignore
+        for i, letter in enumerate("BBA"):
+            state.board.position_to_tile[5, 8 + i] = LetterTile(letter, points=1)  # type: ignore
+        for i, letter in enumerate("AT"):
+            state.board.position_to_tile[8, 8 + i] = LetterTile(letter, points=1)  # type: ignore
+
+        a = LetterTile("A", points=1)
+        b = LetterTile("B", points=1)
+        t = LetterTile("T", points=1)
+        blank = BlankTile()
+        state.player_to_state[self.p0].tiles = [a, t, b, blank]
+
+        moves_finder = GaddagMoveFinder(words=self.small_dictionary)
+        moves = moves_finder.get_all_place_tiles_moves(state=state)
+
+        # Every move found is valid, and it finds the same moves as the older finder.
+        for move in moves:
+            self.assertTrue(move.is_valid(state=state))
+        self.assertCountEqual(self.moves_finder.get_all_place_tiles_moves(state=state), moves)
+
+        # BATT along the bottom goes through two tiles already on the board.
+        exp_move = PlaceTilesMove(
+            position_to_placing={
+                (6, 9): BlankTilePlacing(tile=blank, letter="A"),
+                (7, 9): LetterTilePlacing(tile=t),
+            }
+        )
+        self.assertIn(exp_move, moves)
+
+    def test_gaddag_move_finder_points(self):
+        state = self.empty_state.copy()
+        state.config = copy.copy(state.config)
+        state.config.min_tiles_for_bingo = 4
+        state.config.bingo_points = 50
+
+        # BATATA across the middle, and ABBA down from its first A.
+        for i, letter in enumerate("BATATA"):
+            state.board.position_to_tile[4 + i, 7] = LetterTile(letter, points=i + 1)  # type: ignore
+        for i, letter in enumerate("BBA"):
+            state.board.position_to_tile[5, 8 + i] = LetterTile(letter, points=2)  # type: ignore
+        state.player_to_state[self.p0].tiles = [
+            LetterTile("A", points=1),
+            LetterTile("T", points=3),
+            LetterTile("B", points=5),
+            LetterTile("A", points=1),
+            BlankTile(),
+        ]
+
+        # Every move's points are the same as the points from scoring it on the board.
+        moves_finder = GaddagMoveFinder(words=self.small_dictionary)
+        move_to_points = moves_finder.get_all_place_tiles_moves_with_points(state=state)
+        self.assertGreater(len(move_to_points), 0)
+        self.assertTrue(any(len(move.position_to_placing) >= 4 for move in move_to_points))
+        for move, points in move_to_points.items():
+            self.assertEqual(points, move.get_points(board=state.board, config=state.config))
+
+        # Same on an empty board.
+        state.board = get_scrabble_board()
+        move_to_points = moves_finder.get_all_place_tiles_moves_with_points(state=state)
+        self.assertGreater(len(move_to_points), 0)
+        for move, points in move_to_points.items():
+            self.assertEqual(points, move.get_points(board=state.board, config=state.config))
+
+    def test_gaddag_move_finder_iter(self):
+        state = self.empty_state.copy()
+        for i, letter in enumerate("BATATA"):
+            state.board.position_to_tile[4 + i, 7] = LetterTile(letter, points=1)  # type: ignore
+        state.player_to_state[self.p0].tiles = [
+            LetterTile("A", points=1),
+            LetterTile("T", points=1),
+            BlankTile(),
+        ]
+
+        moves_finder = GaddagMoveFinder(words=self.small_dictionary)
+        move_to_points = moves_finder.get_all_place_tiles_moves_with_points(state=state)
+
+        # Every move is yielded once.
+        moves_with_points = list(moves_finder.iter_place_tiles_moves_with_points(state=state))
+        self.assertEqual(len(moves_with_points), len(move_to_points))
+        self.assertEqual(dict(moves_with_points), move_to_points)
+        moves = list(moves_finder.iter_place_tiles_moves(state=state))
+        self.assertCountEqual(moves, move_to_points)
+
+        # The caller can stop early.
+        first_moves = list(itertools.islice(moves_finder.iter_place_tiles_moves(state=state), 2))
+        self.assertEqual(first_moves, moves[:2])
+
+    def test_gaddag_move_finder_best_moves(self):
+        state = self.empty_state.copy()
+        for i, letter in enumerate("BATATA"):
+            state.board.position_to_tile[4 + i, 7] = LetterTile(letter, points=i + 1)  # type: ignore
+        state.player_to_state[self.p0].tiles = [
+            LetterTile("A", points=1),
+            LetterTile("T", points=3),
+            LetterTile("B", points=5),
+            BlankTile(),
+        ]
+
+        moves_finder = GaddagMoveFinder(words=self.small_dictionary)
+        move_to_points = moves_finder.get_all_place_tiles_moves_with_points(state=state)
+
+        # The best moves have the best values of all the moves, best first.
+        def tiles_key(points: int, num_tiles: int) -> tuple[int, int]:
+            return num_tiles, points
+
+        for key in (get_points_key, tiles_key):
+            all_values = sorted(
+                [key(points, len(move.position_to_placing)) for move, points in move_to_points.items()],
+                reverse=True,
+            )
+            for k in (1, 3, len(move_to_points) + 1):
+                best_moves = moves_finder.best_moves(state=state, k=k, key=key)
+                self.assertEqual(len(best_moves), min(k, len(move_to_points)))
+                for move, points in best_moves:
+                    self.assertEqual(move_to_points[move], points)
+                values = [key(points, len(move.position_to_placing)) for move, points in best_moves]
+                self.assertEqual(values, all_values[:k])
+
+        self.assertEqual(moves_finder.best_moves(state=state, k=0), [])
+
+    def test_gaddag_move_finder_move_cache(self):
+        state = self.empty_state.copy()
+        for i, letter in enumerate("BAT"):
+            state.board.position_to_tile[4 + i, 7] = LetterTile(letter, points=i + 1)  # type: ignore
+        state.player_to_state[self.p0].tiles = [
+            LetterTile("A", points=1),
+            LetterTile("T", points=3),
+            BlankTile(),
+        ]
+        uncached_finder = GaddagMoveFinder(words=self.small_dictionary)
+        expected = uncached_finder.get_all_place_tiles_moves_with_points(state=state)
+        expected_best = uncached_finder.best_moves(state=state, k=2)
+
+        cache = MoveCache()
+        moves_finder = GaddagMoveFinder(words=self.small_dictionary, move_cache=cache)
+        other_moves_finder = GaddagMoveFinder(words=self.small_dictionary, move_cache=cache)
+        self.assertEqual(moves_finder.get_all_place_tiles_moves_with_points(state=state), expected)
+        self.assertEqual((cache.hits, cache.misses, len(cache.key_to_entry)), (0, 1, 1))
+
+        # The same board and rack (in any order) are found in the cache, from any finder sharing it.
+        state.player_to_state[self.p0].tiles.reverse()
+        self.assertEqual(other_moves_finder.get_all_place_tiles_moves_with_points(state=state), expected)
+        self.assertEqual(other_moves_finder.best_moves(state=state, k=2), expected_best)
+        self.assertEqual(cache.get_stats().hits, 2)
+
+        # A different rack or board isn't.
+        state.player_to_state[self.p0].tiles.pop()
+        moves_finder.get_all_place_tiles_moves(state=state)
+        state.board.position_to_tile[7, 7] = LetterTile("S", points=1)
+        list(moves_finder.iter_place_tiles_moves(state=state))
+        self.assertEqual(cache.get_stats().misses, 3)
+        self.assertEqual(cache.get_stats().num_entries, 3)
+
+        # Neither is a different bingo bonus, since the points include it.
+        key = get_move_cache_key(state)
+        state.config = copy.copy(state.config)
+        state.config.bingo_points += 1
+        self.assertNotEqual(get_move_cache_key(state), key)
+        state.config.bingo_points -= 1
+        state.config.min_tiles_for_bingo += 1
+        self.assertNotEqual(get_move_cache_key(state), key)
+        state.config.min_tiles_for_bingo -= 1
+        self.assertEqual(get_move_cache_key(state), key)
+
+        # Stopping early doesn't cache a partial move list.
+        del state.board.position_to_tile[7, 7]
+        state.player_to_state[self.p0].tiles.append(LetterTile("E", points=1))
+        next(moves_finder.iter_place_tiles_moves(state=state))
+        self.assertEqual(cache.get_stats().num_entries, 3)
+
+    def test_move_cache_lru(self):
+        move = CompactMove(
+            start=0, step=1, tiles=tuple(get_tiles_from_string("AB")), letters="AB"
+        )
+        moves = [(move, 2)]
+        cache = MoveCache(max_entries=2)
+        cache.put("a", moves)
+        cache.put("b", moves)
+        self.assertEqual(cache.get("a"), (moves[0],))
+        # "b" is the least recently used, so it's dropped first.
+        cache.put("c", moves)
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertEqual(
+            cache.get_stats(),
+            MoveCacheStats(
+                hits=3, misses=1, num_entries=2, num_bytes=2 * get_estimated_bytes(moves)
+            ),
+        )
+        self.assertEqual(cache.get_stats().hit_rate, 0.75)
+
+        # Move lists are dropped to stay under the memory limit, and lists that are too big aren't kept.
+        cache = MoveCache(max_bytes=get_estimated_bytes(moves) * 3 // 2)
+        cache.put("a", moves)
+        cache.put("b", moves)
+        self.assertEqual(list(cache.key_to_entry), ["b"])
+        cache.put("c", moves * 2)
+        self.assertEqual(list(cache.key_to_entry), ["b"])
+
+    def test_profile_counters(self):
+        state = self.empty_state.copy()
+        state.player_to_state[self.p0].tiles = get_tiles_from_string(
+            "BATT", letter_to_points={"A": 1, "B": 3, "T": 1}
+        )
+        finder = GaddagMoveFinder(words=self.small_dictionary, move_cache=MoveCache())
+        profile = profiling.GameProfile()
+        profile.start_game()
+        profile.start_turn(strategy="a")
+        with profile.phase(phase=profiling.STRATEGY, strategy="a"):
+            moves = finder.get_all_place_tiles_moves(state=state)
+            # The second time, the moves come from the cache.
+            finder.get_all_place_tiles_moves(state=state)
+            state_copy = state.copy()
+            for move in moves:
+                self.assertTrue(move.is_valid(state=state_copy))
+        # Nothing is counted outside of a phase.
+        state.copy()
+
+        expected = {
+            profiling.MOVES_GENERATED: len(moves),
+            profiling.MOVES_VALIDATED: len(moves),
+            profiling.STATES_COPIED: 1,
+            profiling.CACHE_HITS: 1,
+            profiling.CACHE_MISSES: 1,
+        }
+        self.assertEqual(profile.strategy_to_profile["a"].counters, expected)
+        self.assertEqual(profile.turns[0].counters, expected)
+        self.assertEqual(profile.strategy_to_profile["a"].num_turns, 1)
+        self.assertEqual(list(profile.turns[0].phase_to_seconds), [profiling.STRATEGY])
+
+        # Profiles of more games add up.
+        total = profiling.GameProfile(keep_turns=False)
+        total.add(profile)
+        total.add(profile)
+        summary = total.to_json()
+        self.assertEqual(summary["num_games"], 2)
+        self.assertNotIn("turns", summary)
+        self.assertEqual(summary["strategies"]["a"]["num_turns"], 2)
+        self.assertEqual(
+            summary["strategies"]["a"]["counters"][profiling.MOVES_GENERATED], 2 * len(moves)
+        )
+
+    def test_profile_best_moves_counters(self):
+        opening_state = self.empty_state.copy()
+        state = self.empty_state.copy()
+        for i, letter in enumerate("BAT"):
+            state.board.position_to_tile[4 + i, 7] = LetterTile(letter, points=i + 1)  # type: ignore
+        for s in [opening_state, state]:
+            s.player_to_state[self.p0].tiles = get_tiles_from_string(
+                "BATT", letter_to_points={"A": 1, "B": 3, "T": 1}
+            )
+
+        # Every move a best-move search finds is counted, not just the ones it keeps.
+        finder = GaddagMoveFinder(words=self.small_dictionary)
+        for s, k in [(opening_state, 1), (state, 1), (state, 3)]:
+            num_moves = len(finder.get_all_place_tiles_moves(state=s))
+            counters = dict[str, int]()
+            with profiling.counting(counters):
+                finder.best_moves(state=s, k=k)
+            best = move_generation._BestMoves(k=k, key=get_points_key)
+            for _ in finder._search(state=s, best=best):
+                pass
+            self.assertEqual(counters[profiling.MOVES_GENERATED], best.num_offered)
+            self.assertGreater(best.num_offered, best.num_found)
+            # The first moves are all found. Later, the search skips the moves that can't be one of the best.
+            if s is opening_state:
+                self.assertEqual(best.num_offered, num_moves)
+            else:
+                self.assertLessEqual(best.num_offered, num_moves)
+
+    def test_anagram_index(self):
+        index = anagrams.AnagramIndex(words=self.small_dictionary)
+        self.assertEqual(index.get_anagrams("TAB"), ("BAT", "TAB"))
+        self.assertEqual(index.get_anagrams("XYZ"), ())
+
+        self.assertEqual(index.get_words(letters="TAB"), {"AB", "AT", "BA", "TA", "BAT", "TAB"})
+        self.assertEqual(index.get_words(letters="TAB", min_length=3), {"BAT", "TAB"})
+        self.assertEqual(
+            index.get_words(letters="TA", num_blanks=1, min_length=3),
+            {"ATT", "BAT", "TAB", "TAT"},
+        )
+        self.assertEqual(index.get_words(letters="", num_blanks=2), {"AA", "AB", "AT", "BA", "TA"})
+
+    def test_gaddag_move_finder_opening_moves(self):
+        # The opening moves from the anagram index are the same as the ones found from the starting square.
+        state = self.empty_state.copy()
+        for rack in ("BATT", "AB*", "TA**", "Q"):
+            state.player_to_state[self.p0].tiles = get_tiles_from_string(
+                rack, letter_to_points={"A": 1, "B": 3, "T": 1, "Q": 10}
+            )
+            expected = self.moves_finder.get_all_place_tiles_moves(state=state)
+            move_to_points = GaddagMoveFinder(
+                words=self.small_dictionary
+            ).get_all_place_tiles_moves_with_points(state=state)
+            self.assertEqual(set(move_to_points), expected)
+            for move, points in move_to_points.items():
+                self.assertEqual(points, move.get_points(board=state.board, config=state.config))
+
+    def test_generator_self_check(self):
+        state = self.empty_state.copy()
+        for i, letter in enumerate("BAT"):
+            state.board.position_to_tile[4 + i, 7] = LetterTile(letter, points=i + 1)  # type: ignore
+        state.player_to_state[self.p0].tiles = [LetterTile("A", points=1), BlankTile()]
+        moves_finder = GaddagMoveFinder(words=self.small_dictionary)
+
+        # Checking every move finds no mismatches.
+        self_check = get_self_check()
+        set_self_check_rate(1.0)
+        try:
+            moves = moves_finder.get_all_place_tiles_moves_with_points(state=state)
+            moves_finder.best_moves(state=state, k=2)
+            self.assertEqual(self_check.num_checked, len(moves) + 2)
+            self.assertEqual(self_check.num_mismatches, 0)
+        finally:
+            set_self_check_rate(0.0)
+            self_check.reset()
+
+        # Nothing is checked by default.
+        moves_finder.get_all_place_tiles_moves_with_points(state=state)
+        self.assertEqual(self_check.num_checked, 0)
+
+        # A move given the wrong points is a mismatch.
+        other_self_check = GeneratorSelfCheck(rate=1.0)
+        move, points = next(iter(moves.items()))
+        self.assertTrue(other_self_check.check(state=state, move=move, points=points))
+        self.assertFalse(other_self_check.check(state=state, move=move, points=points + 1))
+        self.assertEqual((other_self_check.num_checked, other_self_check.num_mismatches), (2, 1))
+        self.assertEqual(other_self_check.mismatches, [(move, points + 1)])
+
+    def test_get_going_out_points(self):
+        state = self.empty_state.copy()
+        state.bag.tiles = list[Tile]()
+        state.player_to_state[self.p0].tiles = [LetterTile("A", points=1), LetterTile("B", points=3)]
+        p1 = Player(1)
+        state.player_order = [self.p0, p1]
+        state.player_to_state[p1] = PlayerState(p1, 0, [LetterTile("Q", points=10), BlankTile()])
+
+        self.assertEqual(get_going_out_points(state=state, num_tiles_placed=1), 0)
+        self.assertEqual(get_going_out_points(state=state, num_tiles_placed=2), 10)
+
+        # Nobody goes out while there are tiles left in the bag.
+        state.bag.tiles = [LetterTile("E", points=1)]
+        self.assertEqual(get_going_out_points(state=state, num_tiles_placed=2), 0)
+
+    def test_solve_endgame(self):
+        state = self.empty_state.copy()
+        for i, letter in enumerate("BAT"):
+            state.board.position_to_tile[6 + i, 7] = LetterTile(letter, points=i + 1)  # type: ignore
+        p1 = Player(1)
+        state.player_order = [self.p0, p1]
+        state.player_to_state[self.p0].tiles = [LetterTile("Q", points=10)]
+        state.player_to_state[self.p0].score = 50
+        state.player_to_state[p1] = PlayerState(p1, 40, [LetterTile("A", points=1)])
+        moves_finder = GaddagMoveFinder(words=self.small_dictionary)
+
+        # The second player can go out with their best move, and gets the points of the Q twice over.
+        state.current_player = p1
+        best_points = max(moves_finder.get_all_place_tiles_moves_with_points(state=state).values())
+        result = endgame.solve_endgame(state=state, time_limit=10.0, moves_finder=moves_finder)
+        self.assertTrue(result.solved)
+        self.assertEqual(result.spread, 40 - 50 + best_points + 2 * 10)
+        self.assertIsInstance(result.move, PlaceTilesMove)
+        self.assertEqual(result.move.get_points(board=state.board, config=state.config), best_points)  # type: ignore
+
+        # The first player can't play the Q, so they have to pass first.
+        state.current_player = self.p0
+        result = endgame.solve_endgame(state=state, time_limit=10.0, moves_finder=moves_finder)
+        self.assertTrue(result.solved)
+        self.assertEqual(result.spread, 50 - 40 - best_points - 2 * 10)
+        self.assertEqual([type(move) for move in result.moves], [PassMove, PlaceTilesMove])
+
+        # The state isn't changed.
+        self.assertEqual(state.player_to_state[self.p0].tiles, [LetterTile("Q", points=10)])
+        self.assertEqual(state.player_to_state[p1].score, 40)
+        self.assertEqual(len(state.board.position_to_tile), 3)
+
+        # A player who can't score ends the game by passing, if that's the last scoreless turn allowed.
+        state.num_scoreless_turns = state.config.scoreless_turns_to_end_game - 1
+        result = endgame.solve_endgame(state=state, time_limit=10.0, moves_finder=moves_finder)
+        self.assertEqual(result.spread, 50 - 10 - (40 - 1))
+        self.assertEqual(len(result.moves), 1)
+        # Strategies are given copies of the state, which keep the count.
+        copy_result = endgame.solve_endgame(
+            state=state.copy(), time_limit=10.0, moves_finder=moves_finder
+        )
+        self.assertEqual(copy_result.spread, result.spread)
+        self.assertEqual(len(copy_result.moves), 1)
+
+        # Even with no time, at least one ply is searched.
+        state.num_scoreless_turns = 0
+        state.current_player = p1
+        result = endgame.solve_endgame(state=state, time_limit=0.0, moves_finder=moves_finder)
+        self.assertEqual(result.depth, 1)
+        self.assertIsInstance(result.move, PlaceTilesMove)
+
+    def test_solve_endgame_blank(self):
+        state = self.empty_state.copy()
+        for i, letter in enumerate("BAT"):
+            state.board.position_to_tile[6 + i, 7] = LetterTile(letter, points=i + 2)  # type: ignore
+        p1 = Player(1)
+        state.player_order = [self.p0, p1]
+        # Some lines put the blank where others put the real A, and they're searched one after the other.
+        state.player_to_state[self.p0].tiles = [
+            BlankTile(),
+            LetterTile("A", points=3),
+            LetterTile("T", points=1),
+        ]
+        state.player_to_state[p1] = PlayerState(
+            p1, 0, [LetterTile("B", points=3), LetterTile("A", points=3)]
+        )
+
+        # The solver's moves-finder, kept through the search, finds what a new one would at every node.
+        moves_finder = CheckedMovesFinder(words=self.small_dictionary)
+        result = endgame.solve_endgame(state=state, time_limit=60.0, moves_finder=moves_finder)
+        self.assertTrue(result.solved)
+        self.assertGreater(moves_finder.num_searches, 50)
+        self.assertEqual(moves_finder.num_mismatches, 0)
+
+        # So it gets the result a solver with a new moves-finder at every node does.
+        new_result = endgame.solve_endgame(
+            state=state,
+            time_limit=60.0,
+            moves_finder=CheckedMovesFinder(words=self.small_dictionary, use_new=True),
+        )
+        self.assertEqual((result.spread, result.moves), (new_result.spread, new_result.moves))
+
+    def test_playable_letter_info_update(self):
+        state = self.empty_state.copy()
+        for i, letter in enumerate("BAT"):
+            state.board.position_to_tile[6 + i, 7] = LetterTile(letter, points=1)  # type: ignore
+        info = PlayableLetterInfo(state=state)
+
+        # Add tiles across and down, and check the updated info against info computed from scratch.
+        state = state.copy()
+        for i, letter in enumerate("BA"):
+            state.board.position_to_tile[6, 8 + i] = LetterTile(letter, points=1)  # type: ignore
+        state.board.position_to_tile[9, 7] = LetterTile("A", points=1)
+        self.assertTrue(info.can_update_for(state))
+        info.update(board=state.board)
+        exp_info = PlayableLetterInfo(state=state)
+        self.assertEqual(info.pos_to_vertical_mask, exp_info.pos_to_vertical_mask)
+        self.assertEqual(info.pos_to_horizontal_mask, exp_info.pos_to_horizontal_mask)
+
+        # Removing tiles also updates the info.
+        state = state.copy()
+        del state.board.position_to_tile[9, 7]
+        del state.board.position_to_tile[6, 9]
+        self.assertIs(get_playable_letter_info(state=state, previous=info), info)
+        exp_info = PlayableLetterInfo(state=state)
+        self.assertEqual(info.pos_to_vertical_mask, exp_info.pos_to_vertical_mask)
+        self.assertEqual(info.pos_to_horizontal_mask, exp_info.pos_to_horizontal_mask)
+
+        # Info for other words can't be updated.
+        state = state.copy()
+        state.config = copy.copy(state.config)
+        state.config.playable_words = frozenset(["BAT"])
+        self.assertFalse(info.can_update_for(state))
+        self.assertIsNot(get_playable_letter_info(state=state, previous=info), info)
+
+    def test_playable_letter_info_update_blank(self):
+        state = self.empty_state.copy()
+        for i, letter in enumerate("BAT"):
+            state.board.position_to_tile[6 + i, 7] = LetterTile(letter, points=i + 2)  # type: ignore
+        state.player_to_state[self.p0].tiles = get_tiles_from_string(
+            "BATT", letter_to_points={"A": 1, "B": 3, "T": 1}
+        )
+
+        # Swapping a tile for a blank of the same letter, and back, changes the points of the cross-words.
+        moves_finder = GaddagMoveFinder(words=self.small_dictionary)
+        all_moves_with_points = list[list[tuple[PlaceTilesMove, int]]]()
+        for tile in [LetterTile("A", points=3), BlankTile(letter="A"), LetterTile("A", points=3)]:
+            state = state.copy()
+            state.board.position_to_tile[7, 7] = tile
+            moves_with_points = moves_finder.get_all_place_tiles_moves_with_points(state=state)
+            self.assertEqual(
+                moves_with_points,
+                GaddagMoveFinder(words=self.small_dictionary).get_all_place_tiles_moves_with_points(
+                    state=state
+                ),
+            )
+            all_moves_with_points.append(moves_with_points)
+        self.assertNotEqual(all_moves_with_points[0], all_moves_with_points[1])
+        self.assertEqual(all_moves_with_points[0], all_moves_with_points[2])
+
+
+
+class LeavesTest(unittest.TestCase):
+    def setUp(self):
+        self.maxDiff = None
+
+    def test_get_leave(self):
+        rack = [LetterTile("S"), BlankTile(), LetterTile("A"), LetterTile("S")]
+        self.assertEqual(leaves.get_leave(rack=rack), "ASS*")
+        self.assertEqual(leaves.get_leave(rack=rack, tiles_used=[LetterTile("S")]), "AS*")
+        self.assertEqual(
+            leaves.get_leave(rack=rack, tiles_used=[BlankTile(letter="E"), LetterTile("A")]),
+            "SS",
+        )
+
+    def test_get_leave_index(self):
+        # The leaves are numbered in order, with no gaps.
+        index = 0
+        for num_tiles in range(4):
+            for leave in leaves.get_all_leaves(num_tiles):
+                self.assertEqual(leaves.get_leave_index(leave), index)
+                index += 1
+        self.assertEqual(leaves.get_leave_index("**" * 3), leaves.NUM_LEAVES - 1)
+
+        # The order of the characters doesn't matter.
+        self.assertEqual(leaves.get_leave_index("S*AE"), leaves.get_leave_index("AES*"))
+        with self.assertRaises(ValueError):
+            leaves.get_leave_index("AEINRST")
+
+    def test_leave_table(self):
+        samples = [
+            leaves.LeaveSample(leave="S*", next_points=40),
+            leaves.LeaveSample(leave="ES", next_points=30),
+            leaves.LeaveSample(leave="QV", next_points=5),
+            leaves.LeaveSample(leave="IIU", next_points=5),
+        ]
+        leave_table = leaves.make_leave_table(samples=samples)
+        self.assertEqual(len(leave_table.values), leaves.NUM_LEAVES)
+        self.assertGreater(leave_table.get_value("S"), 0)
+        self.assertLess(leave_table.get_value("Q"), 0)
+        self.assertGreater(leave_table.get_value("*S"), leave_table.get_value("IIU"))
+        # Leaves that weren't seen get values too.
+        self.assertGreater(leave_table.get_value("ST"), leave_table.get_value("TV"))
+
+        with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as directory:
+            path = os.path.join(directory, "leaves.bin")
+            leave_table.save(path)
+            loaded_table = leaves.LeaveTable.load(path)
+            self.assertEqual(list(loaded_table.values), list(leave_table.values))
+
+
+
+# The words, config and two-player states that the strategy, self-play and tournament tests play with.
+class GamesTest(unittest.TestCase):
+    def setUp(self):
+        self.words = frozenset(
+            {"AA", "AB", "AT", "BA", "TA", "ABA", "ATT", "BAA", "BAT", "TAB", "TAT", "BATT", "ABBA"}
+        )
+        self.letter_to_points = {"A": 1, "B": 3, "T": 1}
+        self.config = get_scrabble_config()
+        self.config.playable_words = self.words
+        self.p0 = Player(0)
+        self.p1 = Player(1)
+
+    # Return a state with BAT in the middle of the board, the given racks and the given tiles in the bag.
+    def get_state(self, rack_0: str, rack_1: str, bag: str, seed: int = 0) -> GameState:
+        board = get_scrabble_board()
+        for i, letter in enumerate("BAT"):
+            board.set_tile_at((6 + i, 7), LetterTile(letter, self.letter_to_points[letter]))  # type: ignore
+        return GameState(
+            config=self.config,
+            current_player=self.p0,
+            player_order=[self.p0, self.p1],
+            player_to_state={
+                self.p0: PlayerState(self.p0, 0, self.get_tiles(rack_0)),
+                self.p1: PlayerState(self.p1, 0, self.get_tiles(rack_1)),
+            },
+            bag=Bag(tiles=self.get_tiles(bag)),
+            board=board,
+            rng=Random(seed),
+        )
+
+    def get_tiles(self, tiles: str) -> list[Tile]:
+        return get_tiles_from_string(tiles, letter_to_points=self.letter_to_points)
+
+
+class StrategyRngTest(GamesTest):
+    def test_derived_rng(self):
+        state = self.get_state(rack_0="ABTA", rack_1="BAT", bag="AABTTABATAB", seed=5)
+        rng_state = state.rng.getstate()  # type: ignore
+
+        # Strategies without an rng make the same choices in the same game,
+        # without changing the tiles drawn in it.
+        for get_strategy in [
+            ai_strategies.RandomWordStrategy,
+            partial(simulation.SimulationStrategy, time_per_move=0.0),
+        ]:
+            strategy = get_strategy()
+            move = strategy.get_move(state=state.copy())
+            self.assertIsNotNone(strategy.rng)
+            self.assertEqual(get_strategy().get_move(state=state.copy()), move)
+            self.assertEqual(state.rng.getstate(), rng_state)  # type: ignore
+
+        # Games with other seeds get other rngs.
+        numbers = {
+            self.get_state(rack_0="A", rack_1="B", bag="", seed=seed).get_derived_rng().random()
+            for seed in range(5)
+        }
+        self.assertEqual(len(numbers), 5)
+
+
+class SimulationTest(GamesTest):
+    def setUp(self):
+        super().setUp()
+        self.state = self.get_state(rack_0="ABTA", rack_1="BAT", bag="AABTTABATAB")
+        self.moves_finder = GaddagMoveFinder(words=self.words)
+        self.moves = [move for move, _ in self.moves_finder.best_moves(state=self.state, k=4)]
+
+    def do_rollouts(self, moves: list[PlaceTilesMove], num_plies: int, seed: int) -> list[float]:
+        return simulation._do_rollouts(
+            state=self.state,
+            moves=moves,
+            num_rollouts=5,
+            num_plies=num_plies,
+            seed=seed,
+            moves_finder=self.moves_finder,
+            leave_table=None,
+        )
+
+    def test_rollout_equity(self):
+        # With one ply, a move's equity is just its points, however the racks are dealt.
+        points = [move.get_points(board=self.state.board, config=self.config) for move in self.moves]
+        self.assertEqual(self.do_rollouts(moves=self.moves, num_plies=1, seed=1), [5.0 * p for p in points])
+
+        # With more plies it depends on the deals, which only depend on the seed.
+        totals = self.do_rollouts(moves=self.moves, num_plies=3, seed=1)
+        self.assertEqual(self.do_rollouts(moves=self.moves, num_plies=3, seed=1), totals)
+        other_totals = [self.do_rollouts(moves=self.moves, num_plies=3, seed=seed) for seed in range(2, 6)]
+        self.assertTrue(any([t != totals for t in other_totals]))
+
+        # The state isn't changed.
+        self.assertEqual(self.state, self.get_state(rack_0="ABTA", rack_1="BAT", bag="AABTTABATAB"))
+
+    def test_rollouts_paired(self):
+        # Every candidate is played out with the same deals and draws, so the same move gets the same total.
+        for seed in range(5):
+            for move in self.moves:
+                first, second = self.do_rollouts(moves=[move, move], num_plies=3, seed=seed)
+                self.assertEqual(first, second)
+
+    def test_rollouts_blank(self):
+        # Some candidates put the blank where others put the real tile, and each rollout plays them out
+        # one after the other, with the same moves-finder.
+        state = self.get_state(rack_0="AT", rack_1="BAT", bag="AABTTABAT")
+        state.player_to_state[self.p0].tiles.append(BlankTile())
+        moves = [move for move, _ in self.moves_finder.best_moves(state=state, k=8)]
+        placings = [placing for move in moves for placing in move.position_to_placing.values()]
+        self.assertTrue(any([isinstance(placing, BlankTilePlacing) for placing in placings]))
+
+        moves_finder = CheckedMovesFinder(words=self.words)
+        totals = simulation._do_rollouts(
+            state=state,
+            moves=moves,
+            num_rollouts=5,
+            num_plies=3,
+            seed=1,
+            moves_finder=moves_finder,
+            leave_table=None,
+        )
+        self.assertEqual(moves_finder.num_searches, 80)
+        self.assertEqual(moves_finder.num_mismatches, 0)
+
+        # So the totals are what they'd be with a new moves-finder for every search.
+        new_totals = simulation._do_rollouts(
+            state=state,
+            moves=moves,
+            num_rollouts=5,
+            num_plies=3,
+            seed=1,
+            moves_finder=CheckedMovesFinder(words=self.words, use_new=True),
+            leave_table=None,
+        )
+        self.assertEqual(totals, new_totals)
+
+    def test_simulation_in_process(self):
+        strategy = simulation.SimulationStrategy(time_per_move=0.0, rng=Random(3))
+        move = strategy.get_move(state=self.state.copy())
+        self.assertIn(move, self.moves_finder.get_all_place_tiles_moves(state=self.state))
+        self.assertTrue(move.is_valid(state=self.state))
+
+        # The same seed picks the same move.
+        same_strategy = simulation.SimulationStrategy(time_per_move=0.0, rng=Random(3))
+        self.assertEqual(same_strategy.get_move(state=self.state.copy()), move)
+
+    def test_config_pickle_reopens_lexicon(self):
+        # Worker processes that aren't forked are sent the config, which opens its compiled lexicon again.
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "words.lex")
+            lexicon.compile_lexicon(words=self.words, path=path)
+            words, gaddag = lexicon.load_lexicon(path)
+            config = GameConfig(
+                playable_words=words,
+                min_tiles_for_turn_in=7,
+                max_tiles_in_hand=7,
+                min_tiles_for_bonus=7,
+                bonus_points=50,
+                scoreless_turns_to_end_game=6,
+                gaddag=gaddag,
+                lexicon_path=path,
+            )
+            config_copy = pickle.loads(pickle.dumps(config))
+            self.assertEqual(config_copy.playable_words, self.words)
+            self.assertEqual(config_copy.bingo_points, 50)
+            self.assertIsNotNone(config_copy._gaddag)
+
+        # A config whose words were replaced is pickled with them.
+        self.assertIsNone(pickle.loads(pickle.dumps(self.config)).lexicon_path)
+
+    @unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(), "needs fork")
+    def test_simulation_pool(self):
+        # With no time, one batch is run, on the pool or in this process, from the same seed.
+        expected = simulation.SimulationStrategy(time_per_move=0.0, rng=Random(4))._simulate(
+            state=self.state, moves=self.moves
+        )
+        with simulation.SimulationPool(config=self.config, num_workers=2) as pool:
+            strategy = simulation.SimulationStrategy(time_per_move=0.0, pool=pool, rng=Random(4))
+            self.assertEqual(strategy._simulate(state=self.state, moves=self.moves), expected)
+        self.assertFalse(pool.is_usable())
+
+        # A closed pool isn't used.
+        strategy.rng = Random(4)
+        self.assertEqual(strategy._simulate(state=self.state, moves=self.moves), expected)
+        with self.assertRaises(ValueError):
+            simulation.SimulationStrategy(pool=pool, leave_table=leaves.LeaveTable([0.0] * leaves.NUM_LEAVES))
+
+
+
+# A strategy that makes the moves it's given, one per turn, and then passes.
+class ScriptedStrategy(MoveGetter):
+    def __init__(self, get_moves: list[Callable[[GameState], Move]]) -> None:
+        self.get_moves = list(get_moves)
+
+    def get_move(self, state: GameState) -> Move:
+        if not self.get_moves:
+            return PassMove()
+        return self.get_moves.pop(0)(state)
+
+
+class SelfPlayTest(GamesTest):
+    # Return the records of the games in the given directory.
+    def get_records(self, directory: str) -> list[self_play.PositionRecord]:
+        return list(self_play.iter_self_play_records(directory))
+
+    def run_self_play(self, directory: str, num_games: int, **kwargs) -> int:
+        kwargs.setdefault("num_workers", 1)
+        kwargs.setdefault("games_per_chunk", 2)
+        return self_play.run_self_play(
+            directory=directory, num_games=num_games, config=self.config, **kwargs
+        )
+
+    def test_self_play_round_trip(self):
+        state = self.get_state(rack_0="A*T", rack_1="BAT", bag="AABTTABTAB")
+        place_tiles = PlaceTilesMove(
+            position_to_placing={
+                (8, 8): BlankTilePlacing(tile=BlankTile(), letter="A"),  # type: ignore
+                (8, 9): LetterTilePlacing(tile=LetterTile("T", 1)),
+            }
+        )
+        exchanged = list[Tile]()
+
+        def exchange(state: GameState) -> Move:
+            exchanged.append(state.player_to_state[self.p0].tiles[0])
+            return ExchangeTilesMove(tiles=exchanged)
+
+        strategies = {
+            self.p0: ScriptedStrategy([lambda _: place_tiles, exchange]),
+            self.p1: ScriptedStrategy([]),
+        }
+        racks = ["A" + leaves.BLANK_CHAR + "T", "BAT"]
+        board = self_play._encode_board(state.board).replace(b"\0", b".").decode("ascii")
+        game = self_play._play_game(game_index=7, state=state, player_to_strategy=strategies)
+
+        with tempfile.TemporaryDirectory() as directory:
+            self_play._write_chunk(
+                directory=directory, seed=3, first_game_index=7, games=[game], num_positions=7
+            )
+            self.assertEqual(
+                self_play.read_chunk_header(self_play.get_chunk_paths(directory)[0]),
+                (3, 7, 1, 7, len(game)),
+            )
+            records = self.get_records(directory)
+
+        # The placement, then passes and an exchange until six turns in a row score nothing.
+        self.assertEqual(
+            [record.move for record in records],
+            ["8,8vaT", "", "-" + leaves.get_leave_char(exchanged[0]), "", "", "", ""],
+        )
+        self.assertEqual([record.player for record in records], [0, 1, 0, 1, 0, 1, 0])
+        first = records[0]
+        self.assertEqual((first.game_index, first.width, first.height), (7, 15, 15))
+        self.assertEqual(first.board, board)
+        self.assertEqual(first.racks, racks)
+        self.assertEqual(first.bag_count, 10)
+        self.assertEqual(first.score_delta, 2)
+        # The blank is on the board in lower case afterwards.
+        self.assertEqual(records[1].board[8 * 15 + 8], "a")
+        self.assertEqual(records[1].board[9 * 15 + 8], "T")
+
+        final_scores = [state.player_to_state[p].score for p in (self.p0, self.p1)]
+        for record in records:
+            self.assertEqual(
+                record.outcome, final_scores[record.player] - final_scores[1 - record.player]
+            )
+
+    def test_self_play_resume(self):
+        num_strategies = 0
+
+        # Stop the run (as if it were interrupted) when the third game starts.
+        def get_strategy() -> MoveGetter:
+            nonlocal num_strategies
+            num_strategies += 1
+            if num_strategies > 4:
+                raise KeyboardInterrupt
+            return ai_strategies.HighestScoringWordStrategy()
+
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(KeyboardInterrupt):
+                self.run_self_play(directory, 5, get_strategy=get_strategy, games_per_chunk=10)
+            # The games that were finished were written.
+            self.assertEqual(
+                [record.game_index for record in self.get_records(directory)][-1], 1
+            )
+
+            # A chunk that was never finished is ignored.
+            with open(os.path.join(directory, "chunk-000000002.bin.tmp"), "wb") as file:
+                file.write(b"partial")
+            self.assertEqual(self.run_self_play(directory, 5), 3)
+            self.assertFalse(any([name.endswith(".tmp") for name in os.listdir(directory)]))
+            self.assertEqual(
+                [self_play.read_chunk_header(path)[1] for path in self_play.get_chunk_paths(directory)],
+                [0, 2, 4],
+            )
+            self.assertEqual(self.run_self_play(directory, 5), 0)
+            resumed_records = self.get_records(directory)
+
+            # A run with another seed can't carry on in the same directory.
+            with self.assertRaises(ValueError):
+                self.run_self_play(directory, 6, seed=1)
+
+        # Resuming gives the same games as playing them all at once.
+        with tempfile.TemporaryDirectory() as directory:
+            self.run_self_play(directory, 5)
+            self.assertEqual(self.get_records(directory), resumed_records)
+            self.assertEqual(
+                sorted({record.game_index for record in resumed_records}), [0, 1, 2, 3, 4]
+            )
+
+    @unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(), "needs fork")
+    def test_self_play_workers(self):
+        # The same seed gives the same games, however many workers play them.
+        with tempfile.TemporaryDirectory() as directory:
+            self.run_self_play(directory, 4, seed=2)
+            records = self.get_records(directory)
+        with tempfile.TemporaryDirectory() as directory:
+            self.run_self_play(directory, 4, seed=2, num_workers=2)
+            self.assertEqual(self.get_records(directory), records)
+        with tempfile.TemporaryDirectory() as directory:
+            self.run_self_play(directory, 4, seed=3)
+            self.assertNotEqual(self.get_records(directory), records)
+
+
+
+class TournamentTest(GamesTest):
+    def setUp(self):
+        super().setUp()
+        self.players = [
+            tournament.TournamentPlayer(
+                get_strategy=ai_strategies.HighestScoringWordStrategy, name="Highest_Score"
+            ),
+            tournament.TournamentPlayer(
+                get_strategy=partial(ai_strategies.ScoreAndTilesStrategy, value_per_tile=2),
+                name="Tiles_2",
+            ),
+            tournament.TournamentPlayer(
+                get_strategy=ai_strategies.RandomWordStrategy, name="Random_Word"
+            ),
+        ]
+        self.pairings = [(0, 1), (1, 2), (2, 0), (0, 2)]
+
+    # Return the results of the matches between the pairs of players, in the order of the pairings.
+    def run_parallel(
+        self, seed: int, num_workers: int, profile: profiling.GameProfile | None = None
+    ) -> list[tournament.MatchResults]:
+        pairs_to_results = {
+            (p1_index, p2_index): results
+            for p1_index, p2_index, results in tournament.do_tournament_matches_parallel(
+                players=self.players,
+                pairings=self.pairings,
+                num_workers=num_workers,
+                config=self.config,
+                seed=seed,
+                profile=profile,
+            )
+        }
+        return [pairs_to_results[pair] for pair in self.pairings]
+
+    @unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(), "needs fork")
+    def test_tournament_matches_parallel(self):
+        # Each match's tiles come from its own seed, so the workers get the results the serial runner does.
+        expected_profile = profiling.GameProfile(keep_turns=False)
+        expected = [
+            tournament.do_tournament_match(
+                player_1=self.players[p1_index],
+                player_2=self.players[p2_index],
+                config=self.config,
+                rng=Random(f"5:{i}"),
+                profile=expected_profile,
+            )
+            for i, (p1_index, p2_index) in enumerate(self.pairings)
+        ]
+        profile = profiling.GameProfile(keep_turns=False)
+        self.assertEqual(self.run_parallel(seed=5, num_workers=2, profile=profile), expected)
+        self.assertEqual(self.run_parallel(seed=5, num_workers=1), expected)
+        self.assertNotEqual(self.run_parallel(seed=6, num_workers=2), expected)
+
+        # The profiles of the matches are added to the given one.
+        self.assertEqual(profile.num_games, 4 * len(self.pairings))
+        self.assertEqual(
+            {name: p.num_turns for name, p in profile.strategy_to_profile.items()},
+            {name: p.num_turns for name, p in expected_profile.strategy_to_profile.items()},
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,5 +1,5 @@
 from typing import Any, Generator
-from random import shuffle
+from random import Random, shuffle
 from colorama import Fore, Back, Style
 
 from game_state import *
@@ -14,13 +14,17 @@ def get_scrabble_board() -> Board:
     board.starting_position = 7, 7
     return board
 
-# Returns a list containing the tiles in a Scrabble game.
-def get_scrabble_tiles() -> list[Tile]:
+# Returns a list containing the tiles in a Scrabble game, shuffled with the given random number generator
+# (or the random module if it's None).
+def get_scrabble_tiles(rng: Random | None = None) -> list[Tile]:
     tiles = get_tiles_from_string(
         tile_string=SCRABBLE_INITIAL_TILES_STR,
         letter_to_points=SCRABBLE_LETTER_TO_POINTS,
     )
-    shuffle(tiles)
+    if rng is None:
+        shuffle(tiles)
+    else:
+        rng.shuffle(tiles)
     return tiles
 
 
@@ -29,15 +33,23 @@ SCRABBLE_CONFIG_NAME = "Scrabble"
 
 
 # Return the game-config for Scrabble.
+# The compiled lexicon is used if there is one (see get_words.make_lexicon), so nothing has to be built.
 def get_scrabble_config() -> GameConfig:
+    compiled_lexicon = get_words.get_lexicon()
+    if compiled_lexicon is None:
+        words, gaddag, lexicon_path = get_words.get_all_words(), None, None
+    else:
+        (words, gaddag), lexicon_path = compiled_lexicon, get_words.LEXICON_PATH
     return GameConfig(
-        playable_words=get_words.get_all_words(),
+        playable_words=words,
         min_tiles_for_turn_in=SCRABBLE_RACK_SIZE,
         max_tiles_in_hand=SCRABBLE_RACK_SIZE,
         min_tiles_for_bonus=SCRABBLE_RACK_SIZE,
         bonus_points=50,
         scoreless_turns_to_end_game=6,
         config_name=SCRABBLE_CONFIG_NAME,
+        gaddag=gaddag,
+        lexicon_path=lexicon_path,
     )
 
 
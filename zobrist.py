@@ -0,0 +1,52 @@
+from hashlib import blake2b
+from typing import Any, Hashable, Iterable
+
+# Zobrist hashing: every (place, tile) pair gets a random 64-bit key, and a position's hash combines
+# the keys of everything in it, so it can be kept up to date as tiles come and go instead of
+# being made from scratch.
+# The squares of the board hold at most one tile, so their keys are XORed together.
+# The racks and the bag can hold several of the same tile, so their keys are added (mod 2^64) instead,
+# which counts each copy.
+#
+# The keys come from hashing what they're for, not from a random generator,
+# so they're the same in every process and the hashes can be saved and compared later.
+
+HASH_BITS = 64
+HASH_MASK = (1 << HASH_BITS) - 1
+
+# The holder of the tiles in the bag, for get_tile_key.
+BAG = "bag"
+
+
+# Return the key for the given parts.
+def get_key(*parts: Hashable, _cache=dict[tuple, int]()) -> int:
+    key = _cache.get(parts)
+    if key is None:
+        digest = blake2b(repr(parts).encode("utf-8"), digest_size=HASH_BITS // 8).digest()
+        key = int.from_bytes(digest, "little")
+        _cache[parts] = key
+    return key
+
+
+# Return the holder for the rack of the player at the given position, for get_tile_key.
+# These are negative, so they're never the index of a square.
+def get_player_holder(position: int) -> int:
+    return -1 - position
+
+
+# Return the key for the given tile (a game_state.Tile) being held by the given holder:
+# the index of a square (or the position of a tile outside the board), a player's holder, or BAG.
+def get_tile_key(holder: Hashable, tile: Any, _cache=dict[tuple, int]()) -> int:
+    key = _cache.get((holder, tile))
+    if key is None:
+        key = get_key(holder, type(tile).__name__, getattr(tile, "letter", None), tile.points)
+        _cache[holder, tile] = key
+    return key
+
+
+# Return the hash of the given tiles held by the given holder, counting each copy.
+def get_tiles_hash(holder: Hashable, tiles: Iterable[Any]) -> int:
+    result = 0
+    for tile in tiles:
+        result += get_tile_key(holder, tile)
+    return result & HASH_MASK